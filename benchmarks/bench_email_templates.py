@@ -0,0 +1,173 @@
+"""
+Micro-benchmark: precompiled email templates vs the legacy per-lead f-string.
+
+Compares per-lead render time (timeit) and allocations (tracemalloc) of
+src.email_templates.render_lead_email against the f-string that
+send_email_notification used to rebuild for every lead.
+
+Usage:
+    python -m benchmarks.bench_email_templates [--iterations 20000]
+"""
+import argparse
+import html
+import timeit
+import tracemalloc
+
+from src.email_templates import lead_template_context, lead_templates, render_lead_email
+
+SAMPLE_LEAD = {
+    "name": "Jane <Doe> & Co",
+    "email": "jane@example.com",
+    "objective": "Reduce operational workload",
+    "processes_to_automate": "Customer support triage, invoice approvals, weekly reporting",
+    "current_tools": "Gmail, Slack, Salesforce, HubSpot",
+    "main_challenge": "Scalability",
+    "language": "en",
+    "timestamp": "2026-01-15T10:30:00",
+}
+
+
+def legacy_render(lead_data):
+    # Copy of the f-string previously built inside send_email_notification
+    return f"""
+        <html>
+        <head>
+            <style>
+                body {{ font-family: 'Segoe UI', Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 0; }}
+                .container {{ max-width: 650px; margin: 30px auto; background-color: white; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }}
+                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px 20px; text-align: center; }}
+                .header h1 {{ margin: 0; font-size: 28px; font-weight: 600; }}
+                .header p {{ margin: 10px 0 0 0; font-size: 14px; opacity: 0.9; }}
+                .content {{ padding: 30px; background-color: #ffffff; }}
+                .lead-info {{ background-color: #f8f9fa; border-radius: 8px; padding: 20px; margin: 20px 0; }}
+                .field {{ margin: 18px 0; padding: 15px; background-color: white; border-left: 4px solid #667eea; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.05); }}
+                .field-label {{ font-weight: 600; color: #2d3748; font-size: 13px; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 8px; }}
+                .field-value {{ color: #4a5568; font-size: 15px; line-height: 1.6; }}
+                .highlight {{ background-color: #fef3c7; padding: 2px 6px; border-radius: 3px; }}
+                .footer {{ background-color: #f7fafc; padding: 25px; text-align: center; border-top: 1px solid #e2e8f0; }}
+                .footer p {{ margin: 5px 0; color: #718096; font-size: 13px; }}
+                .cta-button {{ display: inline-block; margin: 20px 0; padding: 12px 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-decoration: none; border-radius: 6px; font-weight: 600; }}
+                .stats {{ display: flex; justify-content: space-around; margin: 20px 0; }}
+                .stat-box {{ text-align: center; padding: 15px; background: white; border-radius: 8px; flex: 1; margin: 0 5px; }}
+                .stat-number {{ font-size: 24px; font-weight: bold; color: #667eea; }}
+                .stat-label {{ font-size: 12px; color: #718096; margin-top: 5px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>🎯 New Consultation Lead!</h1>
+                    <p>The Smart AI Tech - Automation Consultancy</p>
+                </div>
+                
+                <div class="content">
+                    <div class="lead-info">
+                        <h2 style="margin-top: 0; color: #2d3748; font-size: 20px;">Lead Information</h2>
+                        
+                        <div class="field">
+                            <div class="field-label">👤 Contact Name</div>
+                            <div class="field-value"><strong>{lead_data.get('name', 'N/A')}</strong></div>
+                        </div>
+                        
+                        <div class="field">
+                            <div class="field-label">📧 Email Address</div>
+                            <div class="field-value"><a href="mailto:{lead_data.get('email', '')}" style="color: #667eea; text-decoration: none;">{lead_data.get('email', 'N/A')}</a></div>
+                        </div>
+                        
+                        <div class="field">
+                            <div class="field-label">🎯 Business Objective</div>
+                            <div class="field-value"><span class="highlight">{lead_data.get('objective', 'N/A')}</span></div>
+                        </div>
+                        
+                        <div class="field">
+                            <div class="field-label">⚙️ Processes to Automate</div>
+                            <div class="field-value">{lead_data.get('processes_to_automate', 'N/A')}</div>
+                        </div>
+                        
+                        <div class="field">
+                            <div class="field-label">🔧 Current Tools & Systems</div>
+                            <div class="field-value">{lead_data.get('current_tools', 'N/A')}</div>
+                        </div>
+                        
+                        <div class="field">
+                            <div class="field-label">⚡ Main Challenge</div>
+                            <div class="field-value"><strong style="color: #e53e3e;">{lead_data.get('main_challenge', 'N/A')}</strong></div>
+                        </div>
+                        
+                        <div class="stats">
+                            <div class="stat-box">
+                                <div class="stat-number">🌐</div>
+                                <div class="stat-label">Language: {lead_data.get('language', 'en').upper()}</div>
+                            </div>
+                            <div class="stat-box">
+                                <div class="stat-number">🕒</div>
+                                <div class="stat-label">{lead_data.get('timestamp', 'N/A').split('T')[0]}</div>
+                            </div>
+                        </div>
+                    </div>
+                    
+                    <p style="text-align: center; color: #4a5568; margin: 25px 0;">
+                        <strong>Next Step:</strong> Review the lead details and prepare a custom automation proposal.
+                    </p>
+                </div>
+                
+                <div class="footer">
+                    <p style="margin-bottom: 15px;"><strong>✅ Lead automatically saved to Google Sheet</strong></p>
+                    <a href="https://docs.google.com/spreadsheets/d/1gWUilIZBU5IQ4cGtNpfcQx8gaa8uf4fCAP7i5L-uviQ/edit?gid=0#gid=0" class="cta-button" style="color: white;">View All Leads →</a>
+                    <p style="margin-top: 20px;">This is an automated notification from The Smart AI Tech consultation bot.</p>
+                    <p>© 2026 The Smart AI Tech. All rights reserved.</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+
+def legacy_render_escaped(lead_data):
+    # What the f-string costs once its values are escaped like the templates'
+    return legacy_render({key: html.escape(str(value)) for key, value in lead_data.items()})
+
+
+def template_html_only(lead_data):
+    return lead_templates()["html"].render(lead_template_context(lead_data))
+
+
+def measure_time(func, iterations):
+    seconds = min(timeit.repeat(lambda: func(SAMPLE_LEAD), number=iterations, repeat=5))
+    return seconds / iterations * 1e6
+
+
+def measure_allocations(func, iterations):
+    func(SAMPLE_LEAD)  # warm up
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    for _ in range(iterations):
+        func(SAMPLE_LEAD)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return peak, blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    candidates = [
+        ("legacy f-string (html only, unescaped)", legacy_render),
+        ("legacy f-string (html only, escaped)", legacy_render_escaped),
+        ("precompiled template (html only, escaped)", template_html_only),
+        ("precompiled template (subject + html + text)", render_lead_email),
+    ]
+    print(f"{'renderer':48} {'us/lead':>10} {'peak bytes':>12} {'blocks/1k':>10}")
+    for label, func in candidates:
+        per_lead_us = measure_time(func, args.iterations)
+        peak, blocks = measure_allocations(func, 1000)
+        print(f"{label:48} {per_lead_us:10.2f} {peak:12,} {blocks:10,}")
+
+
+if __name__ == "__main__":
+    main()
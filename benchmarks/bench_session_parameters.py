@@ -0,0 +1,70 @@
+"""
+Benchmark: echoing all session parameters vs sending only the changed ones.
+
+Builds long consultation sessions (free-text slots padded to the given
+request sizes) and renders the webhook reply both ways: the old full echo
+(``parameters={**parameters}``) and the parameter_delta() reply the
+handlers send now. Reports response bytes and render time per reply for
+save_consultation_lead (nothing changes) and defaultWelcomeIntent (two
+parameters change).
+
+Usage:
+    python -m benchmarks.bench_session_parameters [--iterations 5000] [--sizes 10000 50000 100000]
+"""
+import argparse
+import time
+
+from benchmarks.payloads import make_payload
+from src.responses import build_response_catalog, parameter_delta, render_response
+
+
+def _time_render(render, iterations: int) -> tuple:
+    response = render()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    return len(response.body), (time.perf_counter() - started) / iterations * 1e6
+
+
+def bench(size: int, iterations: int) -> list:
+    payload = make_payload("save_consultation_lead", size)
+    session = payload["sessionInfo"]["session"]
+    parameters = payload["sessionInfo"]["parameters"]
+    welcome_changes = {"someKey": "somevalue", "count": parameters["count"] + 1}
+
+    cases = {
+        "save_consultation_lead": (
+            lambda: render_response("consultation_saved", "en", session=session, parameters={**parameters}),
+            lambda: render_response("consultation_saved", "en", session=session),
+        ),
+        "defaultWelcomeIntent": (
+            lambda: render_response("session_variable_added", "en", session=session,
+                                    parameters={**parameters, **welcome_changes}),
+            lambda: render_response("session_variable_added", "en", session=session,
+                                    parameters=parameter_delta(parameters, welcome_changes)),
+        ),
+    }
+    rows = []
+    for tag, (full, delta) in cases.items():
+        full_bytes, full_us = _time_render(full, iterations)
+        delta_bytes, delta_us = _time_render(delta, iterations)
+        rows.append((size, tag, full_bytes, delta_bytes, full_us, delta_us))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    args = parser.parse_args()
+    build_response_catalog()
+
+    print(f"{'request':>9} {'tag':24} {'full echo':>10} {'delta':>7} {'saved':>7} {'full us':>8} {'delta us':>9}")
+    for size in args.sizes:
+        for size, tag, full_bytes, delta_bytes, full_us, delta_us in bench(size, args.iterations):
+            saved = 1 - delta_bytes / full_bytes
+            print(f"{size:>9} {tag:24} {full_bytes:>10} {delta_bytes:>7} {saved:>7.1%} {full_us:>8.1f} {delta_us:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: standard /webhook route vs the WEBHOOK_FAST_PATH route.
+
+Runs both routes in-process (httpx ASGI transport, no network) against
+realistic CX payloads of 10 KB and larger, and reports requests per second
+and CPU time per request. Only the save_lead and defaultWelcomeIntent tags
+are used so no downstream call is made.
+
+Usage:
+    python -m benchmarks.bench_webhook_fast_path [--requests 2000] [--sizes 10000 50000 100000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.payloads import make_payload
+from src.main import register_webhook_route
+
+BENCH_TAGS = ("save_lead", "defaultWelcomeIntent")
+
+
+def build_app(fast_path: bool) -> FastAPI:
+    bench_app = FastAPI()
+    register_webhook_route(bench_app, fast_path=fast_path)
+    return bench_app
+
+
+async def run(fast_path: bool, bodies: list, total: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=build_app(fast_path))
+    headers = {"content-type": "application/json"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up (handler module import, partial model creation)
+        for body in bodies:
+            (await client.post("/webhook", content=body, headers=headers)).raise_for_status()
+
+        counter = iter(range(total))
+
+        async def worker():
+            for i in counter:
+                response = await client.post("/webhook", content=bodies[i % len(bodies)], headers=headers)
+                response.raise_for_status()
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    return {"rps": total / wall, "cpu_us_per_request": cpu / total * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    args = parser.parse_args()
+    # Keep per-request log output out of the measurement
+    for name in ("src", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    print(f"{'size':>8} {'route':10} {'req/s':>10} {'cpu us/req':>12}")
+    for size in args.sizes:
+        bodies = [
+            json.dumps(make_payload(tag, target_bytes=size, seed=i)).encode()
+            for i, tag in enumerate(BENCH_TAGS * 4)
+        ]
+        results = {}
+        for label, fast_path in (("standard", False), ("fast", True)):
+            results[label] = asyncio.run(run(fast_path, bodies, args.requests, args.concurrency))
+            print(f"{size:>8} {label:10} {results[label]['rps']:10.0f} {results[label]['cpu_us_per_request']:12.1f}")
+        speedup = results["fast"]["rps"] / results["standard"]["rps"]
+        print(f"{'':>8} {'speedup':10} {speedup:9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Measures time-to-first-successful-lead after a cold start.
+
+Each run starts a fresh server process (uvicorn, or gunicorn with
+--server gunicorn) pointed at the local Apps Script / Resend stubs, then
+posts a save_consultation_lead request as soon as the port accepts
+connections. It reports, from process launch:
+
+    listening   first TCP connection accepted
+    reply       first consultation_saved reply
+    delivered   lead received by the Apps Script stub
+
+plus the app's own startup phases (startup_duration_seconds on /metrics).
+With --importtime the slowest imports of src.main are listed as well.
+
+Note: the stubs are plain HTTP on localhost, so DNS and TLS pre-warming
+(HTTP_PREWARM_ENABLED) only shows its effect against the real hosts.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 5] [--server uvicorn|gunicorn] [--importtime]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.loadtest import stub_environment
+from benchmarks.payloads import make_payload
+from benchmarks.stubs import StubServer, add_stub_arguments, behavior_from_args, free_port, resend_app, sheets_app
+
+
+def _wait_until_listening(port: int, started: float, timeout: float = 60) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return time.perf_counter() - started
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError(f"server did not listen on port {port} within {timeout}s")
+
+
+def _startup_phases(client: httpx.Client) -> dict:
+    phases = {}
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith("startup_duration_seconds{"):
+            name = line.split('phase="', 1)[1].split('"', 1)[0]
+            phases[name] = float(line.split()[-1])
+    return phases
+
+
+def cold_start(args, env: dict, sheets_behavior) -> dict:
+    port = free_port()
+    if args.server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "src.main:app"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1",
+                   "--port", str(port), "--log-level", "warning"]
+    body = make_payload("save_consultation_lead", args.payload_bytes, seed=int(time.time()))
+    delivered_before = sheets_behavior.items
+
+    started = time.perf_counter()
+    server = subprocess.Popen(command, env={**os.environ, **env, "PORT": str(port), "WEB_CONCURRENCY": "1"})
+    try:
+        listening = _wait_until_listening(port, started)
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                try:
+                    response = client.post("/webhook", json=body)
+                    text = response.json()["fulfillmentResponse"]["messages"][0]["text"]["text"][0]
+                    if response.status_code == 200 and "error" not in text.lower():
+                        break
+                except (httpx.HTTPError, KeyError, ValueError):
+                    pass
+                time.sleep(0.01)
+            reply = time.perf_counter() - started
+            while sheets_behavior.items <= delivered_before:
+                if time.perf_counter() - started > 60:
+                    raise RuntimeError("lead was not delivered to the Apps Script stub within 60s")
+                time.sleep(0.005)
+            delivered = time.perf_counter() - started
+            phases = _startup_phases(client)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {"listening": listening, "reply": reply, "delivered": delivered, "phases": phases}
+
+
+def import_report(top: int):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        capture_output=True, text=True, env={**os.environ, "LOG_LEVEL": "WARNING"},
+    ).stderr
+    rows = []
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative), name.rstrip()))
+    print("\nslowest imports of src.main (cumulative):")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn")
+    parser.add_argument("--payload-bytes", type=int, default=10_000)
+    parser.add_argument("--importtime", action="store_true", help="list the slowest imports of src.main")
+    parser.add_argument("--top", type=int, default=15)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    sheets_behavior = behavior_from_args(args, "sheets")
+    sheets = StubServer(sheets_app(sheets_behavior)).start()
+    resend = StubServer(resend_app(behavior_from_args(args, "resend"))).start()
+    runs = []
+    try:
+        for i in range(args.runs):
+            with tempfile.TemporaryDirectory() as workdir:
+                env = {**stub_environment(sheets, resend, workdir), "LOG_LEVEL": "WARNING"}
+                runs.append(cold_start(args, env, sheets_behavior))
+            print(f"run {i + 1}: listening {runs[-1]['listening'] * 1000:.0f}ms  reply {runs[-1]['reply'] * 1000:.0f}ms  "
+                  f"delivered {runs[-1]['delivered'] * 1000:.0f}ms")
+    finally:
+        sheets.stop()
+        resend.stop()
+
+    print(f"\nmedian of {len(runs)} {args.server} cold starts (from process launch):")
+    for key in ("listening", "reply", "delivered"):
+        print(f"  {key:10} {statistics.median(run[key] for run in runs) * 1000:8.0f} ms")
+    phase_names = sorted({name for run in runs for name in run["phases"]})
+    if phase_names:
+        print("app startup phases (median):")
+        for name in phase_names:
+            values = [run["phases"][name] for run in runs if name in run["phases"]]
+            print(f"  {name:18} {statistics.median(values) * 1000:8.1f} ms")
+
+    if args.importtime:
+        import_report(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Offline load test for the webhook, against local Apps Script / Resend stubs.
+
+Starts the stubs (benchmarks/stubs.py), points the app at them through the
+usual environment variables, then drives a mix of realistic CX payloads
+over all tags at a target concurrency, either in-process (ASGI transport,
+same event loop) or against a uvicorn subprocess. Reports throughput,
+p50/p95/p99 latency per tag, errors and event-loop lag, and writes the
+result as JSON so runs can be compared between commits.
+
+Usage:
+    python -m benchmarks.loadtest --mode inprocess --concurrency 50 --duration 20
+    python -m benchmarks.loadtest --mode uvicorn --sheets-latency-ms 800 --sheets-error-rate 0.05
+    python -m benchmarks.loadtest --compare benchmarks/results/<baseline>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from benchmarks.payloads import TAGS, make_payload
+from benchmarks.stubs import StubServer, add_stub_arguments, behavior_from_args, free_port, resend_app, sheets_app
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+_ID_TOKEN = "__BENCH_REQUEST_ID__"
+# Swapped per request too: a fixed address would make every lead after the
+# first a duplicate (src/dedup.py) and skip the Sheets write and the email
+_EMAIL_TOKEN = "__BENCH_EMAIL__"
+
+
+def stub_environment(sheets: StubServer, resend: StubServer, workdir: str) -> dict:
+    return {
+        "GOOGLE_SHEET_URL": f"{sheets.url}/exec",
+        "RESEND_API_URL": f"{resend.url}/emails",
+        "EMAIL_NOTIFICATIONS_ENABLED": "true",
+        "RESEND_API_KEY": "stub-key",
+        "EMAIL_FROM": "bench@example.com",
+        "EMAIL_TO": "sales@example.com",
+        "LEAD_OUTBOX_PATH": os.path.join(workdir, "lead_outbox.db"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        # The payload mix reuses a dozen sessions, far above a real user's pace
+        "ADMISSION_SESSION_RATE": os.environ.get("ADMISSION_SESSION_RATE", "0"),
+    }
+
+
+def build_templates(args) -> list:
+    # JSON bodies with a placeholder detectIntentResponseId and lead email,
+    # swapped per request
+    templates = []
+    for i in range(max(len(TAGS) * 4, 12)):
+        payload = make_payload(TAGS[i % len(TAGS)], args.payload_bytes, seed=i, language=("en", "fr-CA")[i % 2])
+        payload["detectIntentResponseId"] = _ID_TOKEN
+        body = json.dumps(payload).replace(f"user{i}@example.com", f"user-{_EMAIL_TOKEN}@example.com")
+        templates.append((payload["fulfillmentInfo"]["tag"], body.encode()))
+    return templates
+
+
+async def drive(client: httpx.AsyncClient, templates: list, args) -> tuple:
+    results = []
+    stop_at = time.perf_counter() + args.duration
+    issued = 0
+    headers = {"content-type": "application/json"}
+
+    async def worker():
+        nonlocal issued
+        last_body = None
+        while time.perf_counter() < stop_at and (not args.requests or issued < args.requests):
+            issued += 1
+            if last_body is not None and random.random() < args.retry_rate:
+                tag, body = last_body  # simulated Dialogflow retry (same response ID)
+            else:
+                tag, template = random.choice(templates)
+                request_id = uuid.uuid4().hex.encode()
+                body = template.replace(_ID_TOKEN.encode(), request_id).replace(_EMAIL_TOKEN.encode(), request_id)
+            started = time.perf_counter()
+            try:
+                response = await client.post("/webhook", content=body, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            results.append((tag, time.perf_counter() - started, status))
+            last_body = (tag, body)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results, time.perf_counter() - started
+
+
+async def sample_loop_lag(samples: list, interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _latency_summary(latencies: list) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def summarize(results: list, wall: float, loop_lag: dict) -> dict:
+    ok = [latency for _, latency, status in results if status == 200]
+    errors: dict = {}
+    for _, _, status in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    return {
+        "requests": len(results),
+        "duration_s": wall,
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "latency": _latency_summary(ok),
+        "per_tag": {
+            tag: _latency_summary([latency for t, latency, status in results if t == tag and status == 200])
+            for tag in sorted({tag for tag, _, _ in results})
+        },
+        "errors": errors,
+        "event_loop_lag": loop_lag,
+    }
+
+
+async def run_inprocess(args, env: dict) -> dict:
+    os.environ.update(env)
+    from src.main import app  # imported after the environment points at the stubs
+
+    lag_samples: list = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            sampler = asyncio.create_task(sample_loop_lag(lag_samples))
+            results, wall = await drive(client, build_templates(args), args)
+            sampler.cancel()
+    loop_lag = {
+        "mean_ms": sum(lag_samples) / len(lag_samples) * 1000 if lag_samples else 0.0,
+        "p99_ms": _percentile(lag_samples, 0.99) * 1000,
+        "max_ms": max(lag_samples, default=0.0) * 1000,
+    }
+    return summarize(results, wall, loop_lag)
+
+
+def _scrape_loop_lag(text: str) -> tuple:
+    total = count = 0.0
+    for line in text.splitlines():
+        if line.startswith("event_loop_lag_seconds_sum"):
+            total = float(line.split()[-1])
+        elif line.startswith("event_loop_lag_seconds_count"):
+            count = float(line.split()[-1])
+    return total, count
+
+
+async def run_uvicorn(args, env: dict) -> dict:
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    server = subprocess.Popen(command, env={**os.environ, **env})
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            for _ in range(200):
+                try:
+                    (await client.get("/metrics")).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.05)
+            else:
+                raise RuntimeError("uvicorn did not start")
+
+            before = _scrape_loop_lag((await client.get("/metrics")).text)
+            results, wall = await drive(client, build_templates(args), args)
+            after = _scrape_loop_lag((await client.get("/metrics")).text)
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+
+    samples = after[1] - before[1]
+    loop_lag = {"mean_ms": (after[0] - before[0]) / samples * 1000 if samples else 0.0, "source": "/metrics"}
+    return summarize(results, wall, loop_lag)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    latency = report["latency"]
+    print(f"requests: {report['requests']}  throughput: {report['throughput_rps']:.1f} req/s  errors: {report['errors'] or 0}")
+    print(f"latency ms: p50 {latency['p50_ms']:.1f}  p95 {latency['p95_ms']:.1f}  p99 {latency['p99_ms']:.1f}  max {latency['max_ms']:.1f}")
+    for tag, stats in report["per_tag"].items():
+        print(f"  {tag:28} n={stats['count']:<6} p50 {stats['p50_ms']:.1f}  p95 {stats['p95_ms']:.1f}  p99 {stats['p99_ms']:.1f}")
+    lag = report["event_loop_lag"]
+    print(f"event-loop lag ms: mean {lag['mean_ms']:.2f}" + (f"  p99 {lag['p99_ms']:.2f}  max {lag['max_ms']:.2f}" if "max_ms" in lag else ""))
+    print(f"stub calls: {report['stubs']}")
+
+
+def compare(baseline_path: str, report: dict):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path} (commit {baseline.get('commit')}):")
+    rows = [
+        ("throughput_rps", baseline["throughput_rps"], report["throughput_rps"]),
+        *((f"latency.{key}", baseline["latency"][key], report["latency"][key]) for key in ("p50_ms", "p95_ms", "p99_ms")),
+        ("event_loop_lag.mean_ms", baseline["event_loop_lag"]["mean_ms"], report["event_loop_lag"]["mean_ms"]),
+    ]
+    for name, old, new in rows:
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"  {name:24} {old:10.2f} -> {new:10.2f}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after N requests (0 = duration only)")
+    parser.add_argument("--payload-bytes", type=int, default=10_000)
+    parser.add_argument("--retry-rate", type=float, default=0.0, help="fraction of calls repeating the previous request ID")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", help="earlier result JSON to compare against")
+    parser.add_argument("--seed", type=int, default=1)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    sheets_behavior, resend_behavior = behavior_from_args(args, "sheets"), behavior_from_args(args, "resend")
+    sheets = StubServer(sheets_app(sheets_behavior)).start()
+    resend = StubServer(resend_app(resend_behavior)).start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = stub_environment(sheets, resend, workdir)
+            runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+            report = asyncio.run(runner(args, env))
+    finally:
+        sheets.stop()
+        resend.stop()
+
+    report.update({
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "stubs": {
+            "sheets": {"calls": sheets_behavior.calls, "items": sheets_behavior.items},
+            "resend": {"calls": resend_behavior.calls, "items": resend_behavior.items},
+        },
+    })
+    print_report(report)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}_{report['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Realistic Dialogflow CX webhook payloads for the benchmarks.
+
+The shape follows what CX sends for a form page: intent info, page info with
+formInfo.parameterInfo for every slot, the accumulated session parameters,
+the turn's response messages and a free-form payload. ``filler`` pads the
+free-text slots so a request reaches a target size.
+"""
+import json
+import random
+
+TAGS = ("defaultWelcomeIntent", "save_lead", "save_consultation_lead")
+
+_WORDS = (
+    "invoice approval onboarding ticket triage crm sync weekly report "
+    "spreadsheet export slack email reminder follow-up quote pipeline"
+).split()
+
+
+def _text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def make_payload(tag: str = "save_consultation_lead", target_bytes: int = 10_000, seed: int = 0,
+                 language: str = "en", session_id: str | None = None) -> dict:
+    """
+    Builds a CX webhook request of roughly ``target_bytes`` JSON bytes.
+    """
+    rng = random.Random(seed)
+    session = session_id or f"session-{seed}"
+    parameters = {
+        "user_name": f"Test User {seed}",
+        "user_email": f"user{seed}@example.com",
+        "objective": "Reduce operational workload",
+        "processes_text": "",
+        "current_tools": "",
+        "main_challenge": "Scalability",
+        "count": seed % 7,
+    }
+    payload = {
+        "detectIntentResponseId": f"{seed:08d}-bench-{rng.getrandbits(48):012x}",
+        "languageCode": language,
+        "fulfillmentInfo": {"tag": tag},
+        "intentInfo": {"displayName": "consultation.provide_details", "confidence": 0.93},
+        "pageInfo": {
+            "currentPage": "projects/bench/locations/global/agents/agent-1/flows/00000000-0000-0000-0000-000000000000/pages/consultation",
+            "displayName": "Consultation",
+            "formInfo": {
+                "parameterInfo": [
+                    {"displayName": name, "required": True, "state": "FILLED", "value": value, "justCollected": False}
+                    for name, value in parameters.items()
+                ]
+            },
+        },
+        "sessionInfo": {
+            "session": f"projects/bench/locations/global/agents/agent-1/sessions/{session}",
+            "parameters": parameters,
+        },
+        "messages": [
+            {"text": {"text": ["Thanks! Could you describe the tools you use today?"]}, "responseType": "HANDLER_PROMPT", "source": "VIRTUAL_AGENT"},
+            {"text": {"text": ["What is your main challenge?"]}, "responseType": "PARAMETER_PROMPT", "source": "VIRTUAL_AGENT"},
+        ],
+        "payload": {"channel": "df-messenger", "utm": {"source": "website", "campaign": "bench"}},
+        "text": "We mostly use spreadsheets and email",
+    }
+
+    # Pad the free-text slots (and their parameterInfo copies) to the target size
+    base = len(json.dumps(payload))
+    filler = max(0, target_bytes - base) // 4
+    for key in ("processes_text", "current_tools"):
+        parameters[key] = _text(rng, filler)
+        for info in payload["pageInfo"]["formInfo"]["parameterInfo"]:
+            if info["displayName"] == key:
+                info["value"] = parameters[key]
+    return payload
+
+
+def payload_mix(count: int, target_bytes: int = 10_000, tags=TAGS) -> list:
+    """
+    Returns ``count`` payloads cycling through ``tags`` and en/fr locales.
+    """
+    return [
+        make_payload(tags[i % len(tags)], target_bytes, seed=i, language=("en", "fr-CA")[i % 2])
+        for i in range(count)
+    ]
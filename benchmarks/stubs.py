@@ -0,0 +1,159 @@
+"""
+Local stand-ins for the Apps Script web app and the Resend API.
+
+Each stub answers after a configurable latency (base + random jitter), fails
+a configurable fraction of calls with HTTP 500 and lets another fraction hang
+(to exercise client timeouts). The Apps Script stub accepts single leads and
+the {"rows": [...]} bulk payload; the Resend stub serves /emails and
+/emails/batch.
+
+Standalone usage:
+    python -m benchmarks.stubs --sheets-port 8701 --resend-port 8702 --latency-ms 300
+"""
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class StubBehavior:
+    """
+    Latency and failure settings of a stub (mutable while it runs).
+    """
+
+    def __init__(self, latency_ms: float = 100, jitter_ms: float = 50, error_rate: float = 0.0,
+                 timeout_rate: float = 0.0, hang_seconds: float = 30.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.calls = 0
+        self.items = 0
+
+    async def respond(self, items: int, body):
+        self.calls += 1
+        self.items += items
+        roll = random.random()
+        if roll < self.timeout_rate:
+            await asyncio.sleep(self.hang_seconds)
+        else:
+            await asyncio.sleep((self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000)
+        if roll < self.timeout_rate + self.error_rate:
+            return JSONResponse({"error": "stub failure"}, status_code=500)
+        return JSONResponse(body)
+
+
+def sheets_app(behavior: StubBehavior) -> Starlette:
+    async def append_rows(request: Request):
+        payload = await request.json()
+        rows = payload.get("rows") if isinstance(payload, dict) else None
+        if isinstance(rows, list):
+            return await behavior.respond(len(rows), {"results": [{"success": True} for _ in rows]})
+        return await behavior.respond(1, {"result": "success"})
+
+    return Starlette(routes=[Route("/exec", append_rows, methods=["POST"])])
+
+
+def resend_app(behavior: StubBehavior) -> Starlette:
+    async def send_email(request: Request):
+        await request.json()
+        return await behavior.respond(1, {"id": f"stub-{behavior.calls}"})
+
+    async def send_batch(request: Request):
+        emails = await request.json()
+        return await behavior.respond(len(emails), {"data": [{"id": f"stub-{i}"} for i in range(len(emails))]})
+
+    return Starlette(routes=[
+        Route("/emails", send_email, methods=["POST"]),
+        Route("/emails/batch", send_batch, methods=["POST"]),
+    ])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """
+    Runs an ASGI app under uvicorn on a background thread.
+    """
+
+    def __init__(self, app, port: int | None = None):
+        self.port = port or free_port()
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="off")
+        )
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"stub server on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    for name in ("sheets", "resend"):
+        group = parser.add_argument_group(f"{name} stub")
+        group.add_argument(f"--{name}-latency-ms", type=float, default=300 if name == "sheets" else 150)
+        group.add_argument(f"--{name}-jitter-ms", type=float, default=100)
+        group.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+        group.add_argument(f"--{name}-timeout-rate", type=float, default=0.0)
+        group.add_argument(f"--{name}-hang-seconds", type=float, default=30.0)
+
+
+def behavior_from_args(args, name: str) -> StubBehavior:
+    return StubBehavior(
+        latency_ms=getattr(args, f"{name}_latency_ms"),
+        jitter_ms=getattr(args, f"{name}_jitter_ms"),
+        error_rate=getattr(args, f"{name}_error_rate"),
+        timeout_rate=getattr(args, f"{name}_timeout_rate"),
+        hang_seconds=getattr(args, f"{name}_hang_seconds"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheets-port", type=int, default=8701)
+    parser.add_argument("--resend-port", type=int, default=8702)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    sheets = StubServer(sheets_app(behavior_from_args(args, "sheets")), args.sheets_port).start()
+    resend = StubServer(resend_app(behavior_from_args(args, "resend")), args.resend_port).start()
+    print(f"GOOGLE_SHEET_URL={sheets.url}/exec")
+    print(f"RESEND_API_URL={resend.url}/emails")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sheets.stop()
+        resend.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Gunicorn settings for the production server (see Procfile).
+
+Runs several uvicorn worker processes behind one listening socket. The app
+is imported once in the master (preload_app) and forked, so workers start
+without re-importing FastAPI/pydantic. Everything that holds sockets, threads
+or asyncio objects (HTTP client pool, outbox connection and worker,
+notification queue, log listener) is created per worker: in the app's
+lifespan, which runs after fork, or by an at-fork hook.
+
+uvicorn picks uvloop and httptools automatically when they are installed.
+
+Environment:
+    PORT                      port to bind (Railway sets it)
+    WEB_CONCURRENCY           worker processes (default: usable CPUs, see below)
+    GUNICORN_MAX_REQUESTS     recycle a worker after this many requests (0 = never)
+    GUNICORN_MAX_REQUESTS_JITTER  random extra requests so workers don't recycle together
+    GUNICORN_KEEPALIVE        seconds an idle keep-alive connection is kept open
+    GUNICORN_BACKLOG          pending connections the socket queues
+    GUNICORN_TIMEOUT          seconds before a silent worker is killed and replaced
+    GUNICORN_GRACEFUL_TIMEOUT seconds a worker gets to finish on restart/shutdown
+                              (at least SHUTDOWN_DRAIN_TIMEOUT + SHUTDOWN_SPILL_MARGIN)
+    SHUTDOWN_SPILL_MARGIN     seconds left after the drain to spill and close (default 5)
+"""
+import math
+import os
+
+
+def _usable_cpus() -> int:
+    """
+    CPUs this container may actually use: the cgroup quota when one is set
+    (os.cpu_count() reports the host's CPUs), else the affinity mask.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+# The webhook is I/O bound on an event loop, so one worker per CPU
+workers = int(os.getenv("WEB_CONCURRENCY") or _usable_cpus())
+# UvicornWorker that starts the shutdown drain on SIGTERM and cancels calls
+# still running after SHUTDOWN_DRAIN_TIMEOUT (src/server.py)
+worker_class = "src.server.DrainingUvicornWorker"
+preload_app = True
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+# Longer than typical load balancer idle timeouts, so the proxy closes first
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+# After the drain a worker still spills what is left and closes its sinks;
+# it must be done before gunicorn SIGKILLs it at graceful_timeout
+_drain = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+_spill_margin = float(os.getenv("SHUTDOWN_SPILL_MARGIN", "5"))
+graceful_timeout = max(int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "20")), math.ceil(_drain + _spill_margin))
+
+# Logs go through the app's JSON logger; skip gunicorn's access log
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
@@ -1,16 +1,39 @@
 if __name__ == "__main__":
-    try:
-        import uvicorn
-    except ImportError:
-        raise ImportError("uvicorn is required. Install it with: pip install uvicorn")
-    
     import os
+    import sys
 
     # Railway.app provides PORT env variable
     port = int(os.getenv("PORT", 5000))
+
+    if "--production" in sys.argv[1:]:
+        # Multi-process server: gunicorn with uvicorn workers (gunicorn.conf.py).
+        # gunicorn does not run on Windows; fall back to uvicorn's own workers there.
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            from src.server import serve
+
+            # uvicorn.run() with the drain starting at SIGTERM (src/server.py)
+            serve(
+                app="src.main:app",
+                host="0.0.0.0",
+                port=port,
+                workers=int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1),
+                timeout_keep_alive=int(os.getenv("GUNICORN_KEEPALIVE", "75")),
+                backlog=int(os.getenv("GUNICORN_BACKLOG", "2048")),
+                limit_max_requests=int(os.getenv("GUNICORN_MAX_REQUESTS", "10000")) or None,
+            )
+        else:
+            os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "src.main:app"])
+        sys.exit(0)
+
+    try:
+        from src.server import serve
+    except ImportError:
+        raise ImportError("uvicorn is required. Install it with: pip install uvicorn")
     
     # Bind to 0.0.0.0 for Railway deployment
-    uvicorn.run(
+    serve(
         app="src.main:app",
         host="0.0.0.0",
         port=port,
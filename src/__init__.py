@@ -1,9 +1,14 @@
+import time
+
+# Start of the app's own imports, for the startup report (src/startup.py)
+IMPORT_STARTED = time.perf_counter()
+
+import atexit
 import logging
-import sys
+
+from src.logging_config import configure_logging, stop_log_listener
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+# Structured JSON logs; formatting and stdout I/O run on a listener thread
+configure_logging()
+atexit.register(stop_log_listener)
@@ -1,28 +1,20 @@
-from src.schemas import (
-    FulfillmentResponse,
-    Message,
-    WebhookResponse,
-    WebhookRequest,
-    Text,
-    SessionInfo,
-)
+from src.schemas import WebhookRequest
+from src.responses import WebhookJSONResponse, parameter_delta, render_response
+from src.registry import register_handler
 
 
-async def default_welcome_intent(webhook_request: WebhookRequest) -> WebhookResponse:
+@register_handler("defaultWelcomeIntent", fields=("languageCode", "sessionInfo"))
+async def default_welcome_intent(webhook_request: WebhookRequest) -> WebhookJSONResponse:
     # Safely get parameters and count
     parameters = webhook_request.sessionInfo.parameters or {}
     count = parameters.get("count", 0)
-    return WebhookResponse(
-        fulfillmentResponse=FulfillmentResponse(
-            messages=[
-                Message(text=Text(text=["Added a variable in session."])),
-            ]
-        ),
-        sessionInfo=SessionInfo(
-            session=webhook_request.sessionInfo.session,
-            parameters={
-                "someKey": "somevalue",
-                "count": count + 1,
-            },
-        ),
+    return render_response(
+        "session_variable_added",
+        webhook_request.languageCode,
+        session=webhook_request.sessionInfo.session,
+        # Only what changed; CX merges it into the session
+        parameters=parameter_delta(parameters, {
+            "someKey": "somevalue",
+            "count": count + 1,
+        }),
     )
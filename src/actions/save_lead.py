@@ -1,58 +1,82 @@
-from fastapi import BackgroundTasks
-from src.schemas import (
-    FulfillmentResponse,
-    Message,
-    WebhookResponse,
-    WebhookRequest,
-    Text,
-    SessionInfo,
-)
-from src.utils import send_consultation_lead_to_webhook, send_email_notification
-from src.config import RESPONSES
+from src import logging
+from src.config import EMAIL_NOTIFICATIONS_ENABLED
+from src.schemas import WebhookRequest
+from src.responses import WebhookJSONResponse, render_response
+from src.notifications import enqueue_notification
+from src.outbox import enqueue_lead
+from src.sinks import write_lead
+from src.dedup import DUPLICATE, NEW, lead_index
+from src.tenants import tenants
+from src.registry import register_handler
 
-async def save_lead(webhook_request: WebhookRequest) -> WebhookResponse:
+logger = logging.getLogger(__name__)
+
+
+@register_handler("save_lead", fields=("languageCode", "sessionInfo"))
+async def save_lead(webhook_request: WebhookRequest) -> WebhookJSONResponse:
     """
     LEGACY: Handles old pricing calculator leads (if needed).
     Now redirects to save_consultation_lead.
     """
-    parameters = webhook_request.sessionInfo.parameters or {}
     language_code = webhook_request.languageCode or "en"
     
-    response_text = RESPONSES.get(language_code, RESPONSES["en"])["consultation_saved"]
-    
-    return WebhookResponse(
-        fulfillmentResponse=FulfillmentResponse(
-            messages=[Message(text=Text(text=[response_text]))]
-        ),
-        sessionInfo=SessionInfo(
-            session=webhook_request.sessionInfo.session,
-            parameters={**parameters}
-        )
+    # Pre-serialized bilingual reply; no parameters change, so CX keeps the
+    # session's parameters as they are
+    return render_response(
+        "consultation_saved",
+        language_code,
+        session=webhook_request.sessionInfo.session,
     )
 
 
-async def send_email_in_background(lead_data: dict):
+def _lead_from_request(webhook_request: WebhookRequest) -> dict:
+    parameters = webhook_request.sessionInfo.parameters or {}
+    language_code = webhook_request.languageCode or "en"
+    return {
+        "name": parameters.get("user_name"),
+        "email": parameters.get("user_email"),
+        "objective": parameters.get("objective"),
+        "processes_to_automate": parameters.get("processes_text"),
+        "current_tools": parameters.get("current_tools"),
+        "main_challenge": parameters.get("main_challenge"),
+        "language": language_code,
+        "timestamp": __import__("datetime").datetime.utcnow().isoformat(),
+        # Agent -> tenant: picks the sheet, inbox, pool and breakers downstream
+        "tenant": tenants.for_session(webhook_request.sessionInfo.session).id,
+    }
+
+
+async def keep_shed_lead(webhook_request: WebhookRequest):
     """
-    Background task to send email without blocking webhook response
+    The user of a shed call is still told the lead was noted: keep it in the
+    durable outbox, which delivers it to Google Sheets once load allows (no
+    email is sent for it).
     """
-    try:
-        email_sent = send_email_notification(lead_data)
-        if email_sent:
-            print("✅ SUCCESS: Email notification sent successfully!")
-        else:
-            print("⚠️ WARNING: Email notification failed, but lead was saved to Google Sheet.")
-    except Exception as e:
-        print(f"⚠️ WARNING: Email notification error (lead still saved): {e}")
+    lead_data = _lead_from_request(webhook_request)
+    lead_id = await enqueue_lead(lead_data)
+    logger.info("Lead of a shed call kept in the outbox.", extra={"fields": {"lead_id": lead_id}})
 
 
-async def save_consultation_lead(webhook_request: WebhookRequest, background_tasks: BackgroundTasks = None) -> WebhookResponse:
+@register_handler("save_consultation_lead", fields=("languageCode", "sessionInfo"), on_shed=keep_shed_lead)
+async def save_consultation_lead(webhook_request: WebhookRequest) -> WebhookJSONResponse:
     """
     NEW: Handles the consultation qualification flow.
     Captures business objectives, processes, tools, and challenges.
     Sends structured data to Google Sheets for manual proposal creation.
     
-    OPTIMIZED: Email sending is now a background task (non-blocking)
-    This prevents webhook timeouts on Railway where SMTP is slow.
+    OPTIMIZED: Email sending is handed to the notification worker pool
+    (src/notifications.py), so Resend latency never blocks the event loop.
+    
+    SINKS: The lead is written to every sink in LEAD_SINKS concurrently
+    (src/sinks.py). For Apps Script that is ACK-FIRST: with
+    LEAD_OUTBOX_ENABLED the lead is written to the local outbox and the
+    outbox worker delivers it to Google Sheets with retries; otherwise the
+    call is bounded by the request's deadline budget and deferred to the
+    outbox on failure.
+    
+    DEDUPLICATED: A repeat submission from the same email within
+    LEAD_DEDUP_WINDOW is answered without any write when the answers are
+    unchanged, or sent as an update of the original lead (no email).
     
     Parameters expected from Dialogflow CX:
     - user_name: Contact name
@@ -62,40 +86,50 @@ async def save_consultation_lead(webhook_request: WebhookRequest, background_tas
     - current_tools: Current tools in use (free text)
     - main_challenge: Main challenge (from @MainChallenge entity)
     """
-    parameters = webhook_request.sessionInfo.parameters or {}
     language_code = webhook_request.languageCode or "en"
     
     # Extract consultation data from parameters
-    lead_data = {
-        "name": parameters.get("user_name"),
-        "email": parameters.get("user_email"),
-        "objective": parameters.get("objective"),
-        "processes_to_automate": parameters.get("processes_text"),
-        "current_tools": parameters.get("current_tools"),
-        "main_challenge": parameters.get("main_challenge"),
-        "language": language_code,
-        "timestamp": __import__("datetime").datetime.utcnow().isoformat()
-    }
+    lead_data = _lead_from_request(webhook_request)
     
-    # Send to Google Apps Script (SYNCHRONOUS - fast)
-    success = send_consultation_lead_to_webhook(lead_data)
+    dedup_outcome = lead_index.check(lead_data) if lead_index is not None else NEW
+    while dedup_outcome == DUPLICATE and not await lead_index.original_saved(lead_data):
+        # The submission this repeats could not be saved: this one takes its place
+        dedup_outcome = lead_index.check(lead_data)
+    if dedup_outcome == DUPLICATE:
+        # Already saved within the dedup window: no Sheets write, no email
+        return render_response(
+            "consultation_saved",
+            language_code,
+            session=webhook_request.sessionInfo.session,
+        )
     
-    # Send email notification in BACKGROUND (non-blocking)
+    # Fan out to the configured sinks (Apps Script via the outbox, local
+    # SQLite / NDJSON); LEAD_SINKS_REQUIRED decides what must succeed
+    try:
+        success, stored = await write_lead(lead_data)
+    except BaseException:
+        # Cut off (e.g. at shutdown): don't leave repeats waiting on this lead
+        if lead_index is not None:
+            lead_index.forget(lead_data)
+        raise
+    if lead_index is not None:
+        if stored:
+            lead_index.saved(lead_data)
+        else:
+            # Not stored anywhere: the user's retry must count as new
+            lead_index.forget(lead_data)
+    
+    # Queue email notification for the worker pool (non-blocking)
     # This prevents Dialogflow timeouts on Railway
-    if success and background_tasks:
-        background_tasks.add_task(send_email_in_background, lead_data)
-        print("📧 Email notification scheduled in background (non-blocking)")
+    # Updates of an already notified lead don't send another email
+    if success and dedup_outcome == NEW and EMAIL_NOTIFICATIONS_ENABLED and await enqueue_notification(lead_data):
+        logger.info("Email notification queued (non-blocking)")
     
-    # Select bilingual response
+    # Select bilingual response (pre-serialized catalog, fr-CA -> fr -> en).
+    # The lead changes no session parameters, so none are sent back.
     response_key = "consultation_saved" if success else "consultation_error"
-    response_text = RESPONSES.get(language_code, RESPONSES["en"])[response_key]
-    
-    return WebhookResponse(
-        fulfillmentResponse=FulfillmentResponse(
-            messages=[Message(text=Text(text=[response_text]))]
-        ),
-        sessionInfo=SessionInfo(
-            session=webhook_request.sessionInfo.session,
-            parameters={**parameters}
-        )
+    return render_response(
+        response_key,
+        language_code,
+        session=webhook_request.sessionInfo.session,
     )
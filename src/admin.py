@@ -0,0 +1,85 @@
+"""
+Admin endpoints, enabled by setting ADMIN_TOKEN and called with
+``Authorization: Bearer <ADMIN_TOKEN>``.
+"""
+import asyncio
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from src.admission import admission
+from src.config import ADMIN_TOKEN
+from src.sinks import configured_sink_names, get_sink
+from src.tenants import tenants
+
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        # Don't reveal that the endpoints exist when they are disabled
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False)
+
+
+@router.get("/leads/export")
+async def export_leads(sink: str | None = None, since: str | None = None):
+    """
+    Streams the leads held by a local sink (sqlite or ndjson) as NDJSON.
+
+    Args:
+        sink: Sink to read; defaults to the first active exportable sink
+        since: Only leads whose timestamp is >= this ISO 8601 value
+    """
+    names = [sink] if sink else configured_sink_names()
+    source = next((get_sink(name) for name in names if get_sink(name) is not None and get_sink(name).exportable), None)
+    if source is None:
+        raise HTTPException(status_code=404, detail="No active exportable lead sink (enable sqlite or ndjson in LEAD_SINKS)")
+    return StreamingResponse(
+        source.export(since),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="leads-{source.name}.ndjson"'},
+    )
+
+
+@router.get("/admission")
+def get_admission_settings():
+    return admission.settings()
+
+
+@router.patch("/admission")
+async def update_admission_settings(changes: dict):
+    """
+    Changes admission limits of this worker process, e.g.
+    {"max_concurrency": 100, "tag_concurrency": {"save_consultation_lead": 20}}.
+    Async so it runs on the event loop: raising a limit wakes waiting calls.
+    """
+    unknown = set(changes) - set(admission.settings())
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown settings: {', '.join(sorted(unknown))}")
+    try:
+        return admission.update(**changes)
+    except (TypeError, ValueError, AttributeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid setting value: {e}")
+
+
+@router.get("/tenants")
+def get_tenants():
+    return {"generation": tenants.generation, "tenants": {tenant.id: tenant.summary() for tenant in tenants.all()}}
+
+
+@router.post("/tenants/reload")
+async def reload_tenants():
+    """
+    Re-reads TENANTS_FILE now in this worker process (it is otherwise
+    re-read within TENANTS_RELOAD_INTERVAL of a change).
+    """
+    if not tenants.path:
+        raise HTTPException(status_code=404, detail="TENANTS_FILE is not set")
+    if not await asyncio.to_thread(tenants.reload, True):
+        raise HTTPException(status_code=422, detail="Could not load TENANTS_FILE; the previous tenants are still in use")
+    return get_tenants()
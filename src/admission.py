@@ -0,0 +1,317 @@
+"""
+Admission control and load shedding for /webhook.
+
+Before a handler runs, a request must pass, in order:
+
+1. the global token bucket (ADMISSION_RATE / ADMISSION_BURST),
+2. its session's token bucket (ADMISSION_SESSION_RATE / _BURST), which
+   stops one conversation or a retry storm from taking all the capacity,
+3. its tenant's concurrency limit (the tenant's max_concurrency, see
+   src/tenants.py), so one tenant's traffic cannot fill the global limit,
+4. the global concurrency limit (ADMISSION_MAX_CONCURRENCY),
+5. its tag's concurrency limit (ADMISSION_TAG_CONCURRENCY, "tag=n,...").
+
+When a concurrency limit is full the request may wait up to
+ADMISSION_QUEUE_TIMEOUT for a slot ("queued"); otherwise, or when a bucket
+is empty, it is shed with AdmissionRejected and the route answers at once
+with the localized consultation_error reply. Once drain() is called (app
+shutdown) every new request is shed with reason "draining", even with
+admission control disabled.
+
+A rate or limit of 0 means unlimited. Limits are per worker process and
+can be changed at runtime (update(), exposed on /admin/admission).
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from src import logging
+from src.config import (
+    ADMISSION_CONTROL_ENABLED,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_TAG_CONCURRENCY,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_RATE,
+    ADMISSION_BURST,
+    ADMISSION_SESSION_RATE,
+    ADMISSION_SESSION_BURST,
+    ADMISSION_MAX_SESSIONS,
+)
+from src.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is shed; ``reason`` names the limit that was hit.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"request shed ({reason})")
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    ``rate`` tokens per second up to ``burst``; a rate of 0 never limits.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class ConcurrencyLimit:
+    """
+    Counting limit whose size can change while requests hold slots; waiters
+    are served in arrival order. A limit of 0 never limits.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: deque = deque()
+
+    def _has_room(self) -> bool:
+        return self.limit <= 0 or self.active < self.limit
+
+    async def acquire(self, timeout: float) -> str | None:
+        """
+        Returns "admitted" or "queued" once a slot is held, None if none
+        freed up within ``timeout``.
+        """
+        if self._has_room() and not self._waiters:
+            self.active += 1
+            return "admitted"
+        if timeout <= 0:
+            return None
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        granted = False
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            granted = True
+            return "queued"
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if not granted:
+                if waiter.done() and not waiter.cancelled():
+                    # Slot handed over just as we gave up (timeout or cancellation)
+                    self.release()
+                else:
+                    waiter.cancel()
+                    self._waiters.remove(waiter)
+
+    def release(self):
+        self.active -= 1
+        self.wake()
+
+    def wake(self):
+        # Hand freed slots (or a raised limit) to waiters, oldest first
+        while self._waiters and self._has_room():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+
+class _Ticket:
+    __slots__ = ("_limits",)
+
+    def __init__(self, limits: tuple):
+        self._limits = limits
+
+    def release(self):
+        for limit in self._limits:
+            limit.release()
+        self._limits = ()
+
+
+def _parse_tag_limits(spec: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tag, _, value = item.partition("=")
+        limits[tag.strip()] = int(value)
+    return limits
+
+
+class AdmissionController:
+    """
+    Global, per-tenant and per-tag concurrency limits plus global and
+    per-session token buckets (sessions kept in a bounded LRU).
+    """
+
+    def __init__(self):
+        self.enabled = ADMISSION_CONTROL_ENABLED
+        self.draining = False
+        self.queue_timeout = ADMISSION_QUEUE_TIMEOUT
+        self.global_limit = ConcurrencyLimit(ADMISSION_MAX_CONCURRENCY)
+        self.tag_limits = {tag: ConcurrencyLimit(n) for tag, n in _parse_tag_limits(ADMISSION_TAG_CONCURRENCY).items()}
+        self.tenant_limits: dict = {}
+        self.global_bucket = TokenBucket(ADMISSION_RATE, ADMISSION_BURST)
+        self.session_rate = ADMISSION_SESSION_RATE
+        self.session_burst = ADMISSION_SESSION_BURST
+        self._session_buckets: OrderedDict = OrderedDict()
+        self.counts: dict = {}
+
+    def _count(self, tag: str, decision: str, reason: str = ""):
+        key = (tag, decision, reason)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _session_bucket(self, session: str) -> TokenBucket:
+        bucket = self._session_buckets.get(session)
+        if bucket is None:
+            bucket = self._session_buckets[session] = TokenBucket(self.session_rate, self.session_burst)
+            while len(self._session_buckets) > ADMISSION_MAX_SESSIONS:
+                self._session_buckets.popitem(last=False)
+        else:
+            self._session_buckets.move_to_end(session)
+        return bucket
+
+    def _tenant_limit(self, tenant) -> ConcurrencyLimit | None:
+        if tenant is None:
+            return None
+        limit = self.tenant_limits.get(tenant.id)
+        if limit is None:
+            limit = self.tenant_limits[tenant.id] = ConcurrencyLimit(tenant.max_concurrency)
+        elif limit.limit != tenant.max_concurrency:
+            # Tenant file reloaded with a new limit
+            limit.limit = tenant.max_concurrency
+            limit.wake()
+        return limit
+
+    def _shed(self, tag: str, reason: str):
+        self._count(tag, "shed", reason)
+        # INFO is sampled (LOG_INFO_SAMPLE_RATE), so a shedding storm doesn't flood the logs
+        logger.info(f"Request shed ({reason})", extra={"fields": {"tag": tag, "reason": reason}})
+        raise AdmissionRejected(reason)
+
+    async def admit(self, tag: str, session: str | None, tenant=None) -> _Ticket:
+        """
+        Waits for admission; release the returned ticket when the handler is done.
+        ``tenant`` (a src.tenants.Tenant) selects the tenant limit.
+
+        Raises:
+            AdmissionRejected: if the request is shed
+        """
+        if self.draining:
+            self._shed(tag, "draining")
+        if not self.enabled:
+            return _Ticket(())
+        now = time.monotonic()
+        if not self.global_bucket.try_acquire(now):
+            self._shed(tag, "rate")
+        if session and self.session_rate > 0 and not self._session_bucket(session).try_acquire(now):
+            self._shed(tag, "session_rate")
+
+        # Slots are taken tenant -> global -> tag; on a shed, the ones held are given back
+        held = []
+        decisions = []
+        limits = (
+            (self._tenant_limit(tenant), "tenant_concurrency"),
+            (self.global_limit, "concurrency"),
+            (self.tag_limits.get(tag), "tag_concurrency"),
+        )
+        try:
+            for limit, reason in limits:
+                if limit is None:
+                    continue
+                decision = await limit.acquire(self.queue_timeout)
+                if decision is None:
+                    self._shed(tag, reason)
+                held.append(limit)
+                decisions.append(decision)
+        except BaseException:
+            _Ticket(tuple(held)).release()
+            raise
+        self._count(tag, "queued" if "queued" in decisions else "admitted")
+        return _Ticket(tuple(reversed(held)))
+
+    def drain(self, draining: bool = True):
+        """
+        Sheds every new request from now on; requests already admitted finish.
+        """
+        self.draining = draining
+
+    def settings(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.global_limit.limit,
+            "tag_concurrency": {tag: limit.limit for tag, limit in self.tag_limits.items()},
+            "queue_timeout": self.queue_timeout,
+            "rate": self.global_bucket.rate,
+            "burst": self.global_bucket.burst,
+            "session_rate": self.session_rate,
+            "session_burst": self.session_burst,
+        }
+
+    def update(self, **changes) -> dict:
+        """
+        Changes limits at runtime; keys are those of settings(). Returns the
+        new settings.
+        """
+        if "enabled" in changes:
+            self.enabled = bool(changes["enabled"])
+        if "queue_timeout" in changes:
+            self.queue_timeout = float(changes["queue_timeout"])
+        if "max_concurrency" in changes:
+            self.global_limit.limit = int(changes["max_concurrency"])
+            self.global_limit.wake()
+        for tag, value in (changes.get("tag_concurrency") or {}).items():
+            limit = self.tag_limits.get(tag)
+            if limit is None:
+                self.tag_limits[tag] = ConcurrencyLimit(int(value))
+            else:
+                limit.limit = int(value)
+                limit.wake()
+        if "rate" in changes or "burst" in changes:
+            self.global_bucket.rate = float(changes.get("rate", self.global_bucket.rate))
+            self.global_bucket.burst = max(float(changes.get("burst", self.global_bucket.burst)), 1.0)
+        if "session_rate" in changes or "session_burst" in changes:
+            self.session_rate = float(changes.get("session_rate", self.session_rate))
+            self.session_burst = float(changes.get("session_burst", self.session_burst))
+            # New buckets pick up the settings; drop the old ones
+            self._session_buckets.clear()
+        settings = self.settings()
+        logger.info("Admission limits updated.", extra={"fields": settings})
+        return settings
+
+
+# Process-wide controller used by the /webhook routes
+admission = AdmissionController()
+
+
+@register_collector
+def _collect_admission_metrics():
+    for (tag, decision, reason), count in list(admission.counts.items()):
+        yield ("webhook_admission_total", "counter", "Webhook admission decisions (admitted, queued, shed).",
+               {"tag": tag, "decision": decision, "reason": reason}, count)
+    yield ("webhook_admission_active", "gauge", "Requests holding an admission slot.",
+           {"tag": "all"}, admission.global_limit.active)
+    for tag, limit in admission.tag_limits.items():
+        yield ("webhook_admission_active", "gauge", "Requests holding an admission slot.", {"tag": tag}, limit.active)
+    yield ("webhook_admission_limit", "gauge", "Concurrency limit (0 = unlimited).",
+           {"tag": "all"}, admission.global_limit.limit)
+    for tag, limit in admission.tag_limits.items():
+        yield ("webhook_admission_limit", "gauge", "Concurrency limit (0 = unlimited).", {"tag": tag}, limit.limit)
+    for tenant_id, limit in admission.tenant_limits.items():
+        yield ("webhook_admission_tenant_active", "gauge", "Requests holding a tenant's admission slot.",
+               {"tenant": tenant_id}, limit.active)
+        yield ("webhook_admission_tenant_limit", "gauge", "Tenant concurrency limit (0 = unlimited).",
+               {"tenant": tenant_id}, limit.limit)
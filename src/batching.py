@@ -0,0 +1,140 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List
+
+from src import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces items submitted within a short window into one bulk call.
+
+    A batch is flushed when it reaches ``max_batch_size`` items or when
+    ``max_wait`` seconds have passed since its first item arrived, whichever
+    comes first. ``send_batch`` receives the list of items and must return one
+    result per item; every caller of ``submit`` gets its own item's result.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int,
+        max_wait: float,
+        name: str = "batcher",
+    ):
+        self.send_batch = send_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.name = name
+        self._pending: list = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._in_flight: set = set()
+        # Tuning stats
+        self.batches_sent = 0
+        self.items_sent = 0
+        self.last_batch_size = 0
+        self.flush_latency_total = 0.0
+        self.flush_latency_max = 0.0
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Adds an item to the current batch and waits for its result. If the
+        wait is cancelled before the batch is flushed, the item is dropped
+        from it; once flushed, it is sent regardless.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = (item, future, loop.time())
+        self._pending.append(entry)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. its deadline) before the batch left:
+            # take the item out so it isn't sent behind the caller's back
+            self._discard(entry)
+            raise
+
+    def withdraw(self, item: Any) -> bool:
+        """
+        Takes ``item`` out of the batch that has not been flushed yet and
+        cancels its submit(). Returns False if its batch already left.
+        """
+        for entry in self._pending:
+            if entry[0] is item:
+                self._discard(entry)
+                entry[1].cancel()
+                return True
+        return False
+
+    def _discard(self, entry: tuple):
+        for index, pending in enumerate(self._pending):
+            if pending is entry:
+                del self._pending[index]
+                break
+        if not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: list):
+        items = [item for item, _, _ in batch]
+        try:
+            results = await self.send_batch(items)
+            if len(results) != len(items):
+                raise ValueError(f"{self.name}: expected {len(items)} results, got {len(results)}")
+        except Exception as e:
+            logger.error(f"{self.name}: batch of {len(items)} failed -> {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+        # Flush latency = first item enqueued -> batch result delivered
+        latency = asyncio.get_running_loop().time() - batch[0][2]
+        self.batches_sent += 1
+        self.items_sent += len(items)
+        self.last_batch_size = len(items)
+        self.flush_latency_total += latency
+        self.flush_latency_max = max(self.flush_latency_max, latency)
+
+    async def close(self):
+        """
+        Flushes anything still pending and waits for in-flight batches.
+        """
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_seconds": self.max_wait,
+            "pending": len(self._pending),
+            "batches_sent": self.batches_sent,
+            "items_sent": self.items_sent,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": self.items_sent / self.batches_sent if self.batches_sent else 0.0,
+            "avg_flush_latency_seconds": self.flush_latency_total / self.batches_sent if self.batches_sent else 0.0,
+            "max_flush_latency_seconds": self.flush_latency_max,
+        }
@@ -0,0 +1,242 @@
+"""
+Circuit breakers for downstream dependencies (Apps Script, Resend).
+
+A breaker counts call outcomes in a rolling time window. Once the window has
+at least CIRCUIT_MIN_CALLS calls and the failure rate reaches the threshold,
+the breaker opens: calls are rejected immediately with CircuitOpenError, so
+the caller goes straight to its fallback (error reply, outbox retry) instead
+of waiting for a timeout. After the cooldown the breaker lets a few trial
+calls through (half-open); if they all succeed it closes again, and any
+failure re-opens it.
+
+Breakers are per dependency and tenant (get_breaker), so one tenant's
+failing Apps Script never blocks the other tenants' calls.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from src import logging
+from src.config import (
+    CIRCUIT_BREAKER_ENABLED,
+    CIRCUIT_FAILURE_RATE_THRESHOLD,
+    CIRCUIT_WINDOW_SECONDS,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_COOLDOWN_SECONDS,
+    CIRCUIT_HALF_OPEN_MAX_CALLS,
+)
+from src.deadline import BudgetExhausted, DeadlineExceeded
+from src.metrics import register_collector
+from src.tenants import DEFAULT_TENANT_ID
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose breaker is open.
+    """
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """
+    Whether an error says something about the dependency's health: timeouts,
+    connection errors and 5xx/429 answers count, other 4xx answers do not,
+    nor does a call never started for lack of budget.
+    """
+    if isinstance(error, BudgetExhausted):
+        return False
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, (httpx.TransportError, DeadlineExceeded, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a rolling window of 1 s buckets.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = CIRCUIT_FAILURE_RATE_THRESHOLD,
+        window: float = CIRCUIT_WINDOW_SECONDS,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        cooldown: float = CIRCUIT_COOLDOWN_SECONDS,
+        half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS,
+        enabled: bool = CIRCUIT_BREAKER_ENABLED,
+        tenant: str = DEFAULT_TENANT_ID,
+    ):
+        self.name = name
+        self.tenant = tenant
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.half_open_max_calls = half_open_max_calls
+        self.enabled = enabled
+        self.state = CLOSED
+        self._buckets: deque = deque()  # [second, successes, failures]
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._trial_successes = 0
+        self.rejected = 0
+        self.transitions = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+
+    def _transition(self, state: str, reason: str):
+        previous, self.state = self.state, state
+        self.transitions[state] += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != CLOSED:
+            self._trial_calls = self._trial_successes = 0
+        else:
+            self._buckets.clear()
+        log = logger.warning if state == OPEN else logger.info
+        label = self.name if self.tenant == DEFAULT_TENANT_ID else f"{self.name} ({self.tenant})"
+        log(
+            f"Circuit breaker {label}: {previous} -> {state} ({reason})",
+            extra={"fields": {"dependency": self.name, "tenant": self.tenant, "from_state": previous, "to_state": state}},
+        )
+
+    def _window_counts(self, now: float) -> tuple:
+        horizon = int(now) - self.window
+        while self._buckets and self._buckets[0][0] <= horizon:
+            self._buckets.popleft()
+        successes = sum(bucket[1] for bucket in self._buckets)
+        failures = sum(bucket[2] for bucket in self._buckets)
+        return successes, failures
+
+    def _record_closed(self, failed: bool):
+        now = time.monotonic()
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        self._buckets[-1][2 if failed else 1] += 1
+        if not failed:
+            return
+        successes, failures = self._window_counts(now)
+        calls = successes + failures
+        if calls >= self.min_calls and failures / calls >= self.failure_rate_threshold:
+            self._transition(OPEN, f"{failures}/{calls} calls failed in {self.window:.0f}s")
+
+    def rejecting(self) -> bool:
+        """
+        True while calls would be rejected (without taking a half-open trial slot).
+        """
+        if not self.enabled or self.state == CLOSED:
+            return False
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at < self.cooldown
+        return self._trial_calls >= self.half_open_max_calls
+
+    def cooldown_remaining(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def _acquire(self) -> bool:
+        if not self.enabled or self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._transition(HALF_OPEN, f"cooldown of {self.cooldown:.0f}s elapsed")
+        if self._trial_calls >= self.half_open_max_calls:
+            return False
+        self._trial_calls += 1
+        return True
+
+    def record_success(self, trial: bool):
+        if trial and self.state == HALF_OPEN:
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_max_calls:
+                self._transition(CLOSED, f"{self._trial_successes} trial calls succeeded")
+        elif self.state == CLOSED:
+            self._record_closed(failed=False)
+
+    def record_failure(self, trial: bool):
+        if trial and self.state == HALF_OPEN:
+            self._transition(OPEN, "trial call failed")
+        elif self.state == CLOSED:
+            self._record_closed(failed=True)
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs ``func()`` through the breaker.
+
+        Raises:
+            CircuitOpenError: if the breaker is open (nothing is sent)
+        """
+        if not self._acquire():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        trial = self.state == HALF_OPEN
+        try:
+            result = await func()
+        except (asyncio.CancelledError, BudgetExhausted):
+            # Caller gave up, or had no time left to call: says nothing
+            # about the dependency
+            if trial and self.state == HALF_OPEN:
+                self._trial_calls -= 1
+            raise
+        except Exception as e:
+            if is_dependency_failure(e):
+                self.record_failure(trial)
+            else:
+                self.record_success(trial)
+            raise
+        self.record_success(trial)
+        return result
+
+    def stats(self) -> dict:
+        successes, failures = self._window_counts(time.monotonic())
+        return {
+            "state": self.state,
+            "window_successes": successes,
+            "window_failures": failures,
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions),
+        }
+
+
+_breakers: dict = {}
+
+
+def get_breaker(dependency: str, tenant: str = DEFAULT_TENANT_ID) -> CircuitBreaker:
+    """
+    Returns the breaker for ``dependency`` ("apps_script", "resend") as
+    used by ``tenant``, creating it on first use.
+    """
+    breaker = _breakers.get((dependency, tenant))
+    if breaker is None:
+        breaker = _breakers[(dependency, tenant)] = CircuitBreaker(dependency, tenant=tenant)
+    return breaker
+
+
+# The default tenant's breakers
+APPS_SCRIPT_BREAKER = get_breaker("apps_script")
+RESEND_BREAKER = get_breaker("resend")
+
+
+@register_collector
+def _collect_breaker_metrics():
+    for breaker in list(_breakers.values()):
+        stats = breaker.stats()
+        labels = {"dependency": breaker.name, "tenant": breaker.tenant}
+        yield ("circuit_breaker_state", "gauge", "Breaker state (0 closed, 1 half-open, 2 open).",
+               labels, _STATE_VALUES[stats["state"]])
+        yield ("circuit_breaker_rejected_total", "counter", "Calls rejected while the breaker was open.",
+               labels, stats["rejected"])
+        for state, count in stats["transitions"].items():
+            yield ("circuit_breaker_transitions_total", "counter", "Breaker state changes.",
+                   {**labels, "to_state": state}, count)
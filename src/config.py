@@ -1,8 +1,12 @@
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from the project's .env file, if there is one.
+# Deployments set real env vars, so python-dotenv is only imported locally.
+_DOTENV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.exists(_DOTENV_PATH):
+    from dotenv import load_dotenv
+
+    load_dotenv(_DOTENV_PATH)
 
 # Google Apps Script Web App URL for Google Sheets integration
 GOOGLE_SHEETS_WEBAPP_URL = os.getenv(
@@ -10,11 +14,165 @@ GOOGLE_SHEETS_WEBAPP_URL = os.getenv(
     "https://script.google.com/macros/s/AKfycbw9M29dtemVGCjRjCsejBZrIbUgBb3VQycjHMytB9jFr_ktnrt3Ty4Ioz3BHzoGQzdD2g/exec"
 )
 
+# Opt-in webhook fast path: orjson decoding, per-handler partial validation
+# and direct response serialization (see src/main.py)
+WEBHOOK_FAST_PATH = os.getenv("WEBHOOK_FAST_PATH", "false").lower() == "true"
+
+# Idempotent handling of Dialogflow CX retries (keyed on detectIntentResponseId)
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "300"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# Per-request deadline budget. Dialogflow CX's webhook timeout defaults to 5s;
+# set WEBHOOK_TIMEOUT_BUDGET to the value configured on the agent.
+WEBHOOK_TIMEOUT_BUDGET = float(os.getenv("WEBHOOK_TIMEOUT_BUDGET", "5"))
+DEADLINE_SAFETY_MARGIN = float(os.getenv("DEADLINE_SAFETY_MARGIN", "0.5"))
+# Hedged second attempts when a call passes its p95. Off by default: Apps
+# Script writes are not idempotent unless the script de-duplicates on lead_id.
+HEDGE_REQUESTS_ENABLED = os.getenv("HEDGE_REQUESTS_ENABLED", "false").lower() == "true"
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.1"))
+LATENCY_WINDOW_SIZE = int(os.getenv("LATENCY_WINDOW_SIZE", "500"))
+LATENCY_MIN_SAMPLES = int(os.getenv("LATENCY_MIN_SAMPLES", "20"))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))
+ADAPTIVE_TIMEOUT_FLOOR = float(os.getenv("ADAPTIVE_TIMEOUT_FLOOR", "1"))
+
+# Circuit breakers for Apps Script / Resend: open when at least
+# CIRCUIT_MIN_CALLS calls in the rolling window failed at the threshold rate,
+# reject calls for the cooldown, then let a few trial calls through
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_FAILURE_RATE_THRESHOLD = float(os.getenv("CIRCUIT_FAILURE_RATE_THRESHOLD", "0.5"))
+CIRCUIT_WINDOW_SECONDS = int(os.getenv("CIRCUIT_WINDOW_SECONDS", "30"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "15"))
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "3"))
+
+# Admission control for /webhook (src/admission.py); 0 = unlimited.
+# ADMISSION_TAG_CONCURRENCY: "tag=n,..." limits per fulfillment tag.
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "200"))
+ADMISSION_TAG_CONCURRENCY = os.getenv("ADMISSION_TAG_CONCURRENCY", "save_consultation_lead=50")
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0.05"))
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "0"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "100"))
+ADMISSION_SESSION_RATE = float(os.getenv("ADMISSION_SESSION_RATE", "2"))
+ADMISSION_SESSION_BURST = float(os.getenv("ADMISSION_SESSION_BURST", "5"))
+ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "10000"))
+
+# Metrics (/metrics, Prometheus text format)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+LOOP_LAG_SAMPLE_INTERVAL = float(os.getenv("LOOP_LAG_SAMPLE_INTERVAL", "0.5"))
+
+# Event-loop stall detector and request profiling (src/profiling.py). A
+# watchdog thread logs the loop thread's stack once it hasn't run for
+# LOOP_STALL_THRESHOLD seconds. /webhook calls are profiled when sampled
+# (PROFILE_SAMPLE_RATE, 0-1) or when they carry PROFILE_HEADER set to
+# ADMIN_TOKEN; collapsed stacks are written to PROFILE_DIR.
+LOOP_STALL_DETECTOR_ENABLED = os.getenv("LOOP_STALL_DETECTOR_ENABLED", "true").lower() == "true"
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "x-profile-request")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+# Shared async HTTP client (connection pooling / timeouts)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Open connections (DNS, TCP, TLS) to the downstream hosts during startup,
+# so the first lead after a cold start doesn't pay for the handshakes
+# (runs as the health prober's first round; /readyz waits for it)
+HTTP_PREWARM_ENABLED = os.getenv("HTTP_PREWARM_ENABLED", "true").lower() == "true"
+HTTP_PREWARM_TIMEOUT = float(os.getenv("HTTP_PREWARM_TIMEOUT", "3"))
+
+# Micro-batching of Apps Script writes. The web app must accept the bulk
+# payload {"rows": [lead, ...]} when this is enabled.
+LEAD_BATCH_ENABLED = os.getenv("LEAD_BATCH_ENABLED", "false").lower() == "true"
+LEAD_BATCH_MAX_SIZE = int(os.getenv("LEAD_BATCH_MAX_SIZE", "25"))
+LEAD_BATCH_MAX_WAIT_MS = float(os.getenv("LEAD_BATCH_MAX_WAIT_MS", "200"))
+
+# Durable lead outbox (acknowledge-first delivery to Google Sheets)
+# On Railway, mount a volume at this path so pending leads survive redeploys.
+LEAD_OUTBOX_ENABLED = os.getenv("LEAD_OUTBOX_ENABLED", "true").lower() == "true"
+LEAD_OUTBOX_PATH = os.getenv("LEAD_OUTBOX_PATH", "data/lead_outbox.db")
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", "2"))
+OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", "900"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+# Rows claimed by a worker process are left alone by the others for this long
+OUTBOX_CLAIM_TIMEOUT = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", "120"))
+
+# Health / readiness (src/health.py). A background prober checks each
+# configured downstream every HEALTH_PROBE_INTERVAL; after
+# HEALTH_FAILURE_THRESHOLD failed probes in a row a dependency is down, and
+# /readyz fails if it is listed in HEALTH_CRITICAL_DEPENDENCIES. By default
+# nothing is critical while the lead outbox absorbs Apps Script outages.
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+HEALTH_FAILURE_THRESHOLD = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+HEALTH_CRITICAL_DEPENDENCIES = os.getenv(
+    "HEALTH_CRITICAL_DEPENDENCIES",
+    "" if LEAD_OUTBOX_ENABLED else "apps_script",
+)
+
+# Lead sinks (src/sinks.py): where leads are written, concurrently.
+# LEAD_SINKS_REQUIRED: "all", "any" or the sinks that must succeed before
+# the lead is acknowledged. LEAD_SINK_TIMEOUTS: "name=seconds,..." (sinks
+# without one, like apps_script, rely on the request deadline).
+LEAD_SINKS = os.getenv("LEAD_SINKS", "apps_script")
+LEAD_SINKS_REQUIRED = os.getenv("LEAD_SINKS_REQUIRED", "apps_script")
+LEAD_SINK_TIMEOUTS = os.getenv("LEAD_SINK_TIMEOUTS", "sqlite=2,ndjson=2")
+LEAD_SQLITE_PATH = os.getenv("LEAD_SQLITE_PATH", "data/leads.db")
+LEAD_NDJSON_PATH = os.getenv("LEAD_NDJSON_PATH", "data/leads.ndjson")
+
+# Bearer token for the /admin endpoints (unset = admin endpoints disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Lead de-duplication: repeat submissions from the same email (and name, with
+# LEAD_DEDUP_KEY=email_name) within the window are dropped when unchanged.
+# Changed ones become an "update" event (LEAD_DEDUP_ACTION=update) or are
+# dropped too (drop). Update events carry updates_lead_id; the Apps Script
+# web app should update that row instead of appending.
+LEAD_DEDUP_ENABLED = os.getenv("LEAD_DEDUP_ENABLED", "true").lower() == "true"
+LEAD_DEDUP_WINDOW = float(os.getenv("LEAD_DEDUP_WINDOW", "3600"))
+LEAD_DEDUP_MAX_ENTRIES = int(os.getenv("LEAD_DEDUP_MAX_ENTRIES", "50000"))
+LEAD_DEDUP_KEY = os.getenv("LEAD_DEDUP_KEY", "email")
+LEAD_DEDUP_ACTION = os.getenv("LEAD_DEDUP_ACTION", "update")
+
 # Email notification settings
 EMAIL_NOTIFICATIONS_ENABLED = os.getenv("EMAIL_NOTIFICATIONS_ENABLED", "false").lower() == "true"
 RESEND_API_KEY = os.getenv("RESEND_API_KEY", "")  # Resend.com API key
 EMAIL_FROM = os.getenv("EMAIL_FROM", "")  # Sender email (from Resend verified domain)
 EMAIL_TO = os.getenv("EMAIL_TO", "")  # Where to send notifications
+EMAIL_TEMPLATE_DIR = os.getenv(
+    "EMAIL_TEMPLATE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+)
+RESEND_API_URL = os.getenv("RESEND_API_URL", "https://api.resend.com/emails")
+RESEND_BATCH_API_URL = os.getenv("RESEND_BATCH_API_URL", RESEND_API_URL.rstrip("/") + "/batch")
+
+# Notification worker pool (email sends run off the request path)
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", "4"))
+NOTIFICATION_QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "1000"))
+NOTIFICATION_ENQUEUE_TIMEOUT = float(os.getenv("NOTIFICATION_ENQUEUE_TIMEOUT", "0.05"))
+NOTIFICATION_MAX_RETRIES = int(os.getenv("NOTIFICATION_MAX_RETRIES", "3"))
+NOTIFICATION_RETRY_BASE_DELAY = float(os.getenv("NOTIFICATION_RETRY_BASE_DELAY", "1"))
+NOTIFICATION_RETRY_MAX_DELAY = float(os.getenv("NOTIFICATION_RETRY_MAX_DELAY", "30"))
+# NOTIFICATION_MODE: "immediate" (one email per lead), "batched" (up to
+# NOTIFICATION_BATCH_SIZE lead emails per Resend batch call, waiting at most
+# NOTIFICATION_BATCH_WAIT to fill it) or "digest" (one summary email per
+# NOTIFICATION_DIGEST_INTERVAL or NOTIFICATION_DIGEST_MAX_LEADS leads).
+# NOTIFICATION_QUEUE_SIZE caps the leads buffered in memory; on shutdown
+# the buffer is flushed for up to NOTIFICATION_FLUSH_TIMEOUT.
+NOTIFICATION_MODE = os.getenv("NOTIFICATION_MODE", "immediate").lower()
+NOTIFICATION_BATCH_SIZE = min(int(os.getenv("NOTIFICATION_BATCH_SIZE", "50")), 100)  # Resend batch limit
+NOTIFICATION_BATCH_WAIT = float(os.getenv("NOTIFICATION_BATCH_WAIT", "5"))
+NOTIFICATION_DIGEST_INTERVAL = float(os.getenv("NOTIFICATION_DIGEST_INTERVAL", "900"))
+NOTIFICATION_DIGEST_MAX_LEADS = int(os.getenv("NOTIFICATION_DIGEST_MAX_LEADS", "50"))
+NOTIFICATION_FLUSH_TIMEOUT = float(os.getenv("NOTIFICATION_FLUSH_TIMEOUT", "10"))
 
 # Legacy SMTP settings (keeping for backward compatibility)
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
@@ -22,8 +180,12 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
 
 # Consultation qualification responses (Bilingual)
+# Locale keys are lowercase BCP-47 tags; unknown locales fall back along
+# their subtags (fr-CA -> fr) and then to DEFAULT_LANGUAGE.
+DEFAULT_LANGUAGE = "en"
 RESPONSES = {
     "en": {
+        "session_variable_added": "Added a variable in session.",
         "consultation_saved": "Thank you. Your details are saved. An expert will analyze your needs and contact you for a custom quote.",
         "consultation_error": "Your information has been noted. We'll contact you shortly to discuss your custom solution."
     },
@@ -32,3 +194,27 @@ RESPONSES = {
         "consultation_error": "Vos informations ont été notées. Nous vous contacterons bientôt pour discuter de votre solution personnalisée."
     }
 }
+
+# Multi-tenancy (src/tenants.py). The tenant is resolved from the agent ID in
+# sessionInfo.session. TENANTS_FILE (JSON) holds each tenant's Apps Script
+# URL, email settings, replies and limits; it is re-read when it changes
+# (checked every TENANTS_RELOAD_INTERVAL). Agents not listed are served as
+# the "default" tenant, configured by the settings above. Each tenant gets
+# its own HTTP pool (TENANT_MAX_CONNECTIONS) and concurrency limit
+# (TENANT_MAX_CONCURRENCY, 0 = unlimited) unless its entry overrides them.
+TENANTS_FILE = os.getenv("TENANTS_FILE", "")
+TENANTS_RELOAD_INTERVAL = float(os.getenv("TENANTS_RELOAD_INTERVAL", "10"))
+TENANT_MAX_CONNECTIONS = int(os.getenv("TENANT_MAX_CONNECTIONS", "20"))
+TENANT_MAX_CONCURRENCY = int(os.getenv("TENANT_MAX_CONCURRENCY", "50"))
+
+# Graceful shutdown (src/shutdown.py). On SIGTERM new /webhook calls are
+# shed, in-flight calls and queued notifications get SHUTDOWN_DRAIN_TIMEOUT
+# seconds to finish, and whatever is still undelivered is written to
+# SHUTDOWN_SPILL_PATH and replayed on the next start ("" disables the spill
+# file). The server starts the drain at the signal and cancels calls still
+# running after the timeout (src/server.py); gunicorn.conf.py keeps
+# graceful_timeout above it. Keep the timeout plus a few seconds for the
+# spill below the platform's kill grace period (Railway:
+# RAILWAY_DEPLOYMENT_DRAINING_SECONDS) and put the file on a volume.
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+SHUTDOWN_SPILL_PATH = os.getenv("SHUTDOWN_SPILL_PATH", "data/shutdown_spill.ndjson")
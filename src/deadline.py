@@ -0,0 +1,199 @@
+"""
+Per-request deadline budget, latency tracking and hedged downstream calls.
+
+Each /webhook request gets a Deadline when it arrives (DeadlineMiddleware).
+Downstream calls made while serving it use call_with_deadline(), which
+caps their timeout at the remaining budget and, once enough latency samples
+exist, at a multiple of the observed p99. With hedging enabled a second
+attempt starts when the first one passes the observed p95.
+"""
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from src import logging
+from src.config import (
+    WEBHOOK_TIMEOUT_BUDGET,
+    DEADLINE_SAFETY_MARGIN,
+    HEDGE_REQUESTS_ENABLED,
+    HEDGE_MIN_DELAY,
+    LATENCY_WINDOW_SIZE,
+    LATENCY_MIN_SAMPLES,
+    ADAPTIVE_TIMEOUT_MULTIPLIER,
+    ADAPTIVE_TIMEOUT_FLOOR,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the request's time budget is used up."""
+
+
+class BudgetExhausted(DeadlineExceeded):
+    """Raised when no budget is left to start a call (nothing was sent)."""
+
+
+class Deadline:
+    __slots__ = ("started_at", "expires_at")
+
+    def __init__(self, budget: float):
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+_current_deadline: ContextVar[Deadline | None] = ContextVar("current_deadline", default=None)
+
+
+def start_deadline(budget: float = WEBHOOK_TIMEOUT_BUDGET - DEADLINE_SAFETY_MARGIN) -> Deadline:
+    deadline = Deadline(budget)
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def current_deadline() -> Deadline | None:
+    """
+    Returns the deadline of the request being served (None in background work).
+    """
+    return _current_deadline.get()
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware starting the deadline as soon as a webhook call
+    arrives, before the body is read and validated.
+    """
+
+    def __init__(self, app, paths=("/webhook",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            start_deadline()
+        await self.app(scope, receive, send)
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent latencies with an EWMA and cached percentiles.
+    """
+
+    def __init__(self, name: str, window: int = LATENCY_WINDOW_SIZE, alpha: float = 0.2):
+        self.name = name
+        self.alpha = alpha
+        self.ewma: float | None = None
+        self._samples = deque(maxlen=window)
+        self._sorted: list | None = None
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self._sorted = None
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+
+    def percentile(self, q: float) -> float | None:
+        if len(self._samples) < LATENCY_MIN_SAMPLES:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        index = min(len(self._sorted) - 1, int(q * len(self._sorted)))
+        return self._sorted[index]
+
+    def stats(self) -> dict:
+        return {
+            "samples": len(self._samples),
+            "ewma": self.ewma,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+def adaptive_timeout(tracker: LatencyTracker, default_timeout: float) -> float:
+    """
+    Timeout for one downstream attempt: the default, tightened to a multiple
+    of the observed p99 and to the remaining request budget.
+    """
+    timeout = default_timeout
+    p99 = tracker.percentile(0.99)
+    if p99 is not None:
+        timeout = min(timeout, max(ADAPTIVE_TIMEOUT_FLOOR, p99 * ADAPTIVE_TIMEOUT_MULTIPLIER))
+    deadline = current_deadline()
+    if deadline is not None:
+        timeout = min(timeout, deadline.remaining())
+    return timeout
+
+
+async def _timed(attempt: Callable[[float], Awaitable[Any]], timeout: float, tracker: LatencyTracker):
+    started = time.monotonic()
+    result = await attempt(timeout)
+    tracker.observe(time.monotonic() - started)
+    return result
+
+
+async def call_with_deadline(
+    attempt: Callable[[float], Awaitable[Any]],
+    tracker: LatencyTracker,
+    default_timeout: float,
+    hedge: bool = HEDGE_REQUESTS_ENABLED,
+) -> Any:
+    """
+    Runs ``attempt(timeout)`` within the request's remaining budget.
+
+    When ``hedge`` is set and the first attempt is still running after the
+    tracker's p95, a second attempt is started and the first one to succeed
+    wins (the other is cancelled).
+
+    Raises:
+        BudgetExhausted: if no budget is left to start an attempt
+        DeadlineExceeded: if the budget is used up before an attempt succeeds
+    """
+    timeout = adaptive_timeout(tracker, default_timeout)
+    if timeout <= 0:
+        raise BudgetExhausted(f"{tracker.name}: no time budget left")
+
+    hedge_delay = tracker.percentile(0.95) if hedge else None
+    if hedge_delay is None or max(hedge_delay, HEDGE_MIN_DELAY) >= timeout:
+        try:
+            return await asyncio.wait_for(_timed(attempt, timeout, tracker), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{tracker.name}: timed out after {timeout:.2f}s")
+
+    hedge_delay = max(hedge_delay, HEDGE_MIN_DELAY)
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + timeout
+    tasks = {asyncio.ensure_future(_timed(attempt, timeout, tracker))}
+    hedged = False
+    last_error: BaseException | None = None
+    try:
+        while tasks:
+            wait_for = give_up_at - loop.time()
+            if not hedged:
+                wait_for = min(wait_for, hedge_delay)
+            if wait_for <= 0:
+                break
+            done, tasks = await asyncio.wait(tasks, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+            if not hedged and loop.time() < give_up_at:
+                # First attempt is slower than p95 (or failed): fire the hedge
+                hedged = True
+                logger.info(f"{tracker.name}: hedging after {hedge_delay * 1000:.0f}ms")
+                remaining = give_up_at - loop.time()
+                tasks.add(asyncio.ensure_future(_timed(attempt, remaining, tracker)))
+    finally:
+        for task in tasks:
+            task.cancel()
+    if last_error is not None and loop.time() < give_up_at:
+        raise last_error
+    raise DeadlineExceeded(f"{tracker.name}: timed out after {timeout:.2f}s")
@@ -0,0 +1,219 @@
+"""
+De-duplication of consultation leads.
+
+Users restart the flow or submit twice; each submission used to become its
+own Sheets row and email. Recent leads are indexed on their normalized email
+(optionally plus name) in a bounded LRU with a sliding time window. A repeat
+submission with the same answers is dropped. One with changed answers becomes
+an "update" event for the original lead: it goes to Sheets with
+``updates_lead_id`` set and no email is sent (or it is dropped as well, with
+LEAD_DEDUP_ACTION=drop).
+
+A lead is indexed when it is checked, before it is written, so concurrent
+repeats are caught; a repeat that arrives while the original is still being
+written waits for it (original_saved) and takes its place if it fails.
+
+The index is per process; with several server workers a duplicate that lands
+on another worker is not caught.
+"""
+import asyncio
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+from src import logging
+from src.config import (
+    LEAD_DEDUP_ENABLED,
+    LEAD_DEDUP_WINDOW,
+    LEAD_DEDUP_MAX_ENTRIES,
+    LEAD_DEDUP_KEY,
+    LEAD_DEDUP_ACTION,
+)
+from src.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+NEW = "new"
+UPDATE = "update"
+DUPLICATE = "duplicate"
+
+# Answers compared to tell a changed resubmission from a plain repeat
+_CONTENT_FIELDS = ("name", "objective", "processes_to_automate", "current_tools", "main_challenge")
+
+
+def normalize_email(email: str | None) -> str | None:
+    """
+    Lowercases and trims an address and drops a ``+tag`` from its local part
+    (``Jane.Doe+web@Example.com`` -> ``jane.doe@example.com``).
+    """
+    if not email:
+        return None
+    local, _, domain = email.strip().lower().rpartition("@")
+    if not local or not domain:
+        return None
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+def normalize_name(name: str | None) -> str:
+    # Case, accents and spacing differences are the same person
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+def dedup_key(lead_data: dict, include_name: bool = LEAD_DEDUP_KEY == "email_name") -> str | None:
+    email = normalize_email(lead_data.get("email"))
+    if email is None:
+        return None
+    key = f"{email}|{normalize_name(lead_data.get('name'))}" if include_name else email
+    # The same person contacting two tenants is two leads
+    tenant = lead_data.get("tenant")
+    return f"{tenant}|{key}" if tenant else key
+
+
+def _fingerprint(lead_data: dict) -> int:
+    return hash(tuple(str(lead_data.get(field) or "").strip() for field in _CONTENT_FIELDS))
+
+
+class LeadDedupIndex:
+    """
+    Bounded LRU of recent leads: key -> (expiry, lead_id, answers
+    fingerprint, lead_id of the write still pending, entry it replaced).
+    The replaced entry is what forget() puts back if that write fails.
+    """
+
+    def __init__(self, max_entries: int, window: float, action: str = LEAD_DEDUP_ACTION):
+        self.max_entries = max_entries
+        self.window = window
+        self.action = action
+        self._entries: OrderedDict = OrderedDict()
+        # lead_id -> future resolved with True/False once the lead is written or not
+        self._pending: dict = {}
+        self.counts = {NEW: 0, UPDATE: 0, DUPLICATE: 0}
+        self.evictions = 0
+
+    def check(self, lead_data: dict) -> str:
+        """
+        Classifies a lead as NEW, UPDATE or DUPLICATE and records it.
+
+        Every lead gets a ``lead_id``; an UPDATE also gets ``updates_lead_id``
+        (the lead it amends) and ``event: "update"``. With the "drop" action
+        changed resubmissions are reported as DUPLICATE too.
+        """
+        lead_id = lead_data.setdefault("lead_id", uuid.uuid4().hex)
+        key = dedup_key(lead_data)
+        if key is None:
+            self.counts[NEW] += 1
+            return NEW
+
+        now = time.monotonic()
+        fingerprint = _fingerprint(lead_data)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= now:
+            self._store(key, (now + self.window, lead_id, fingerprint, lead_id, None))
+            self._reserve(lead_id)
+            self.counts[NEW] += 1
+            return NEW
+
+        _, original_lead_id, previous_fingerprint, writing, replaced = entry
+        if fingerprint == previous_fingerprint or self.action == "drop":
+            # Sliding window: a user who keeps restarting the flow stays deduplicated
+            self._store(key, (now + self.window, original_lead_id, fingerprint, writing, replaced))
+            self.counts[DUPLICATE] += 1
+            logger.info("Duplicate lead dropped.", extra={"fields": {"lead_id": original_lead_id}})
+            return DUPLICATE
+
+        self._store(key, (now + self.window, original_lead_id, fingerprint, lead_id, entry))
+        lead_data["event"] = "update"
+        lead_data["updates_lead_id"] = original_lead_id
+        self._reserve(lead_id)
+        self.counts[UPDATE] += 1
+        logger.info("Resubmitted lead turned into an update.", extra={"fields": {"lead_id": lead_id, "updates_lead_id": original_lead_id}})
+        return UPDATE
+
+    def _reserve(self, lead_id: str):
+        try:
+            self._pending[lead_id] = asyncio.get_running_loop().create_future()
+        except RuntimeError:
+            # Called outside the event loop: nothing can run concurrently
+            pass
+
+    def _settle(self, lead_id: str | None, saved: bool):
+        future = self._pending.pop(lead_id, None)
+        if future is not None and not future.done():
+            future.set_result(saved)
+
+    def _rewrite(self, entry: tuple | None, lead_id: str, saved: bool) -> tuple | None:
+        # Settles the write of ``lead_id`` in a chain of entries: once saved
+        # nothing below it can be restored; if it failed it is taken out
+        if entry is None:
+            return None
+        if entry[3] == lead_id:
+            return entry[:3] + (None, None) if saved else entry[4]
+        return entry[:4] + (self._rewrite(entry[4], lead_id, saved),)
+
+    def _settle_entry(self, lead_data: dict, saved: bool):
+        key = dedup_key(lead_data)
+        entry = self._entries.get(key) if key is not None else None
+        if entry is not None:
+            entry = self._rewrite(entry, lead_data.get("lead_id"), saved)
+            if entry is None:
+                del self._entries[key]
+            else:
+                self._entries[key] = entry
+        self._settle(lead_data.get("lead_id"), saved)
+
+    def saved(self, lead_data: dict):
+        """
+        Marks a NEW or UPDATE lead as written; repeats waiting on it go on
+        as duplicates.
+        """
+        self._settle_entry(lead_data, True)
+
+    def forget(self, lead_data: dict):
+        """
+        Undoes what a lead changed in the index, e.g. when it could not be
+        saved at all: a new lead's entry is dropped and an update's previous
+        answers are put back, so the user's retry (or a repeat waiting on
+        it) is not taken for a duplicate.
+        """
+        self._settle_entry(lead_data, False)
+
+    async def original_saved(self, lead_data: dict) -> bool:
+        """
+        For a DUPLICATE: waits until the latest write it repeats (the lead or
+        its update) is done. False if that write failed, in which case check
+        this one again.
+        """
+        key = dedup_key(lead_data)
+        entry = self._entries.get(key) if key is not None else None
+        future = self._pending.get(entry[3]) if entry is not None else None
+        if future is None:
+            return entry is not None
+        return await asyncio.shield(future)
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "evictions": self.evictions, **self.counts}
+
+
+# Process-wide index used by save_consultation_lead (None when disabled)
+lead_index = LeadDedupIndex(LEAD_DEDUP_MAX_ENTRIES, LEAD_DEDUP_WINDOW) if LEAD_DEDUP_ENABLED else None
+
+
+@register_collector
+def _collect_dedup_metrics():
+    if lead_index is None:
+        return
+    stats = lead_index.stats()
+    yield ("lead_dedup_entries", "gauge", "Recent leads held in the de-duplication index.", {}, stats["entries"])
+    yield ("lead_dedup_evictions_total", "counter", "Leads evicted from the full de-duplication index.", {}, stats["evictions"])
+    for outcome in (NEW, UPDATE, DUPLICATE):
+        yield ("lead_dedup_total", "counter", "Consultation leads by de-duplication outcome.", {"outcome": outcome}, stats[outcome])
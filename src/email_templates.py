@@ -0,0 +1,155 @@
+"""
+Precompiled email templates for lead notifications.
+
+Templates are plain files with ``{{ field }}`` placeholders. Each file is
+parsed once (on first use) into its static chunks and field slots, so
+rendering a lead is a single join over precomputed strings. Values are
+HTML-escaped for ``.html`` templates and inserted as-is for text templates.
+Set EMAIL_TEMPLATE_DIR to load customised branding without code changes.
+
+Digest emails (NOTIFICATION_MODE=digest) render one row template per lead
+and insert the rows into the digest template.
+"""
+import html
+import os
+import re
+from functools import lru_cache
+
+from src.config import EMAIL_TEMPLATE_DIR
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class CompiledTemplate:
+    """
+    A template split into static text and field slots.
+
+    ``_parts`` alternates static chunks (even indexes) and field names (odd
+    indexes); render() fills the odd slots from the context.
+    """
+
+    def __init__(self, source: str, escape: bool):
+        self._parts = _PLACEHOLDER.split(source)
+        self._fields = self._parts[1::2]
+        self._escape = escape
+
+    @property
+    def fields(self) -> list:
+        return list(self._fields)
+
+    def render(self, context: dict, raw: tuple = ()) -> str:
+        """
+        Fills the field slots; fields listed in ``raw`` (already rendered
+        markup) are never escaped.
+        """
+        parts = self._parts.copy()
+        escape = html.escape if self._escape else str
+        for i, field in enumerate(self._fields):
+            value = str(context.get(field, ""))
+            parts[2 * i + 1] = value if field in raw else escape(value)
+        return "".join(parts)
+
+
+def load_template(name: str, template_dir: str = EMAIL_TEMPLATE_DIR) -> CompiledTemplate:
+    """
+    Reads and compiles a template file. ``.html`` templates escape their values.
+    """
+    with open(os.path.join(template_dir, name), encoding="utf-8") as f:
+        source = f.read()
+    return CompiledTemplate(source, escape=name.endswith(".html"))
+
+
+@lru_cache(maxsize=None)
+def lead_templates() -> dict:
+    """
+    Compiles the lead notification templates once, on first use (the app
+    lifespan does it at startup when email notifications are enabled).
+
+    Returns:
+        dict: {"subject": CompiledTemplate, "html": ..., "text": ...}
+    """
+    return {
+        "subject": load_template("lead_notification_subject.txt"),
+        "html": load_template("lead_notification.html"),
+        "text": load_template("lead_notification.txt"),
+    }
+
+
+@lru_cache(maxsize=None)
+def digest_templates() -> dict:
+    """
+    Compiles the digest templates once, on first use.
+
+    Returns:
+        dict: {"subject", "html", "text", "html_row", "text_row"} CompiledTemplates
+    """
+    return {
+        "subject": load_template("lead_digest_subject.txt"),
+        "html": load_template("lead_digest.html"),
+        "text": load_template("lead_digest.txt"),
+        "html_row": load_template("lead_digest_row.html"),
+        "text_row": load_template("lead_digest_row.txt"),
+    }
+
+
+def _or_na(value) -> str:
+    return "N/A" if value is None else str(value)
+
+
+def lead_template_context(lead_data: dict) -> dict:
+    """
+    Maps a lead to the template fields (with the same N/A defaults as before).
+    """
+    return {
+        "name": _or_na(lead_data.get("name")),
+        "name_or_unknown": lead_data.get("name") or "Unknown",
+        "email": _or_na(lead_data.get("email")),
+        "email_href": lead_data.get("email") or "",
+        "objective": _or_na(lead_data.get("objective")),
+        "processes_to_automate": _or_na(lead_data.get("processes_to_automate")),
+        "current_tools": _or_na(lead_data.get("current_tools")),
+        "main_challenge": _or_na(lead_data.get("main_challenge")),
+        "language": (lead_data.get("language") or "en").upper(),
+        "date": (lead_data.get("timestamp") or "N/A").split("T")[0],
+    }
+
+
+def render_lead_email(lead_data: dict) -> dict:
+    """
+    Renders subject, HTML and plain-text parts for a lead notification.
+
+    Returns:
+        dict: {"subject": str, "html": str, "text": str}
+    """
+    context = lead_template_context(lead_data)
+    templates = lead_templates()
+    return {
+        "subject": templates["subject"].render(context).strip(),
+        "html": templates["html"].render(context),
+        "text": templates["text"].render(context),
+    }
+
+
+def render_digest_email(leads: list) -> dict:
+    """
+    Renders one summary email with a row per lead.
+
+    Returns:
+        dict: {"subject": str, "html": str, "text": str}
+    """
+    templates = digest_templates()
+    contexts = [lead_template_context(lead_data) for lead_data in leads]
+    dates = sorted(context["date"] for context in contexts if context["date"] != "N/A")
+    period = f"{dates[0]} – {dates[-1]}" if dates and dates[0] != dates[-1] else (dates[0] if dates else "")
+    digest = {
+        "count": len(leads),
+        "period": period,
+        "rows": "".join(templates["html_row"].render(context) for context in contexts),
+    }
+    html_body = templates["html"].render(digest, raw=("rows",))
+    digest["rows"] = "\n".join(templates["text_row"].render(context) for context in contexts)
+    return {
+        "subject": templates["subject"].render(digest).strip(),
+        "html": html_body,
+        "text": templates["text"].render(digest),
+    }
@@ -0,0 +1,248 @@
+"""
+Liveness and readiness, answered from state kept by a background prober.
+
+The prober's first round pre-warms pooled connections to every configured
+downstream (HTTP_PREWARM_ENABLED), in each tenant's pool and to the host
+Apps Script redirects to; after that it probes them every
+HEALTH_PROBE_INTERVAL with a HEAD to their origin and records reachability,
+latency and consecutive failures, along with internal queue health (outbox
+backlog and worker, notification queue and workers, event-loop lag).
+Probes also keep the pooled connections warm between leads.
+
+/healthz and / only say the process is serving. /readyz fails while
+startup (including pre-warming) has not finished, while the process is
+draining, or while a dependency in HEALTH_CRITICAL_DEPENDENCIES is down.
+Neither endpoint calls a dependency.
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from src import logging
+from src import notifications, outbox
+from src.circuit_breaker import APPS_SCRIPT_BREAKER, RESEND_BREAKER
+from src.config import (
+    HEALTH_PROBE_INTERVAL,
+    HEALTH_PROBE_TIMEOUT,
+    HEALTH_FAILURE_THRESHOLD,
+    HEALTH_CRITICAL_DEPENDENCIES,
+    HTTP_PREWARM_ENABLED,
+    HTTP_PREWARM_TIMEOUT,
+    LEAD_OUTBOX_ENABLED,
+    NOTIFICATION_QUEUE_SIZE,
+)
+from src.deadline import DeadlineExceeded
+from src.http_client import origin_of, probe_origin
+from src.metrics import LOOP_LAG_LAST, register_collector
+from src.startup import startup_step
+from src.utils import downstream_urls, prewarm_targets
+
+logger = logging.getLogger(__name__)
+
+_BREAKERS = {"apps_script": APPS_SCRIPT_BREAKER, "resend": RESEND_BREAKER}
+_CRITICAL = {name.strip() for name in HEALTH_CRITICAL_DEPENDENCIES.split(",") if name.strip()}
+
+
+class DependencyHealth:
+    """
+    Latest probe results for one downstream.
+    """
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.origin = origin_of(url)
+        self.url = url
+        self.checked_at: float | None = None
+        self.latency: float | None = None
+        self.latency_ewma: float | None = None
+        self.consecutive_failures = 0
+        self.last_error: str | None = None
+
+    @property
+    def down(self) -> bool:
+        return self.consecutive_failures >= HEALTH_FAILURE_THRESHOLD
+
+    def record(self, latency: float | None, error: str | None):
+        self.checked_at = time.time()
+        if error is None:
+            self.latency = latency
+            self.latency_ewma = latency if self.latency_ewma is None else 0.7 * self.latency_ewma + 0.3 * latency
+            if self.consecutive_failures >= HEALTH_FAILURE_THRESHOLD:
+                logger.info(f"Dependency {self.name} is reachable again.")
+            self.consecutive_failures = 0
+            self.last_error = None
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.consecutive_failures == HEALTH_FAILURE_THRESHOLD:
+                logger.warning(f"Dependency {self.name} is down after {self.consecutive_failures} failed probes: {error}")
+
+    def snapshot(self) -> dict:
+        breaker = _BREAKERS.get(self.name)
+        return {
+            "origin": self.origin,
+            "status": "down" if self.down else ("unknown" if self.checked_at is None else "up"),
+            "critical": self.name in _CRITICAL,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+            "latency_ewma_ms": None if self.latency_ewma is None else round(self.latency_ewma * 1000, 1),
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "checked_at": self.checked_at,
+            "circuit": breaker.state if breaker is not None else None,
+        }
+
+
+_state = {"started": False, "prewarmed": not HTTP_PREWARM_ENABLED, "draining": False}
+_dependencies: dict = {}
+_internal: dict = {}
+_prober: asyncio.Task | None = None
+
+
+async def _probe(dependency: DependencyHealth, timeout: float):
+    try:
+        latency = await probe_origin(dependency.url, timeout)
+    except (httpx.HTTPError, DeadlineExceeded, OSError) as e:
+        dependency.record(None, repr(e))
+    else:
+        dependency.record(latency, None)
+
+
+async def _warm(tenant, url: str) -> bool:
+    try:
+        await probe_origin(url, HTTP_PREWARM_TIMEOUT, tenant)
+        return True
+    except (httpx.HTTPError, OSError) as e:
+        logger.info(f"Could not pre-warm {origin_of(url)} for tenant {tenant.id} -> {e!r}")
+        return False
+
+
+async def _check_internal():
+    pending = await asyncio.to_thread(outbox.pending_count) if outbox.worker_running() else None
+    depth = notifications.queue_depth()
+    _internal.update({
+        "outbox_worker_running": outbox.worker_running(),
+        "outbox_pending": pending,
+        "notification_workers_running": notifications.workers_running(),
+        "notification_queue_depth": depth,
+        "notification_queue_utilization": round(depth / NOTIFICATION_QUEUE_SIZE, 3) if NOTIFICATION_QUEUE_SIZE else 0.0,
+        "event_loop_lag_ms": round(LOOP_LAG_LAST.labels().value * 1000, 2),
+        "checked_at": time.time(),
+    })
+
+
+async def _probe_loop():
+    if HTTP_PREWARM_ENABLED:
+        # First round doubles as connection pre-warming; /readyz waits for it
+        with startup_step("prewarm"):
+            results = await asyncio.gather(
+                *(_probe(dep, HTTP_PREWARM_TIMEOUT) for dep in _dependencies.values()),
+                *(_warm(tenant, url) for tenant, url in prewarm_targets()),
+            )
+        warmed = ", ".join(f"{dep.name} {dep.latency * 1000:.0f}ms" for dep in _dependencies.values() if dep.latency is not None)
+        extra = sum(1 for result in results[len(_dependencies):] if result)
+        logger.info(f"Pre-warmed downstream connections: {warmed or 'none'} (+{extra} tenant / redirect hosts)")
+        _state["prewarmed"] = True
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+    while True:
+        try:
+            await asyncio.gather(*(_probe(dep, HEALTH_PROBE_TIMEOUT) for dep in _dependencies.values()))
+            await _check_internal()
+        except Exception as e:
+            logger.error(f"Health prober error: {e}")
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+
+
+async def start_health_prober():
+    """
+    Starts the background prober (and the pre-warm round). Called from the
+    app lifespan; readiness stays false until mark_started().
+    """
+    global _prober
+    _dependencies.clear()
+    for name, url in downstream_urls().items():
+        _dependencies[name] = DependencyHealth(name, url)
+    if _prober is None or _prober.done():
+        _prober = asyncio.create_task(_probe_loop(), name="health-prober")
+
+
+async def stop_health_prober():
+    global _prober
+    if _prober is not None:
+        _prober.cancel()
+        try:
+            await _prober
+        except asyncio.CancelledError:
+            pass
+        _prober = None
+    _state["started"] = False
+
+
+async def mark_started():
+    """
+    Ends startup. The outbox and the notification workers are up by now, so
+    their state is recorded at once instead of at the next probe round.
+    """
+    try:
+        await _check_internal()
+    except Exception as e:
+        logger.error(f"Health prober error: {e}")
+    _state["started"] = True
+
+
+def set_draining(draining: bool = True):
+    _state["draining"] = draining
+
+
+def readiness() -> tuple:
+    """
+    Returns (ready, reasons) from the recorded state; constant time.
+    """
+    reasons = []
+    if not _state["started"]:
+        reasons.append("starting")
+    if not _state["prewarmed"]:
+        reasons.append("prewarming")
+    if _state["draining"]:
+        reasons.append("draining")
+    for name in _CRITICAL:
+        dependency = _dependencies.get(name)
+        if dependency is not None and dependency.down:
+            reasons.append(f"{name}_down")
+    if LEAD_OUTBOX_ENABLED and _state["started"] and not outbox.worker_running():
+        reasons.append("outbox_worker_stopped")
+    return not reasons, reasons
+
+
+router = APIRouter(include_in_schema=False)
+
+
+@router.get("/")
+@router.get("/healthz")
+async def healthz():
+    # Liveness: the event loop is answering
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    ready, reasons = readiness()
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "reasons": reasons,
+        "dependencies": {name: dep.snapshot() for name, dep in _dependencies.items()},
+        "internal": _internal,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@register_collector
+def _collect_health_metrics():
+    yield ("app_ready", "gauge", "1 when /readyz passes.", {}, int(readiness()[0]))
+    for name, dependency in _dependencies.items():
+        yield ("dependency_up", "gauge", "1 if the last probes reached the dependency (0 once it is down).",
+               {"dependency": name}, int(not dependency.down))
+        yield ("dependency_probe_latency_seconds", "gauge", "Latest dependency probe latency.",
+               {"dependency": name}, dependency.latency)
@@ -0,0 +1,131 @@
+import asyncio
+import ssl
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from src import logging
+from src.config import (
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+)
+
+logger = logging.getLogger(__name__)
+
+# One SSL context for the whole process so TLS sessions can be resumed
+# across pooled connections instead of doing a full handshake each time.
+_ssl_context: ssl.SSLContext | None = None
+_client: httpx.AsyncClient | None = None
+# Tenants other than the default get their own pool (a bulkhead): a tenant
+# whose Apps Script hangs can only tie up its own connections
+_tenant_clients: dict = {}
+
+
+def _build_client(max_connections: int = HTTP_MAX_CONNECTIONS) -> httpx.AsyncClient:
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(HTTP_MAX_KEEPALIVE_CONNECTIONS, max_connections),
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        verify=_ssl_context,
+        # Apps Script answers POSTs with a 302 to googleusercontent.com
+        follow_redirects=True,
+    )
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """
+    Creates the shared async HTTP client. Called from the app lifespan.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+        logger.info(
+            f"HTTP client started (max_connections={HTTP_MAX_CONNECTIONS}, "
+            f"max_keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS}, timeout={HTTP_TIMEOUT}s)"
+        )
+    return _client
+
+
+def get_http_client(tenant=None) -> httpx.AsyncClient:
+    """
+    Returns the shared async HTTP client, or ``tenant``'s own pool for a
+    non-default tenant (created on first use, sized by its max_connections).
+
+    The client is normally created by the app lifespan; scripts that call the
+    handlers directly (without the lifespan) get one created on first use.
+    """
+    global _client
+    if tenant is not None and not tenant.is_default:
+        return _tenant_client(tenant)
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def _tenant_client(tenant) -> httpx.AsyncClient:
+    entry = _tenant_clients.get(tenant.id)
+    if entry is not None and entry[0] == tenant.max_connections and not entry[1].is_closed:
+        return entry[1]
+    client = _build_client(tenant.max_connections)
+    _tenant_clients[tenant.id] = (tenant.max_connections, client)
+    old_client = entry[1] if entry is not None and not entry[1].is_closed else None
+    if old_client is not None:
+        # Pool resized by a tenant reload: let in-flight calls finish first
+        asyncio.get_running_loop().call_later(HTTP_TIMEOUT, lambda: asyncio.ensure_future(old_client.aclose()))
+    logger.info(f"HTTP pool for tenant {tenant.id} started (max_connections={tenant.max_connections})")
+    return client
+
+
+async def close_http_client():
+    """
+    Closes the shared async HTTP client, the tenant pools and their pooled
+    connections.
+    """
+    global _client
+    for _, client in _tenant_clients.values():
+        await client.aclose()
+    _tenant_clients.clear()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("HTTP client closed")
+
+
+# Where Apps Script redirects its answers to (a separate TLS connection)
+APPS_SCRIPT_REDIRECT_ORIGIN = "https://script.googleusercontent.com/"
+
+
+def origin_of(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+async def probe_origin(url: str, timeout: float, tenant=None) -> float:
+    """
+    Sends a HEAD request to the origin of ``url`` over the shared pool (or
+    ``tenant``'s own). This opens (or reuses) a pooled connection, so DNS,
+    TCP and TLS are done before the next real call. Any answer below 500
+    counts as reachable.
+
+    Returns:
+        float: Seconds the probe took
+
+    Raises:
+        httpx.HTTPError: if the host is unreachable or answered 5xx
+    """
+    started = time.perf_counter()
+    response = await get_http_client(tenant).head(origin_of(url), timeout=timeout, follow_redirects=False)
+    if response.status_code >= 500:
+        raise httpx.HTTPStatusError(f"{response.status_code} from {origin_of(url)}", request=response.request, response=response)
+    return time.perf_counter() - started
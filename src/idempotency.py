@@ -0,0 +1,124 @@
+"""
+Idempotent webhook handling for Dialogflow CX retries.
+
+Completed responses are kept in a bounded LRU with a TTL, keyed on
+detectIntentResponseId + tag (or session + tag when CX does not send one).
+A retry that arrives while the first attempt is still running awaits the
+same future instead of calling the handler, and its downstream writes,
+again.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from starlette.responses import Response
+
+from src import logging
+from src.config import IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL
+from src.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+
+def idempotency_key(detect_intent_response_id: str | None, session: str | None, tag: str) -> str:
+    if detect_intent_response_id:
+        # Every webhook call of one turn shares the response ID, so the tag
+        # tells them apart
+        return f"id:{detect_intent_response_id}:{tag}"
+    return f"session:{session}:{tag}"
+
+
+def _fresh(result: Any) -> Any:
+    # Starlette responses are stateful (background tasks, headers), so each
+    # caller gets its own copy of a cached response
+    if isinstance(result, Response):
+        return type(result)(content=result.body, status_code=result.status_code, media_type=result.media_type)
+    return result
+
+
+class IdempotencyCache:
+    """
+    Bounded LRU + TTL cache of completed handler results with in-flight
+    request coalescing.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._completed: OrderedDict = OrderedDict()
+        self._in_flight: dict = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached result for ``key``, joins an in-flight call for it,
+        or runs ``factory`` and caches its result.
+        """
+        now = time.monotonic()
+        entry = self._completed.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > now:
+                self._completed.move_to_end(key)
+                self.hits += 1
+                logger.info(f"Idempotency hit for {key}, returning cached response")
+                return _fresh(result)
+            del self._completed[key]
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            logger.info(f"Retry for {key} joined the in-flight request")
+            # shield: a cancelled retry must not cancel the original attempt
+            return _fresh(await asyncio.shield(future))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await factory()
+        except BaseException as e:
+            # Failures are not cached; waiting retries see the same error
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("original request was cancelled"))
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        else:
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _store(self, key: str, result: Any):
+        self._completed[key] = (time.monotonic() + self.ttl, result)
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._completed),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Process-wide cache used by the /webhook route
+response_cache = IdempotencyCache(IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL)
+
+
+@register_collector
+def _collect_idempotency_metrics():
+    stats = response_cache.stats()
+    yield ("idempotency_cache_entries", "gauge", "Completed responses held for retries.", {}, stats["entries"])
+    yield ("idempotency_in_flight", "gauge", "Webhook calls other retries can join.", {}, stats["in_flight"])
+    for event in ("hits", "coalesced", "misses", "evictions"):
+        yield ("idempotency_events_total", "counter", "Idempotency cache events.", {"event": event}, stats[event])
@@ -0,0 +1,190 @@
+"""
+Queue-backed structured logging.
+
+Log calls on the event loop only copy the record onto an in-memory queue
+(QueueHandler); a QueueListener thread does the JSON formatting and the
+stdout write. Every record carries the request/session correlation IDs of
+the webhook call it was emitted from, known PII fields are masked and
+high-volume INFO records can be sampled.
+
+Pass structured data with ``logger.info("msg", extra={"fields": {...}})``.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+from contextvars import ContextVar
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" or "text"
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_REDACT_FIELDS = frozenset(
+    field.strip()
+    for field in os.getenv("LOG_REDACT_FIELDS", "email,user_email,name,user_name").split(",")
+    if field.strip()
+)
+
+request_id_var: ContextVar[str | None] = ContextVar("log_request_id", default=None)
+session_id_var: ContextVar[str | None] = ContextVar("log_session_id", default=None)
+
+_EMAIL_PATTERN = re.compile(r"([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})")
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RESERVED = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+def bind_log_context(request_id: str | None, session: str | None):
+    """
+    Sets the correlation IDs for records logged while handling this request.
+    ``session`` may be the full CX session path; only its last segment is kept.
+    """
+    request_id_var.set(request_id)
+    session_id_var.set(session.rsplit("/", 1)[-1] if session else None)
+
+
+def mask_value(key: str, value):
+    if value is None or key not in LOG_REDACT_FIELDS:
+        return value
+    text = str(value)
+    if "@" in text:
+        return _EMAIL_PATTERN.sub(r"\1***@\2", text)
+    return f"{text[:1]}***" if text else text
+
+
+def redact(fields: dict) -> dict:
+    return {key: mask_value(key, value) for key, value in fields.items()}
+
+
+class ContextFilter(logging.Filter):
+    """
+    Attaches correlation IDs (read in the logging thread, where the
+    contextvars are set) and drops sampled-out INFO/DEBUG records.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and LOG_INFO_SAMPLE_RATE < 1.0:
+            if not getattr(record, "always_log", False) and random.random() >= LOG_INFO_SAMPLE_RATE:
+                return False
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does not format on the caller's thread: it only merges
+    the message arguments and enqueues, leaving formatting to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the event loop on logging; count what was lost
+            global dropped_records
+            dropped_records += 1
+
+
+dropped_records = 0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _EMAIL_PATTERN.sub(r"\1***@\2", str(record.msg)),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "session_id", None):
+            entry["session_id"] = record.session_id
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            entry.update(redact(fields))
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key not in ("fields", "request_id", "session_id", "always_log"):
+                entry[key] = mask_value(key, value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict) and fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in redact(fields).items())
+        if getattr(record, "request_id", None):
+            line += f" request_id={record.request_id}"
+        return _EMAIL_PATTERN.sub(r"\1***@\2", line)
+
+
+_listener: logging.handlers.QueueListener | None = None
+_queue: queue.Queue | None = None
+
+
+def start_log_listener():
+    """
+    Starts (or restarts, e.g. in a forked worker) the listener thread.
+    """
+    global _listener
+    if _listener is not None and _listener._thread is not None and _listener._thread.is_alive():
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    _listener = logging.handlers.QueueListener(_queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def stop_log_listener():
+    """
+    Flushes queued records and stops the listener thread.
+    """
+    global _listener
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+    _listener = None
+
+
+def _restart_after_fork():
+    # Only the forking thread survives in the child: the listener is gone and
+    # the queue's lock may have been held by it, so start over with new ones
+    global _listener
+    if _queue is not None:
+        _listener = None
+        configure_logging()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def configure_logging():
+    global _queue
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DeferredQueueHandler(_queue)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+    # One INFO line per outbound HTTP call is too chatty for production
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    start_log_listener()
@@ -1,22 +1,116 @@
+from contextlib import asynccontextmanager
+
 from fastapi import Depends, FastAPI, HTTPException, Request, BackgroundTasks
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from src import logging
+from pydantic import ValidationError
+
+from src import logging, jsonutil
+from src.logging_config import bind_log_context
+from src.config import (
+    WEBHOOK_FAST_PATH,
+    IDEMPOTENCY_ENABLED,
+    METRICS_ENABLED,
+    EMAIL_NOTIFICATIONS_ENABLED,
+    LOOP_STALL_DETECTOR_ENABLED,
+    NOTIFICATION_FLUSH_TIMEOUT,
+)
 from src.schemas import (
     WebhookRequest,
     WebhookResponse,
+    FulfillmentInfo,
     FulfillmentResponse,
     Message,
     Text,
+    parse_partial_request,
 )
-from src.actions.default_welcome_intent import default_welcome_intent
-from src.actions.save_lead import save_lead, save_consultation_lead
+from src.registry import get_handler, tag_index
+from src.idempotency import idempotency_key, response_cache
+from src.deadline import DeadlineMiddleware, current_deadline
+from src import metrics
+from src.responses import build_response_catalog, render_response
+from src.admission import AdmissionRejected, admission
+from src.profiling import profile_request, stall_watchdog
+from src.http_client import start_http_client, close_http_client
+from src.outbox import start_outbox, stop_outbox
+from src.sinks import start_sinks, close_sinks, unfinished_leads
+from src import admin, health
+from src.utils import close_lead_batcher
+from src.notifications import start_notification_workers, stop_notification_workers
+from src.startup import log_startup_report, record_imports, startup_step
+from src.tenants import start_tenants, stop_tenants, tenants
+from src.shutdown import begin_drain, end_drain, replay_spill
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Dialogflow CX Webhook API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    record_imports()
+    end_drain()
+    # Tenant settings from TENANTS_FILE (pools, limits and replies read them)
+    with startup_step("tenants"):
+        await start_tenants()
+    # Index handler tags now (action modules themselves are imported lazily)
+    with startup_step("tag_index"):
+        tag_index()
+    # Pre-serialize the static bilingual replies
+    with startup_step("response_catalog"):
+        build_response_catalog()
+    if EMAIL_NOTIFICATIONS_ENABLED:
+        # Compile the email templates now rather than on the first lead
+        with startup_step("email_templates"):
+            from src.email_templates import lead_templates
+            lead_templates()
+    # Shared pooled HTTP client for Apps Script / Resend calls
+    with startup_step("http_client"):
+        await start_http_client()
+    # Dependency prober; its first round pre-warms DNS + TCP + TLS to the
+    # downstream hosts in the background while /readyz reports not ready
+    await health.start_health_prober()
+    # Durable lead outbox + background delivery worker
+    with startup_step("outbox"):
+        await start_outbox()
+    # Lead sinks (Apps Script, local SQLite / NDJSON) from LEAD_SINKS
+    with startup_step("sinks"):
+        await start_sinks()
+    # Bounded worker pool for email notifications
+    await start_notification_workers()
+    # Leads and notifications the last shutdown could not deliver
+    with startup_step("spill_replay"):
+        await replay_spill()
+    # Event-loop lag sampling for /metrics
+    await metrics.start_loop_lag_monitor()
+    if LOOP_STALL_DETECTOR_ENABLED:
+        # Watchdog thread that logs the blocking stack when the loop stalls
+        await stall_watchdog.start()
+    log_startup_report()
+    await health.mark_started()
+    yield
+    # Graceful shutdown: shed new calls, give in-flight ones and queued
+    # notifications until SHUTDOWN_DRAIN_TIMEOUT, spill what is left. Under
+    # src/server.py the drain began at SIGTERM and the server has already
+    # waited for (or cancelled) the calls in flight
+    drain = begin_drain()
+    drain.log_start()
+    await drain.wait_for_handlers()
+    await health.stop_health_prober()
+    await stall_watchdog.stop()
+    await metrics.stop_loop_lag_monitor()
+    unsent = await stop_notification_workers(min(NOTIFICATION_FLUSH_TIMEOUT, drain.remaining()))
+    await drain.spill("notification", unsent)
+    await drain.spill("lead", unfinished_leads())
+    await close_sinks()
+    await stop_outbox()
+    await close_lead_batcher()
+    await close_http_client()
+    await stop_tenants()
+    drain.report()
+
+
+app = FastAPI(title="Dialogflow CX Webhook API", lifespan=lifespan)
 
 # Enable CORS for Dialogflow CX and other services
 app.add_middleware(
@@ -26,42 +120,202 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all headers
 )
+# Start each webhook call's time budget as soon as it arrives
+app.add_middleware(DeadlineMiddleware)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    logger.error(f"Validation Error: {exc.errors()}")
-    logger.error(f"Body: {await request.body()}")
+    # Log where validation failed, never the submitted values (PII)
+    errors = [
+        {"loc": list(error.get("loc", ())), "type": error.get("type"), "msg": error.get("msg")}
+        for error in exc.errors()
+    ]
+    logger.warning("Validation Error", extra={"fields": {"errors": errors}})
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors(), "body": exc.body},
     )
 
-@app.post("/webhook", response_model=WebhookResponse)
+def _record_request(tag_label: str):
+    # Latency is measured from arrival (DeadlineMiddleware), unknown tags are
+    # folded into one label to keep the series count bounded
+    metrics.WEBHOOK_REQUESTS.labels(tag_label).inc()
+    deadline = current_deadline()
+    if deadline is not None:
+        metrics.WEBHOOK_LATENCY.labels(tag_label).observe(deadline.elapsed())
+
+
+async def _call_handler(handler, webhook_request, resources, response_id, session):
+    """
+    Runs a handler, answering CX retries of the same call from the
+    idempotency cache (or by joining the still-running first attempt).
+    New calls go through admission control (including their tenant's
+    limit) and get the canned consultation_error reply when shed, after the
+    handler's on_shed hook (if any) has kept what must not be lost.
+    """
+    async def admitted_call():
+        # Only first attempts take an admission slot; cached retries are free
+        ticket = await admission.admit(handler.tag, session, tenants.for_session(session))
+        try:
+            # Sampled / header-requested calls are profiled to PROFILE_DIR
+            async with profile_request(resources.get("request"), handler.tag):
+                return await handler(webhook_request, resources)
+        finally:
+            ticket.release()
+
+    try:
+        if not (IDEMPOTENCY_ENABLED and handler.idempotent):
+            return await admitted_call()
+        key = idempotency_key(response_id, session, handler.tag)
+        # A shed attempt raises, so it is not cached for the retries
+        return await response_cache.run(key, admitted_call)
+    except AdmissionRejected:
+        if handler.on_shed is not None:
+            try:
+                await handler.on_shed(webhook_request)
+            except Exception as e:
+                logger.error(f"Could not keep the data of a shed {handler.tag} call -> {e}")
+        # Fast, valid reply instead of queuing behind the overload
+        return render_response("consultation_error", getattr(webhook_request, "languageCode", None), session=session)
+
+
+def _no_handler_response(tag: str) -> WebhookResponse:
+    return WebhookResponse(
+        fulfillmentResponse=FulfillmentResponse(
+            messages=[
+                Message(text=Text(text=[f"No handler for the tag: {tag}"]))
+            ]
+        )
+    )
+
+
 async def dialogflow_webhook(
     webhook_request: WebhookRequest,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    request: Request,
 ):
-    logger.info("A new request came from Dialogflow.")
-    # logger.info(webhook_request) # Commented out to reduce noise, enable if debugging needed
+    tag = webhook_request.fulfillmentInfo.tag
+    bind_log_context(webhook_request.detectIntentResponseId, webhook_request.sessionInfo.session)
+    logger.info("A new request came from Dialogflow.", extra={"fields": {"tag": tag}})
+    # Handlers register themselves in src/actions via @register_handler
+    handler = get_handler(tag)
+    metrics.WEBHOOK_IN_FLIGHT.inc()
     try:
-        tag = webhook_request.fulfillmentInfo.tag
-        
-        if tag == "defaultWelcomeIntent":
-            return await default_welcome_intent(webhook_request=webhook_request)
-        elif tag == "save_lead":
-            return await save_lead(webhook_request=webhook_request)
-        elif tag == "save_consultation_lead":
-            return await save_consultation_lead(webhook_request=webhook_request, background_tasks=background_tasks)
-        else:
-            return WebhookResponse(
-                fulfillmentResponse=FulfillmentResponse(
-                    messages=[
-                        Message(text=Text(text=[f"No handler for the tag: {tag}"]))
-                    ]
-                )
+        if handler is not None:
+            return await _call_handler(
+                handler,
+                webhook_request,
+                {"background_tasks": background_tasks, "request": request},
+                webhook_request.detectIntentResponseId,
+                webhook_request.sessionInfo.session,
             )
+        else:
+            return _no_handler_response(tag)
     except Exception as e:
         logger.error(f"Error at /webhook {str(e)}")
         raise HTTPException(
             status_code=500, detail=f"Webhook processing error: {str(e)}"
         )
+    finally:
+        metrics.WEBHOOK_IN_FLIGHT.dec()
+        _record_request(tag if handler is not None else "unknown")
+
+
+def _validation_error(e: ValidationError, *prefix: str) -> RequestValidationError:
+    return RequestValidationError(
+        [{**error, "loc": ("body", *prefix, *error["loc"])} for error in e.errors(include_url=False)]
+    )
+
+
+def _str_field(container, name: str) -> str | None:
+    value = container.get(name) if isinstance(container, dict) else None
+    return value if isinstance(value, str) else None
+
+
+async def dialogflow_webhook_fast(request: Request, background_tasks: BackgroundTasks):
+    """
+    Fast path (WEBHOOK_FAST_PATH=true): decodes the body with orjson and
+    validates only the request fields the selected handler declares. The
+    handler's WebhookResponse is serialized straight to bytes, skipping the
+    response_model re-validation of the standard route.
+    """
+    try:
+        data = jsonutil.loads(await request.body())
+    except ValueError:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body",), "msg": "JSON decode error", "input": {}}]
+        )
+    if not isinstance(data, dict):
+        raise RequestValidationError(
+            [{"type": "model_attributes_type", "loc": ("body",), "msg": "Input should be a JSON object", "input": {}}]
+        )
+    try:
+        tag = FulfillmentInfo.model_validate(data.get("fulfillmentInfo")).tag
+    except ValidationError as e:
+        raise _validation_error(e, "fulfillmentInfo")
+
+    # Read ahead of validation (and for handlers that don't validate them)
+    response_id = _str_field(data, "detectIntentResponseId")
+    session = _str_field(data.get("sessionInfo"), "session")
+    bind_log_context(response_id, session)
+    logger.info("A new request came from Dialogflow.", extra={"fields": {"tag": tag}})
+
+    handler = get_handler(tag)
+    if handler is None:
+        _record_request("unknown")
+        return _json_response(_no_handler_response(tag))
+    try:
+        webhook_request = parse_partial_request(data, handler.fields)
+    except ValidationError as e:
+        raise _validation_error(e)
+
+    metrics.WEBHOOK_IN_FLIGHT.inc()
+    try:
+        result = await _call_handler(
+            handler,
+            webhook_request,
+            {"background_tasks": background_tasks, "request": request},
+            response_id,
+            session,
+        )
+        return _json_response(result)
+    except Exception as e:
+        logger.error(f"Error at /webhook {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Webhook processing error: {str(e)}"
+        )
+    finally:
+        metrics.WEBHOOK_IN_FLIGHT.dec()
+        _record_request(tag)
+
+
+def _json_response(result) -> Response:
+    if isinstance(result, Response):
+        return result
+    return Response(
+        content=result.__pydantic_serializer__.to_json(result),
+        media_type="application/json",
+    )
+
+
+def register_webhook_route(target: FastAPI, fast_path: bool = WEBHOOK_FAST_PATH):
+    """
+    Mounts POST /webhook on ``target`` using the standard or the fast path.
+    """
+    if fast_path:
+        target.add_api_route("/webhook", dialogflow_webhook_fast, methods=["POST"], response_model=None)
+    else:
+        target.add_api_route("/webhook", dialogflow_webhook, methods=["POST"], response_model=WebhookResponse)
+
+
+register_webhook_route(app)
+app.include_router(health.router)
+app.include_router(admin.router)
+
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        # On the event loop: collectors read state (latency windows, queues,
+        # batchers) that loop tasks mutate; rendering itself is cheap
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,230 @@
+"""
+Minimal in-process Prometheus metrics.
+
+The hot path only touches plain Python counters owned by this worker
+process (no locks: handlers run on one event loop). Everything else,
+bucket cumulation, label formatting and the stats of other subsystems
+(queues, caches, batchers), is computed at scrape time by render().
+With several worker processes each one reports its own values.
+"""
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from src import logging
+from src.config import LOOP_LAG_SAMPLE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(_format_labels(self.labelnames, values), child, values))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_child(self, labels, child, values):
+        return [f"{self.name}{labels} {child.value}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, labels, child, values):
+        lines = []
+        cumulative = 0
+        counts = list(child.counts)
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            le = _format_labels((*self.labelnames, "le"), (*values, bound))
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REGISTRY: list = []
+_collectors: list = []
+
+
+def register_collector(collect: Callable[[], Iterable[tuple]]):
+    """
+    Registers a scrape-time collector returning (name, type, help, labels dict, value) tuples.
+    """
+    _collectors.append(collect)
+    return collect
+
+
+def _render_collected() -> list:
+    lines = []
+    seen = set()
+    for collect in _collectors:
+        try:
+            samples = list(collect())
+        except Exception as e:
+            logger.warning(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+            continue
+        for name, kind, documentation, labels, value in samples:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+            if value is None:
+                continue
+            lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+
+def render() -> str:
+    """
+    Renders all metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_collected())
+    return "\n".join(lines) + "\n"
+
+
+# --- Webhook and downstream metrics -----------------------------------------
+
+WEBHOOK_REQUESTS = Counter("webhook_requests_total", "Webhook calls by fulfillment tag.", ("tag",))
+WEBHOOK_LATENCY = Histogram("webhook_request_duration_seconds", "Webhook latency by fulfillment tag.", ("tag",))
+WEBHOOK_IN_FLIGHT = Gauge("webhook_requests_in_flight", "Webhook calls currently being handled.")
+DOWNSTREAM_LATENCY = Histogram(
+    "downstream_request_duration_seconds",
+    "Apps Script / Resend call latency by outcome (ok, timeout, http_error, error).",
+    ("dependency", "outcome"),
+)
+LEAD_SINK_LATENCY = Histogram(
+    "lead_sink_write_duration_seconds",
+    "Lead write latency per sink and outcome (ok, failed, timeout).",
+    ("sink", "outcome"),
+)
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Scheduling delay of the event loop.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample.")
+
+
+def observe_downstream(dependency: str, outcome: str, seconds: float):
+    DOWNSTREAM_LATENCY.labels(dependency, outcome).observe(seconds)
+
+
+def observe_sink(sink: str, outcome: str, seconds: float):
+    LEAD_SINK_LATENCY.labels(sink, outcome).observe(seconds)
+
+
+async def _monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_SAMPLE_INTERVAL
+        await asyncio.sleep(LOOP_LAG_SAMPLE_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+_lag_task: asyncio.Task | None = None
+
+
+async def start_loop_lag_monitor():
+    global _lag_task
+    _lag_task = asyncio.create_task(_monitor_loop_lag(), name="loop-lag-monitor")
+
+
+async def stop_loop_lag_monitor():
+    global _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        await asyncio.gather(_lag_task, return_exceptions=True)
+        _lag_task = None
@@ -0,0 +1,316 @@
+"""
+In-process notification subsystem.
+
+Lead notifications are put on a bounded asyncio queue and sent by a fixed
+pool of async workers, so Resend latency never touches the webhook path.
+Each send is retried with exponential backoff and full jitter. When the
+queue is full, enqueue_notification waits briefly and then sheds the
+notification instead of holding the Dialogflow response.
+
+NOTIFICATION_MODE decides how queued leads become Resend calls:
+
+    immediate  one email per lead, NOTIFICATION_WORKERS workers
+    batched    one worker collects up to NOTIFICATION_BATCH_SIZE leads (or
+               what arrived within NOTIFICATION_BATCH_WAIT) and sends their
+               emails in one /emails/batch call
+    digest     one worker collects up to NOTIFICATION_DIGEST_MAX_LEADS leads
+               (or NOTIFICATION_DIGEST_INTERVAL) into one summary email
+
+The queue is the in-memory buffer (NOTIFICATION_QUEUE_SIZE caps it). On
+shutdown pending batches are sent at once, for up to
+NOTIFICATION_FLUSH_TIMEOUT; leads still queued or mid-send after that are
+handed back to the caller (src/shutdown.py spills them to disk).
+"""
+import asyncio
+import random
+import time
+
+from src import logging
+from src.config import (
+    EMAIL_NOTIFICATIONS_ENABLED,
+    NOTIFICATION_WORKERS,
+    NOTIFICATION_QUEUE_SIZE,
+    NOTIFICATION_ENQUEUE_TIMEOUT,
+    NOTIFICATION_MAX_RETRIES,
+    NOTIFICATION_RETRY_BASE_DELAY,
+    NOTIFICATION_RETRY_MAX_DELAY,
+    NOTIFICATION_MODE,
+    NOTIFICATION_BATCH_SIZE,
+    NOTIFICATION_BATCH_WAIT,
+    NOTIFICATION_DIGEST_INTERVAL,
+    NOTIFICATION_DIGEST_MAX_LEADS,
+    NOTIFICATION_FLUSH_TIMEOUT,
+)
+from src.circuit_breaker import get_breaker
+from src.metrics import register_collector
+from src.tenants import DEFAULT_TENANT_ID
+from src.utils import PermanentSendError, send_digest_email, send_email_batch, send_email_notification
+
+logger = logging.getLogger(__name__)
+
+_queue: asyncio.Queue | None = None
+_workers: list = []
+_flushing: asyncio.Event | None = None
+# worker id -> lead groups it holds and has not finished sending
+_held: dict = {}
+
+_stats = {
+    "enqueued": 0,
+    "sent": 0,
+    "failed": 0,
+    "retries": 0,
+    "dropped": 0,
+    "unflushed": 0,
+    "api_calls": 0,
+    "send_latency_count": 0,
+    "send_latency_sum": 0.0,
+    "send_latency_max": 0.0,
+}
+
+
+def _retry_delay(attempt: int) -> float:
+    # Full jitter: uniform(0, min(cap, base * 2^attempt))
+    return random.uniform(0, min(NOTIFICATION_RETRY_MAX_DELAY, NOTIFICATION_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+async def _send_one(leads: list) -> bool:
+    return await send_email_notification(leads[0])
+
+
+# mode -> (workers, leads per send, max seconds to wait for more, sender)
+_MODES = {
+    "immediate": (NOTIFICATION_WORKERS, 1, 0.0, _send_one),
+    "batched": (1, NOTIFICATION_BATCH_SIZE, NOTIFICATION_BATCH_WAIT, send_email_batch),
+    "digest": (1, NOTIFICATION_DIGEST_MAX_LEADS, NOTIFICATION_DIGEST_INTERVAL, send_digest_email),
+}
+
+
+async def _send_with_retries(send, leads: list) -> bool:
+    # Leads of one send share a tenant (and so its Resend key and breaker)
+    breaker = get_breaker("resend", leads[0].get("tenant") or DEFAULT_TENANT_ID)
+    for attempt in range(NOTIFICATION_MAX_RETRIES + 1):
+        while breaker.rejecting():
+            # Hold the notification (not an attempt) until Resend may be tried again
+            await asyncio.sleep(max(breaker.cooldown_remaining(), NOTIFICATION_RETRY_BASE_DELAY))
+        started = time.perf_counter()
+        _stats["api_calls"] += 1
+        try:
+            sent = await send(leads)
+        except PermanentSendError as e:
+            # Configuration or a rejected request: retrying cannot help
+            logger.error(f"Notification not sent, not retrying: {e}")
+            return False
+        except Exception as e:
+            logger.warning(f"Notification send raised: {e}")
+            sent = False
+        latency = time.perf_counter() - started
+        _stats["send_latency_count"] += 1
+        _stats["send_latency_sum"] += latency
+        _stats["send_latency_max"] = max(_stats["send_latency_max"], latency)
+
+        if sent:
+            return True
+        if attempt < NOTIFICATION_MAX_RETRIES:
+            _stats["retries"] += 1
+            await asyncio.sleep(_retry_delay(attempt))
+    return False
+
+
+async def _collect(leads: list, size: int, max_wait: float):
+    """
+    Waits for a lead, then gathers more into ``leads`` until ``size`` leads,
+    ``max_wait`` seconds, or a shutdown flush.
+    """
+    leads.append(await _queue.get())
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_wait
+    while len(leads) < size:
+        if not _queue.empty():
+            leads.append(_queue.get_nowait())
+            continue
+        remaining = deadline - loop.time()
+        if remaining <= 0 or _flushing.is_set():
+            break
+        getter = asyncio.ensure_future(_queue.get())
+        flush = asyncio.ensure_future(_flushing.wait())
+        try:
+            done, _ = await asyncio.wait({getter, flush}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # Shutdown: keep a lead the getter already took, so it is spilled
+            flush.cancel()
+            if getter.done() and not getter.cancelled():
+                leads.append(getter.result())
+            getter.cancel()
+            raise
+        flush.cancel()
+        if getter in done:
+            leads.append(getter.result())
+        else:
+            # Queue.get is cancellation-safe: no lead is lost
+            getter.cancel()
+
+
+def _by_tenant(leads: list) -> list:
+    groups: dict = {}
+    for lead_data in leads:
+        groups.setdefault(lead_data.get("tenant") or DEFAULT_TENANT_ID, []).append(lead_data)
+    return list(groups.values())
+
+
+async def _worker(worker_id: int, size: int, max_wait: float, send):
+    while True:
+        leads = []
+        _held[worker_id] = [leads]
+        await _collect(leads, size, max_wait)
+        # A batch or digest goes to one tenant's recipients
+        groups = _held[worker_id] = _by_tenant(leads)
+        while groups:
+            group = groups[0]
+            try:
+                if await _send_with_retries(send, group):
+                    _stats["sent"] += len(group)
+                else:
+                    _stats["failed"] += len(group)
+                    logger.warning(f"Email notification failed after retries ({len(group)} leads, still saved).")
+            except Exception as e:
+                _stats["failed"] += len(group)
+                logger.error(f"Notification worker {worker_id} error: {e}")
+            # Not reached when cancelled mid-send: the group stays held for the spill
+            groups.pop(0)
+            for _ in group:
+                _queue.task_done()
+
+
+async def enqueue_notification(lead_data: dict) -> bool:
+    """
+    Queues a lead notification for the worker pool.
+
+    If the pool is not running (e.g. a script calling the handler directly)
+    the notification is sent inline instead.
+
+    Args:
+        lead_data (dict): Lead information for the email
+
+    Returns:
+        bool: True if queued (or sent inline), False if it was shed
+    """
+    if not EMAIL_NOTIFICATIONS_ENABLED:
+        return True
+    if _queue is None:
+        _stats["api_calls"] += 1
+        try:
+            return await _MODES[NOTIFICATION_MODE][3]([lead_data])
+        except PermanentSendError as e:
+            logger.error(f"Notification not sent: {e}")
+            return False
+
+    try:
+        _queue.put_nowait(lead_data)
+    except asyncio.QueueFull:
+        # Backpressure: give the workers a short moment, then shed
+        try:
+            await asyncio.wait_for(_queue.put(lead_data), timeout=NOTIFICATION_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            _stats["dropped"] += 1
+            logger.warning(f"Notification queue full ({_queue.maxsize}), dropping email notification.")
+            return False
+    _stats["enqueued"] += 1
+    return True
+
+
+def workers_running() -> int:
+    return sum(not worker.done() for worker in _workers)
+
+
+def queue_depth() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+
+def notification_stats() -> dict:
+    """
+    Returns queue depth, throughput counters and send latency of the pool.
+    """
+    count = _stats["send_latency_count"]
+    leads = _stats["sent"] + _stats["failed"]
+    return {
+        **_stats,
+        "mode": NOTIFICATION_MODE,
+        "queue_depth": queue_depth(),
+        "queue_capacity": NOTIFICATION_QUEUE_SIZE,
+        "workers": len(_workers),
+        "send_latency_avg": _stats["send_latency_sum"] / count if count else 0.0,
+        "api_calls_per_lead": _stats["api_calls"] / leads if leads else 0.0,
+    }
+
+
+async def start_notification_workers():
+    """
+    Creates the queue and starts the worker pool for NOTIFICATION_MODE.
+    """
+    global _queue, _workers, _flushing
+    if NOTIFICATION_MODE not in _MODES:
+        raise ValueError(f"Unknown NOTIFICATION_MODE {NOTIFICATION_MODE!r} (known: {', '.join(_MODES)})")
+    workers, size, max_wait, send = _MODES[NOTIFICATION_MODE]
+    _queue = asyncio.Queue(maxsize=NOTIFICATION_QUEUE_SIZE)
+    _flushing = asyncio.Event()
+    _workers = [
+        asyncio.create_task(_worker(i, size, max_wait, send), name=f"notification-worker-{i}")
+        for i in range(workers)
+    ]
+    logger.info(f"Notification pool started ({NOTIFICATION_MODE} mode, {workers} workers, queue size {NOTIFICATION_QUEUE_SIZE})")
+
+
+async def flush_notifications(timeout: float = NOTIFICATION_FLUSH_TIMEOUT) -> bool:
+    """
+    Sends buffered notifications now (open batches and the digest don't wait
+    for their interval) and waits up to ``timeout`` for the queue to drain.
+
+    Returns:
+        bool: True if everything queued was sent or given up on
+    """
+    if _queue is None or not _workers:
+        return True
+    _flushing.set()
+    try:
+        await asyncio.wait_for(_queue.join(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def stop_notification_workers(timeout: float = NOTIFICATION_FLUSH_TIMEOUT) -> list:
+    """
+    Flushes the buffer (up to ``timeout``), then cancels the worker pool.
+
+    Returns:
+        list: Leads whose notification was not sent (still queued, or cut
+        off mid-send), for the caller to persist
+    """
+    global _queue, _workers
+    flushed = await flush_notifications(timeout)
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    unsent = [lead_data for groups in _held.values() for group in groups for lead_data in group]
+    while _queue is not None and not _queue.empty():
+        unsent.append(_queue.get_nowait())
+    if not flushed or unsent:
+        _stats["unflushed"] += len(unsent)
+        logger.warning(f"{len(unsent)} email notifications not sent before shutdown.")
+    _held.clear()
+    _workers = []
+    _queue = None
+    return unsent
+
+
+@register_collector
+def _collect_notification_metrics():
+    stats = notification_stats()
+    yield ("notification_queue_depth", "gauge", "Notifications waiting for a worker.", {}, stats["queue_depth"])
+    yield ("notification_queue_capacity", "gauge", "Notification queue size limit.", {}, stats["queue_capacity"])
+    for event in ("enqueued", "sent", "failed", "retries", "dropped", "unflushed"):
+        yield ("notification_events_total", "counter", "Notification pool events.", {"event": event}, stats[event])
+    yield ("notification_api_calls_total", "counter", "Resend API calls (attempts) for notifications.", {}, stats["api_calls"])
+    yield ("notification_api_calls_per_lead", "gauge", "Resend API calls per notified lead.", {}, stats["api_calls_per_lead"])
+    yield ("notification_send_duration_seconds_sum", "counter", "Total time spent in Resend sends.", {}, stats["send_latency_sum"])
+    yield ("notification_send_duration_seconds_count", "counter", "Number of Resend send attempts.", {}, stats["send_latency_count"])
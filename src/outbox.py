@@ -0,0 +1,260 @@
+"""
+Durable local outbox for consultation leads.
+
+Leads are written to a SQLite database (WAL mode, synchronous=FULL) before the
+webhook answers Dialogflow. A background worker then drains the outbox to
+Google Sheets with exponential backoff. A row is only marked delivered after
+Apps Script accepted it, so delivery is at-least-once and resumes after a
+restart or redeploy (mount a volume at LEAD_OUTBOX_PATH on Railway).
+
+Each row records its tenant; a row whose tenant's Apps Script breaker is
+open is put back without counting an attempt, so other tenants' leads keep
+flowing.
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from src import logging
+from src.metrics import register_collector
+from src.circuit_breaker import get_breaker
+from src.tenants import DEFAULT_TENANT_ID
+from src.utils import send_consultation_lead_to_webhook
+from src.config import (
+    LEAD_OUTBOX_PATH,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_RETRY_BASE_DELAY,
+    OUTBOX_RETRY_MAX_DELAY,
+    OUTBOX_RETENTION_DAYS,
+    OUTBOX_CLAIM_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lead_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    delivered_at REAL,
+    last_error TEXT,
+    tenant TEXT NOT NULL DEFAULT 'default'
+);
+CREATE INDEX IF NOT EXISTS idx_lead_outbox_pending
+    ON lead_outbox (delivered_at, next_attempt_at);
+"""
+
+_conn: sqlite3.Connection | None = None
+_lock = threading.Lock()
+_wakeup: asyncio.Event | None = None
+_worker: asyncio.Task | None = None
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # FULL: the commit is fsynced before enqueue_lead returns
+    conn.execute("PRAGMA synchronous=FULL")
+    # Several server workers share the file; wait for their write locks
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.executescript(_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(lead_outbox)")}
+    if "tenant" not in columns:
+        # Outbox created before multi-tenancy: its rows belong to the default tenant
+        conn.execute("ALTER TABLE lead_outbox ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+    return conn
+
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = _connect(LEAD_OUTBOX_PATH)
+    return _conn
+
+
+def _execute(sql: str, params: tuple = ()) -> list:
+    with _lock:
+        return _get_conn().execute(sql, params).fetchall()
+
+
+def _insert(lead_id: str, payload: str, tenant: str):
+    now = time.time()
+    _execute(
+        "INSERT OR IGNORE INTO lead_outbox (lead_id, payload, created_at, next_attempt_at, tenant) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (lead_id, payload, now, now, tenant),
+    )
+
+
+async def enqueue_lead(lead_data: dict) -> str:
+    """
+    Durably stores a lead in the outbox and wakes the delivery worker.
+
+    A ``lead_id`` is added to the lead if missing; it is sent along to Apps
+    Script so retried deliveries can be recognised as the same lead.
+
+    Args:
+        lead_data (dict): Lead fields as sent to Google Sheets
+
+    Returns:
+        str: The lead_id of the stored lead
+    """
+    lead_id = lead_data.setdefault("lead_id", uuid.uuid4().hex)
+    tenant = lead_data.get("tenant") or DEFAULT_TENANT_ID
+    await asyncio.to_thread(_insert, lead_id, json.dumps(lead_data, ensure_ascii=False), tenant)
+    if _wakeup is not None:
+        _wakeup.set()
+    return lead_id
+
+
+def pending_count() -> int:
+    """
+    Returns the number of leads not yet delivered to Google Sheets.
+    """
+    return _execute("SELECT COUNT(*) FROM lead_outbox WHERE delivered_at IS NULL")[0][0]
+
+
+def pending_by_tenant() -> dict:
+    return dict(_execute("SELECT tenant, COUNT(*) FROM lead_outbox WHERE delivered_at IS NULL GROUP BY tenant"))
+
+
+def _due_leads(limit: int) -> list:
+    # Claim due rows in one statement by pushing next_attempt_at out by the
+    # claim timeout, so other worker processes sharing the outbox skip them.
+    # A row claimed by a worker that dies becomes due again after the timeout.
+    now = time.time()
+    return _execute(
+        "UPDATE lead_outbox SET next_attempt_at = ? WHERE id IN ("
+        "SELECT id FROM lead_outbox WHERE delivered_at IS NULL AND next_attempt_at <= ? "
+        "ORDER BY id LIMIT ?) "
+        "RETURNING id, payload, attempts, tenant",
+        (now + OUTBOX_CLAIM_TIMEOUT, now, limit),
+    )
+
+
+def _mark_delivered(row_id: int):
+    _execute("UPDATE lead_outbox SET delivered_at = ?, last_error = NULL WHERE id = ?", (time.time(), row_id))
+
+
+def _mark_failed(row_id: int, attempts: int, error: str):
+    delay = min(OUTBOX_RETRY_MAX_DELAY, OUTBOX_RETRY_BASE_DELAY * (2 ** attempts))
+    delay *= random.uniform(0.8, 1.2)
+    _execute(
+        "UPDATE lead_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+        (attempts + 1, time.time() + delay, error, row_id),
+    )
+
+
+def _defer(row_id: int, delay: float):
+    _execute("UPDATE lead_outbox SET next_attempt_at = ? WHERE id = ?", (time.time() + delay, row_id))
+
+
+def _prune_delivered():
+    cutoff = time.time() - OUTBOX_RETENTION_DAYS * 86400
+    _execute("DELETE FROM lead_outbox WHERE delivered_at IS NOT NULL AND delivered_at < ?", (cutoff,))
+
+
+async def _deliver_due_leads() -> int:
+    rows = await asyncio.to_thread(_due_leads, OUTBOX_BATCH_SIZE)
+    # Deliver concurrently so the lead batcher (if enabled) can coalesce them
+    await asyncio.gather(*(_deliver_row(*row) for row in rows))
+    return len(rows)
+
+
+async def _deliver_row(row_id: int, payload: str, attempts: int, tenant: str):
+    breaker = get_breaker("apps_script", tenant)
+    if breaker.rejecting():
+        # Leave the row's attempt count alone until its tenant's cooldown ends
+        await asyncio.to_thread(_defer, row_id, max(breaker.cooldown_remaining(), OUTBOX_POLL_INTERVAL))
+        return
+    lead_data = json.loads(payload)
+    try:
+        success = await send_consultation_lead_to_webhook(lead_data)
+        error = None if success else "delivery failed"
+    except Exception as e:
+        success, error = False, str(e)
+
+    if success:
+        await asyncio.to_thread(_mark_delivered, row_id)
+    else:
+        await asyncio.to_thread(_mark_failed, row_id, attempts, error)
+        logger.warning(f"Outbox delivery of lead {lead_data.get('lead_id')} failed (attempt {attempts + 1}): {error}")
+
+
+async def _delivery_worker():
+    while True:
+        try:
+            delivered = await _deliver_due_leads()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Outbox worker error: {e}")
+            delivered = 0
+
+        # A full batch means more rows may already be due
+        if delivered >= OUTBOX_BATCH_SIZE:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def worker_running() -> bool:
+    return _worker is not None and not _worker.done()
+
+
+async def start_outbox():
+    """
+    Opens the outbox database and starts the background delivery worker.
+    Leads left undelivered by a previous process are picked up right away.
+    """
+    global _wakeup, _worker
+    await asyncio.to_thread(_get_conn)
+    await asyncio.to_thread(_prune_delivered)
+    _wakeup = asyncio.Event()
+    _worker = asyncio.create_task(_delivery_worker(), name="lead-outbox-worker")
+    logger.info(f"Lead outbox started at {LEAD_OUTBOX_PATH} ({pending_count()} pending)")
+
+
+async def stop_outbox():
+    """
+    Stops the delivery worker and closes the database. Undelivered leads stay
+    in the outbox and are retried on the next start.
+    """
+    global _conn, _worker, _wakeup
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
+    _wakeup = None
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+@register_collector
+def _collect_outbox_metrics():
+    # Only report once the outbox is open (don't create the DB from a scrape)
+    pending = pending_count() if _conn is not None else None
+    yield ("lead_outbox_pending", "gauge", "Leads not yet delivered to Google Sheets.", {}, pending)
+    if _conn is not None:
+        for tenant, count in pending_by_tenant().items():
+            yield ("lead_outbox_tenant_pending", "gauge", "Undelivered leads per tenant.", {"tenant": tenant}, count)
@@ -0,0 +1,237 @@
+"""
+Event-loop stall detection and on-demand profiling of /webhook calls.
+
+Stall detector: a heartbeat task stamps the time every LOOP_STALL_THRESHOLD/4
+seconds; a watchdog thread checks the stamp and, once the loop has not run
+for LOOP_STALL_THRESHOLD, logs the loop thread's current stack (read with
+sys._current_frames) - i.e. the code that is blocking it - and then how long
+the stall lasted. This is how blocking I/O in a handler (see
+RAILWAY_TIMEOUT_FIX.md) shows up in the logs before Dialogflow times out.
+
+Request profiling: a profiled call gets a sampler thread that records the
+loop thread's stack every PROFILE_INTERVAL while the call's task is the one
+running; samples taken while it is awaiting are counted as "(awaiting)", or
+"(other tasks)" when another task holds the loop. The result is written to
+PROFILE_DIR in collapsed-stack format ("frame;frame;frame count"), which
+flamegraph.pl, speedscope and inferno read directly. Calls are profiled at
+PROFILE_SAMPLE_RATE, or when they send PROFILE_HEADER with the ADMIN_TOKEN
+value; at most PROFILE_MAX_CONCURRENT at a time per process.
+"""
+import asyncio
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from src import logging
+from src.config import (
+    ADMIN_TOKEN,
+    LOOP_STALL_THRESHOLD,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_HEADER,
+    PROFILE_INTERVAL,
+    PROFILE_DIR,
+    PROFILE_MAX_CONCURRENT,
+)
+from src.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_PROJECT_ROOT):
+        return os.path.relpath(filename, _PROJECT_ROOT)
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker != -1:
+        return filename[marker + len("site-packages") + 1:]
+    return os.path.basename(filename)
+
+
+def _collapsed_stack(frame) -> list:
+    # Outermost frame first, as flamegraph tools expect
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class StallWatchdog:
+    """
+    Watches the event loop from a daemon thread and logs the blocking stack
+    when the loop stops running for ``threshold`` seconds.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.last_beat = time.monotonic()
+        self.stalls = 0
+        self.longest = 0.0
+        self._loop_thread_id: int | None = None
+        self._heartbeat: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    async def _beat(self):
+        while True:
+            self.last_beat = time.monotonic()
+            await asyncio.sleep(self.threshold / 4)
+
+    def _watch(self):
+        stalled_beat = None
+        while not self._stop.wait(self.threshold / 4):
+            beat = self.last_beat
+            if stalled_beat is not None:
+                if beat != stalled_beat:
+                    # The heartbeat ran again: the stall is over
+                    duration = beat - stalled_beat
+                    self.longest = max(self.longest, duration)
+                    logger.warning(f"Event loop stall ended after {duration * 1000:.0f}ms",
+                                   extra={"fields": {"stall_ms": round(duration * 1000, 1)}})
+                    stalled_beat = None
+                continue
+            blocked = time.monotonic() - beat
+            if blocked >= self.threshold:
+                stalled_beat = beat
+                self.stalls += 1
+                self._report(blocked)
+
+    def _report(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        where = ""
+        if frame is not None:
+            where = f" in {frame.f_code.co_name} ({_short_path(frame.f_code.co_filename)}:{frame.f_lineno})"
+        logger.warning(f"Event loop blocked for {blocked * 1000:.0f}ms{where}",
+                       extra={"fields": {"blocked_ms": round(blocked * 1000, 1), "stack": stack}})
+
+    async def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = asyncio.create_task(self._beat(), name="loop-stall-heartbeat")
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+
+# Process-wide watchdog, started from the app lifespan
+stall_watchdog = StallWatchdog(LOOP_STALL_THRESHOLD)
+
+
+class RequestProfile:
+    """
+    Samples the loop thread's stack for one call from a background thread.
+    """
+
+    def __init__(self, label: str, task: asyncio.Task, loop: asyncio.AbstractEventLoop):
+        self.label = label
+        self.task = task
+        self.loop = loop
+        self.samples: Counter = Counter()
+        self._loop_thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _sample(self):
+        current = asyncio.current_task(self.loop)
+        if current is not self.task:
+            self.samples[(self.label, "(awaiting)" if current is None else "(other tasks)")] += 1
+            return
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is not None:
+            self.samples[(self.label, *_collapsed_stack(frame))] += 1
+
+    def _run(self):
+        while not self._stop.wait(PROFILE_INTERVAL):
+            self._sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        # Blocks until the last sample is taken; call it off the loop
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.items())
+
+
+_profiles = {"active": 0, "written": 0}
+
+
+def _selected(request) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    if token and ADMIN_TOKEN:
+        # Profiling on request costs a thread and a file, so it takes the admin token
+        return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _finish_profile(profile: RequestProfile, path: str):
+    profile.stop()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write(profile.collapsed())
+
+
+@asynccontextmanager
+async def profile_request(request, tag: str):
+    """
+    Profiles the enclosed code if this call is selected (header or sampling
+    rate); otherwise does nothing.
+    """
+    if request is None or _profiles["active"] >= PROFILE_MAX_CONCURRENT or not _selected(request):
+        yield
+        return
+
+    _profiles["active"] += 1
+    profile = RequestProfile(f"webhook:{tag}", asyncio.current_task(), asyncio.get_running_loop())
+    started = time.perf_counter()
+    profile.start()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        path = os.path.join(PROFILE_DIR, f"{stamp}-{tag}-{os.getpid()}.folded")
+        try:
+            await asyncio.to_thread(_finish_profile, profile, path)
+            _profiles["written"] += 1
+            logger.info("Request profile written.", extra={"fields": {
+                "path": path, "samples": sum(profile.samples.values()), "duration_ms": round(duration * 1000, 1),
+            }})
+        except OSError as e:
+            logger.error(f"Could not write request profile {path} -> {e}")
+        finally:
+            _profiles["active"] -= 1
+
+
+@register_collector
+def _collect_profiling_metrics():
+    yield ("event_loop_stalls_total", "counter", "Times the event loop was blocked past LOOP_STALL_THRESHOLD.",
+           {}, stall_watchdog.stalls)
+    yield ("event_loop_stall_longest_seconds", "gauge", "Longest event loop stall seen by this process.",
+           {}, stall_watchdog.longest)
+    yield ("request_profiles_written_total", "counter", "Request profiles written to PROFILE_DIR.",
+           {}, _profiles["written"])
@@ -0,0 +1,147 @@
+"""
+Tag -> handler registry for Dialogflow CX webhook calls.
+
+Action modules register their handlers with ``@register_handler("<tag>")``.
+The action modules are not imported up front: on the first call the
+``src/actions`` directory is scanned (by parsing, not importing) to find
+which module declares which tag, and a module is imported the first time
+one of its tags is requested. Dispatch after that is a single dict lookup.
+"""
+import ast
+import importlib
+import os
+from typing import Any, Awaitable, Callable, Iterable
+
+from src import logging
+from src.schemas import WebhookRequest
+
+logger = logging.getLogger(__name__)
+
+ACTIONS_PACKAGE = "src.actions"
+ACTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "actions")
+
+# Resources main.py can inject into handlers that ask for them
+AVAILABLE_RESOURCES = ("background_tasks", "request")
+
+
+class HandlerSpec:
+    """
+    A registered handler, the resources it wants injected, the request
+    fields it reads (None = the whole WebhookRequest), whether CX retries
+    of the same call may be answered from the idempotency cache, and what
+    to do with a call admission control sheds.
+    """
+
+    __slots__ = ("tag", "func", "inject", "fields", "idempotent", "on_shed")
+
+    def __init__(self, tag: str, func: Callable[..., Awaitable[Any]], inject: tuple,
+                 fields: tuple | None, idempotent: bool = True,
+                 on_shed: Callable[[WebhookRequest], Awaitable[Any]] | None = None):
+        self.tag = tag
+        self.func = func
+        self.inject = inject
+        self.fields = fields
+        self.idempotent = idempotent
+        self.on_shed = on_shed
+
+    async def __call__(self, webhook_request, resources: dict):
+        if not self.inject:
+            return await self.func(webhook_request=webhook_request)
+        kwargs = {name: resources.get(name) for name in self.inject}
+        return await self.func(webhook_request=webhook_request, **kwargs)
+
+
+_handlers: dict = {}
+_tag_index: dict | None = None
+
+
+def register_handler(tag: str, inject: Iterable[str] = (), fields: Iterable[str] | None = None,
+                     idempotent: bool = True, on_shed: Callable[[WebhookRequest], Awaitable[Any]] | None = None):
+    """
+    Registers an async handler for a fulfillmentInfo.tag.
+
+    Args:
+        tag (str): The Dialogflow CX webhook tag
+        inject (Iterable[str]): Extra keyword arguments the handler needs,
+            from AVAILABLE_RESOURCES (e.g. "background_tasks")
+        fields (Iterable[str] | None): WebhookRequest fields the handler reads.
+            The fast path (WEBHOOK_FAST_PATH) validates only these;
+            None means the whole request is validated.
+        idempotent (bool): Whether a CX retry (same detectIntentResponseId)
+            gets the first attempt's response instead of re-running the handler
+        on_shed: Awaited with the request when admission control sheds the
+            call, before the canned reply is sent (e.g. to keep its data)
+    """
+    inject = tuple(inject)
+    unknown = set(inject) - set(AVAILABLE_RESOURCES)
+    if unknown:
+        raise ValueError(f"Handler for tag '{tag}' asks for unknown resources: {sorted(unknown)}")
+    if fields is not None:
+        fields = tuple(sorted({"fulfillmentInfo", *fields}))
+        unknown = set(fields) - set(WebhookRequest.model_fields)
+        if unknown:
+            raise ValueError(f"Handler for tag '{tag}' declares unknown request fields: {sorted(unknown)}")
+
+    def decorator(func):
+        if tag in _handlers and _handlers[tag].func is not func:
+            raise ValueError(f"Tag '{tag}' is already registered by {_handlers[tag].func.__qualname__}")
+        _handlers[tag] = HandlerSpec(tag, func, inject, fields, idempotent, on_shed)
+        return func
+
+    return decorator
+
+
+def _declared_tags(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    tags = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            if not isinstance(decorator, ast.Call) or not decorator.args:
+                continue
+            name = getattr(decorator.func, "id", None) or getattr(decorator.func, "attr", None)
+            first = decorator.args[0]
+            if name == "register_handler" and isinstance(first, ast.Constant) and isinstance(first.value, str):
+                tags.append(first.value)
+    return tags
+
+
+def build_tag_index() -> dict:
+    """
+    Maps every declared tag to the module declaring it, without importing.
+    """
+    index = {}
+    for filename in sorted(os.listdir(ACTIONS_DIR)):
+        if not filename.endswith(".py") or filename.startswith("_"):
+            continue
+        module = f"{ACTIONS_PACKAGE}.{filename[:-3]}"
+        for tag in _declared_tags(os.path.join(ACTIONS_DIR, filename)):
+            if tag in index:
+                raise ValueError(f"Tag '{tag}' is declared in both {index[tag]} and {module}")
+            index[tag] = module
+    return index
+
+
+def tag_index() -> dict:
+    global _tag_index
+    if _tag_index is None:
+        _tag_index = build_tag_index()
+        logger.info(f"Webhook handler index: {len(_tag_index)} tags in {len(set(_tag_index.values()))} modules")
+    return _tag_index
+
+
+def get_handler(tag: str) -> HandlerSpec | None:
+    """
+    Returns the handler for a tag, importing its module on first use.
+    """
+    spec = _handlers.get(tag)
+    if spec is not None:
+        return spec
+
+    module = tag_index().get(tag)
+    if module is None:
+        return None
+    importlib.import_module(module)
+    return _handlers.get(tag)
@@ -0,0 +1,152 @@
+"""
+Pre-serialized response catalog for the static (bilingual) webhook replies.
+
+At startup every locale/message pair in RESPONSES is rendered once through
+WebhookResponse into JSON bytes, split around the ``sessionInfo`` value.
+A reply is then ``prefix + sessionInfo JSON + suffix``: only the session
+part is serialized per request. Locale lookup follows BCP-47 fallback
+(``fr-CA`` -> ``fr`` -> ``en``) and is memoized.
+
+Tenants with their own ``responses`` (src/tenants.py) get a catalog of their
+own, merged over RESPONSES and compiled on first use after each reload.
+"""
+from functools import lru_cache
+
+from starlette.responses import Response
+
+from src import jsonutil
+from src.config import RESPONSES, DEFAULT_LANGUAGE
+from src.schemas import FulfillmentResponse, Message, Text, WebhookResponse
+from src.tenants import tenants
+
+_SESSION_SLOT = b'"sessionInfo":null'
+
+_fragments: dict = {}
+# tenant id -> (config generation, merged RESPONSES, fragments)
+_tenant_catalogs: dict = {}
+
+_MISSING = object()
+
+
+class WebhookJSONResponse(Response):
+    media_type = "application/json"
+
+
+def _resolve_locale(language_code: str | None, responses: dict) -> str:
+    if not language_code:
+        return DEFAULT_LANGUAGE
+    parts = language_code.replace("_", "-").lower().split("-")
+    while parts:
+        candidate = "-".join(parts)
+        if candidate in responses:
+            return candidate
+        parts.pop()
+    return DEFAULT_LANGUAGE
+
+
+@lru_cache(maxsize=256)
+def resolve_locale(language_code: str | None) -> str:
+    """
+    Returns the best RESPONSES locale for a BCP-47 language code.
+
+    Subtags are dropped from the right until a match is found
+    (``zh-Hant-TW`` -> ``zh-Hant`` -> ``zh``), then DEFAULT_LANGUAGE is used.
+    """
+    return _resolve_locale(language_code, RESPONSES)
+
+
+def response_text(key: str, language_code: str | None, responses: dict = RESPONSES) -> str:
+    """
+    Returns the localized text for a RESPONSES key (default language if the
+    locale lacks that key).
+    """
+    messages = responses[_resolve_locale(language_code, responses)]
+    return messages.get(key) or responses[DEFAULT_LANGUAGE][key]
+
+
+def _compile(text: str) -> tuple:
+    template = WebhookResponse(
+        fulfillmentResponse=FulfillmentResponse(messages=[Message(text=Text(text=[text]))])
+    )
+    body = template.__pydantic_serializer__.to_json(template)
+    prefix, suffix = body.split(_SESSION_SLOT)
+    return prefix + b'"sessionInfo":', suffix
+
+
+def _compile_catalog(responses: dict) -> dict:
+    keys = {key for messages in responses.values() for key in messages}
+    return {
+        (locale, key): _compile(response_text(key, locale, responses))
+        for locale in responses
+        for key in keys
+    }
+
+
+def build_response_catalog():
+    """
+    Precompiles every locale/key pair to JSON byte fragments.
+    """
+    _fragments.clear()
+    _fragments.update(_compile_catalog(RESPONSES))
+
+
+def _tenant_catalog(tenant) -> tuple:
+    catalog = _tenant_catalogs.get(tenant.id)
+    if catalog is None or catalog[0] != tenant.generation:
+        responses = {locale: dict(messages) for locale, messages in RESPONSES.items()}
+        for locale, messages in tenant.responses.items():
+            responses.setdefault(locale, {}).update(messages)
+        catalog = _tenant_catalogs[tenant.id] = (tenant.generation, responses, _compile_catalog(responses))
+    return catalog
+
+
+def render_response(key: str, language_code: str | None, session: str | None = None,
+                    parameters: dict | None = None) -> WebhookJSONResponse:
+    """
+    Builds a webhook reply from the catalog, splicing in the sessionInfo.
+
+    Args:
+        key (str): RESPONSES key, e.g. "consultation_saved"
+        language_code (str | None): Request languageCode (BCP-47)
+        session (str | None): sessionInfo.session to echo; None omits
+            sessionInfo. Its agent selects the tenant's replies.
+        parameters (dict | None): Changed session parameters (see
+            parameter_delta); None or empty sends the session alone
+    """
+    tenant = tenants.for_session(session)
+    if tenant.responses:
+        _, responses, fragments = _tenant_catalog(tenant)
+        prefix, suffix = fragments[(_resolve_locale(language_code, responses), key)]
+    else:
+        if not _fragments:
+            build_response_catalog()
+        prefix, suffix = _fragments[(resolve_locale(language_code), key)]
+    if session is None:
+        session_json = b"null"
+    else:
+        session_info = {"session": session}
+        if parameters:
+            session_info["parameters"] = parameters
+        session_json = jsonutil.dumps(session_info)
+    return WebhookJSONResponse(prefix + session_json + suffix)
+
+
+def parameter_delta(current: dict | None, changes: dict) -> dict:
+    """
+    Returns the session parameters a handler has to send back to CX.
+
+    CX merges the returned parameters into the session, so echoing the whole
+    dict is unnecessary: only entries of ``changes`` that differ from the
+    session's ``current`` value are kept. A None value deletes the parameter
+    (sent as JSON null) and is only kept if the session has that parameter.
+
+    Args:
+        current (dict | None): sessionInfo.parameters from the request
+        changes (dict): Parameters the handler sets (None = delete)
+    """
+    current = current or {}
+    return {
+        key: value
+        for key, value in changes.items()
+        if (key in current if value is None else current.get(key, _MISSING) != value)
+    }
@@ -1,6 +1,7 @@
-from typing import Dict, List, Any, Literal
+from functools import lru_cache
+from typing import Dict, List, Any, Literal, Tuple
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 
 
 class FulfillmentInfo(BaseModel):
@@ -83,3 +84,30 @@ class WebhookResponse(BaseModel):
     payload: Dict[str, Any] | None = None
     targetFlow: str | None = None
     targetPage: str | None = None
+
+
+@lru_cache(maxsize=None)
+def partial_request_model(fields: Tuple[str, ...]) -> type:
+    """
+    Builds (once per field set) a model validating only some WebhookRequest fields.
+    """
+    definitions = {
+        name: (WebhookRequest.model_fields[name].annotation, WebhookRequest.model_fields[name])
+        for name in fields
+    }
+    return create_model(f"PartialWebhookRequest_{'_'.join(fields)}", **definitions)
+
+
+def parse_partial_request(data: dict, fields: Tuple[str, ...] | None) -> WebhookRequest:
+    """
+    Validates only ``fields`` of a decoded webhook body (all of it when None).
+
+    The result is a WebhookRequest built without re-validation; fields that
+    were not requested keep their defaults (None).
+    """
+    if fields is None:
+        return WebhookRequest.model_validate(data)
+    validated = partial_request_model(fields).model_validate(
+        {name: data[name] for name in fields if name in data}
+    )
+    return WebhookRequest.model_construct(**{name: getattr(validated, name) for name in fields})
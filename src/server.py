@@ -0,0 +1,85 @@
+"""
+Uvicorn server and gunicorn worker that start the shutdown drain on SIGTERM.
+
+Uvicorn runs the app's lifespan shutdown only after it has closed the
+listeners and waited for open requests, so the drain (src/shutdown.py)
+cannot start there. DrainingServer begins it from the signal handler:
+readiness fails and admission sheds new calls at once, and the calls still
+running get SHUTDOWN_DRAIN_TIMEOUT (timeout_graceful_shutdown) before they
+are cancelled and their leads spilled by the lifespan.
+
+    serve(...)                  uvicorn.run() with DrainingServer (run.py)
+    DrainingUvicornWorker       gunicorn worker class (gunicorn.conf.py)
+"""
+import asyncio
+import sys
+
+from uvicorn import Config, Server
+from uvicorn.supervisors import Multiprocess
+
+from src.config import SHUTDOWN_DRAIN_TIMEOUT
+from src.shutdown import begin_drain
+
+try:
+    from gunicorn.arbiter import Arbiter
+    from uvicorn.workers import UvicornWorker
+except ImportError:  # pragma: no cover - gunicorn is not installed (e.g. Windows)
+    UvicornWorker = None
+
+STARTUP_FAILURE = 3
+
+
+class DrainingServer(Server):
+    """
+    Server whose exit signal starts the drain before the listeners close.
+    """
+
+    def handle_exit(self, sig, frame):
+        if not self.should_exit:
+            # Only flags and a deadline here: this runs in a signal handler
+            drain = begin_drain()
+            try:
+                asyncio.get_running_loop().call_soon_threadsafe(drain.log_start)
+            except RuntimeError:
+                pass
+        super().handle_exit(sig, frame)
+
+
+def serve(app: str, **kwargs):
+    """
+    Runs ``app`` like uvicorn.run(app, **kwargs), with DrainingServer and
+    in-flight calls bounded by SHUTDOWN_DRAIN_TIMEOUT.
+    """
+    kwargs.setdefault("timeout_graceful_shutdown", SHUTDOWN_DRAIN_TIMEOUT)
+    config = Config(app, **kwargs)
+    server = DrainingServer(config=config)
+    try:
+        if config.workers > 1:
+            sock = config.bind_socket()
+            Multiprocess(config, target=server.run, sockets=[sock]).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
+    if not server.started and config.workers == 1:
+        sys.exit(STARTUP_FAILURE)
+
+
+if UvicornWorker is not None:
+
+    class DrainingUvicornWorker(UvicornWorker):
+        """
+        UvicornWorker running DrainingServer, with in-flight calls bounded by
+        SHUTDOWN_DRAIN_TIMEOUT (gunicorn.conf.py keeps graceful_timeout above
+        the drain plus the spill).
+        """
+
+        CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "timeout_graceful_shutdown": SHUTDOWN_DRAIN_TIMEOUT}
+
+        async def _serve(self):
+            self.config.app = self.wsgi
+            server = DrainingServer(config=self.config)
+            self._install_sigquit_handler()
+            await server.serve(sockets=self.sockets)
+            if not server.started:
+                sys.exit(Arbiter.WORKER_BOOT_ERROR)
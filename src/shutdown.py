@@ -0,0 +1,264 @@
+"""
+Graceful shutdown: drain in-flight work, spill what is left, replay it.
+
+A redeploy sends SIGTERM; the server's signal handler starts a Drain
+(src/server.py) and the app lifespan finishes it:
+
+1. readiness turns false and admission sheds every new /webhook call
+   (reason "draining", answered at once with the consultation_error reply),
+2. in-flight webhook calls, then the notification queue, get until
+   SHUTDOWN_DRAIN_TIMEOUT to finish; the server cancels calls still
+   running then,
+3. what is still undelivered - leads whose sink writes were cut off and
+   notifications not sent - is appended to SHUTDOWN_SPILL_PATH (NDJSON,
+   one ``{"kind": ..., "item": ...}`` per line, fsynced).
+
+replay_spill() runs at the next startup, once the sinks and the
+notification pool are up: spilled leads are written to the sinks again,
+spilled notifications are queued again, and the file is removed once all
+are handed over. Items that still cannot be handed over are spilled again.
+Worker processes share the file: the first to start claims it (a flock
+held for the whole replay) and the others skip it; spills take a second,
+short flock so a claim never moves the file aside mid-write.
+Delivery is at-least-once: a send cut off mid-flight may be repeated (the
+outbox and the SQLite sink ignore a known lead_id, Resend a known
+idempotency key).
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no file locks
+    fcntl = None
+
+from src import logging
+from src import health
+from src.admission import admission
+from src.config import SHUTDOWN_DRAIN_TIMEOUT, SHUTDOWN_SPILL_PATH
+from src.metrics import WEBHOOK_IN_FLIGHT, register_collector
+from src.notifications import enqueue_notification
+from src.sinks import write_lead
+
+logger = logging.getLogger(__name__)
+
+_replayed: dict = {}
+_drain = None
+
+
+def _lock(path: str, blocking: bool = True):
+    """
+    Opens ``path`` and takes an exclusive flock on it. Returns the open file
+    (closing it releases the lock), or None if ``blocking`` is False and
+    another process holds it.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    f = open(path, "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
+
+
+def _write_lines(path: str, lines: list):
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _append(path: str, lines: list):
+    # Under the lock, so a worker claiming the file for replay never moves it
+    # aside in the middle of another worker's spill
+    with contextlib.closing(_lock(path + ".lock")):
+        _write_lines(path, lines)
+
+
+async def _spill(kind: str, items: list) -> bool:
+    if not SHUTDOWN_SPILL_PATH:
+        return False
+    lines = [json.dumps({"kind": kind, "item": item}, ensure_ascii=False) + "\n" for item in items]
+    try:
+        await asyncio.to_thread(_append, SHUTDOWN_SPILL_PATH, lines)
+        return True
+    except OSError as e:
+        logger.error(f"Could not write {len(items)} {kind} items to {SHUTDOWN_SPILL_PATH} -> {e}")
+        return False
+
+
+class Drain:
+    """
+    One shutdown: the drain deadline and what was spilled or dropped.
+    """
+
+    def __init__(self, timeout: float):
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.spilled: dict = {}
+        self.dropped: dict = {}
+        self.unfinished_calls = 0
+        self._logged = False
+
+    def log_start(self):
+        if not self._logged:
+            self._logged = True
+            logger.info(f"Draining (up to {self.remaining():.0f}s)")
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    async def wait_for_handlers(self):
+        """
+        Waits (up to the deadline) for admitted webhook calls to answer.
+        """
+        while WEBHOOK_IN_FLIGHT.labels().value > 0 and self.remaining() > 0:
+            await asyncio.sleep(0.05)
+        self.unfinished_calls = int(WEBHOOK_IN_FLIGHT.labels().value)
+
+    async def spill(self, kind: str, items: list):
+        """
+        Persists undelivered ``items`` for replay_spill(); counted as dropped
+        if the spill file is disabled or cannot be written.
+        """
+        if not items:
+            return
+        counts = self.spilled if await _spill(kind, items) else self.dropped
+        counts[kind] = counts.get(kind, 0) + len(items)
+
+    def report(self):
+        duration = time.monotonic() - self.started
+        spilled = sum(self.spilled.values())
+        dropped = sum(self.dropped.values())
+        message = (f"Shutdown drained in {duration * 1000:.0f}ms "
+                   f"({spilled} items spilled to {SHUTDOWN_SPILL_PATH or '-'}, {dropped} dropped)")
+        fields = {
+            "drain_ms": round(duration * 1000, 1),
+            "unfinished_calls": self.unfinished_calls,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+        }
+        if dropped or self.unfinished_calls:
+            logger.warning(message, extra={"fields": fields})
+        else:
+            logger.info(message, extra={"fields": fields})
+
+
+def begin_drain(timeout: float = SHUTDOWN_DRAIN_TIMEOUT) -> Drain:
+    """
+    Starts the shutdown: /readyz fails and new webhook calls are shed. Safe
+    to call from a signal handler (it only sets flags); later calls return
+    the Drain already started.
+    """
+    global _drain
+    if _drain is None:
+        health.set_draining()
+        admission.drain()
+        _drain = Drain(timeout)
+    return _drain
+
+
+def end_drain():
+    """
+    Clears the drain state at startup (an app restarted in the same process,
+    e.g. by tests, would otherwise shed every call).
+    """
+    global _drain
+    _drain = None
+    health.set_draining(False)
+    admission.drain(False)
+
+
+def _take_spill(path: str) -> list:
+    # Called with the replay lock held. The file is moved aside while it is
+    # replayed, so a crash mid-replay leaves it to the next start instead of
+    # losing it; new spills keep going to ``path``
+    replaying = path + ".replaying"
+    with contextlib.closing(_lock(path + ".lock")):
+        if os.path.exists(path):
+            if os.path.exists(replaying):
+                with open(path, encoding="utf-8") as f:
+                    _write_lines(replaying, f.readlines())
+                os.remove(path)
+            else:
+                os.replace(path, replaying)
+    if not os.path.exists(replaying):
+        return []
+    with open(replaying, encoding="utf-8") as f:
+        return f.readlines()
+
+
+def _remove(path: str):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+async def _replay(kind: str, item: dict) -> bool:
+    if kind == "lead":
+        _, stored = await write_lead(item)
+        return stored
+    if kind == "notification":
+        return await enqueue_notification(item)
+    raise ValueError(f"unknown kind {kind!r}")
+
+
+async def replay_spill():
+    """
+    Hands the items spilled by the previous shutdown back to the sinks and
+    the notification queue. Called from the app lifespan after both started.
+    """
+    if not SHUTDOWN_SPILL_PATH:
+        return
+    try:
+        claim = await asyncio.to_thread(_lock, SHUTDOWN_SPILL_PATH + ".replay.lock", False)
+    except OSError as e:
+        logger.error(f"Could not lock {SHUTDOWN_SPILL_PATH} -> {e}")
+        return
+    if claim is None:
+        # Another worker process is replaying it
+        return
+    with claim:
+        await _replay_claimed()
+
+
+async def _replay_claimed():
+    try:
+        lines = await asyncio.to_thread(_take_spill, SHUTDOWN_SPILL_PATH)
+    except OSError as e:
+        logger.error(f"Could not read {SHUTDOWN_SPILL_PATH} -> {e}")
+        return
+    if not lines:
+        return
+    retry: dict = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            kind, item = entry["kind"], entry["item"]
+            ok = await _replay(kind, item)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Dropping unreadable spill entry -> {e}")
+            kind, outcome = "invalid", "dropped"
+        else:
+            outcome = "ok" if ok else "respilled"
+            if not ok:
+                retry.setdefault(kind, []).append(item)
+        _replayed[(kind, outcome)] = _replayed.get((kind, outcome), 0) + 1
+    for kind, items in retry.items():
+        await _spill(kind, items)
+    await asyncio.to_thread(_remove, SHUTDOWN_SPILL_PATH + ".replaying")
+    counts = {f"{kind}_{outcome}": count for (kind, outcome), count in _replayed.items()}
+    logger.info(f"Replayed {len(lines)} items spilled by the last shutdown.", extra={"fields": counts})
+
+
+@register_collector
+def _collect_shutdown_metrics():
+    for (kind, outcome), count in list(_replayed.items()):
+        yield ("shutdown_spill_replayed_total", "counter", "Items from the shutdown spill file replayed at startup.",
+               {"kind": kind, "outcome": outcome}, count)
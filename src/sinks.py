@@ -0,0 +1,354 @@
+"""
+Pluggable lead sinks.
+
+A consultation lead is written to every sink listed in LEAD_SINKS at once
+(asyncio.gather), each bounded by its own timeout from LEAD_SINK_TIMEOUTS.
+LEAD_SINKS_REQUIRED decides which of them must succeed before the webhook
+acknowledges the lead: "all", "any", or a comma-separated list of sink
+names (the others are best effort).
+
+Sinks:
+    apps_script  Google Sheets through the Apps Script web app (via the
+                 durable outbox when LEAD_OUTBOX_ENABLED)
+    sqlite       local SQLite table (LEAD_SQLITE_PATH)
+    ndjson       append-only newline-delimited JSON file (LEAD_NDJSON_PATH)
+
+The local sinks can stream their leads back as NDJSON (export()), which the
+admin export endpoint uses, so analytics no longer read the Google Sheet.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import AsyncIterator
+
+from src import logging
+from src.config import (
+    LEAD_SINKS,
+    LEAD_SINKS_REQUIRED,
+    LEAD_SINK_TIMEOUTS,
+    LEAD_SQLITE_PATH,
+    LEAD_NDJSON_PATH,
+    LEAD_OUTBOX_ENABLED,
+)
+from src.metrics import observe_sink, register_collector
+from src.outbox import enqueue_lead
+from src.utils import lead_owned_by_batch, send_consultation_lead_to_webhook
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 500
+
+
+class LeadSink:
+    """
+    Where leads are persisted. ``write`` returns True once the sink holds
+    the lead; sinks that support ``export`` can stream their leads back.
+    """
+
+    name = "sink"
+    exportable = False
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def write(self, lead_data: dict) -> bool:
+        raise NotImplementedError
+
+    def export(self, since: str | None = None) -> AsyncIterator[bytes]:
+        raise NotImplementedError(f"{self.name} sink does not support export")
+
+
+class AppsScriptSink(LeadSink):
+    """
+    Google Sheets through the Apps Script web app.
+
+    With LEAD_OUTBOX_ENABLED the lead counts as written once it is durable in
+    the outbox (the outbox worker delivers it with retries). Otherwise it is
+    sent within the request's deadline budget and, on failure, deferred to
+    the outbox but reported as not written.
+    """
+
+    name = "apps_script"
+
+    async def write(self, lead_data: dict) -> bool:
+        if LEAD_OUTBOX_ENABLED:
+            try:
+                await enqueue_lead(lead_data)
+                return True
+            except Exception as e:
+                logger.error(f"Could not write lead to outbox, sending directly -> {e}")
+                return await send_consultation_lead_to_webhook(lead_data)
+
+        if await send_consultation_lead_to_webhook(lead_data):
+            return True
+        if lead_owned_by_batch(lead_data):
+            # Still on its way in a batch, which defers it if the batch fails
+            return False
+        # Budget used up or Apps Script failed: let the outbox worker deliver it later
+        try:
+            await enqueue_lead(lead_data)
+            logger.info("Lead handed off to the outbox for later delivery.", extra={"fields": {"lead_id": lead_data["lead_id"]}})
+        except Exception as e:
+            logger.error(f"Could not defer lead to outbox -> {e}")
+        return False
+
+
+class SQLiteSink(LeadSink):
+    """
+    Leads in a local SQLite table, one row per lead_id (repeat writes of the
+    same lead are ignored).
+    """
+
+    name = "sqlite"
+    exportable = True
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        lead_id TEXT NOT NULL UNIQUE,
+        created_at TEXT NOT NULL,
+        payload TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_leads_created_at ON leads (created_at);
+    """
+
+    def __init__(self, path: str = LEAD_SQLITE_PATH):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # A local copy: NORMAL survives app crashes, only not a power loss
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(self._SCHEMA)
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return self._conn.execute(sql, params).fetchall()
+
+    async def start(self):
+        await asyncio.to_thread(self._execute, "SELECT 1")
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def write(self, lead_data: dict) -> bool:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR IGNORE INTO leads (lead_id, created_at, payload) VALUES (?, ?, ?)",
+            (lead_data["lead_id"], lead_data.get("timestamp") or "", json.dumps(lead_data, ensure_ascii=False)),
+        )
+        return True
+
+    async def export(self, since: str | None = None) -> AsyncIterator[bytes]:
+        # Keyset pagination: each chunk is one short query, so writers are never blocked for long
+        last_id = 0
+        while True:
+            rows = await asyncio.to_thread(
+                self._execute,
+                "SELECT id, payload FROM leads WHERE id > ? AND created_at >= ? ORDER BY id LIMIT ?",
+                (last_id, since or "", EXPORT_CHUNK_SIZE),
+            )
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield "".join(payload + "\n" for _, payload in rows).encode()
+
+
+class NDJSONSink(LeadSink):
+    """
+    Append-only file with one JSON lead per line.
+    """
+
+    name = "ndjson"
+    exportable = True
+
+    def __init__(self, path: str = LEAD_NDJSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, line: bytes):
+        with self._lock:
+            # O_APPEND: whole-line writes from several worker processes don't interleave
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    async def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    async def write(self, lead_data: dict) -> bool:
+        line = (json.dumps(lead_data, ensure_ascii=False) + "\n").encode()
+        await asyncio.to_thread(self._append, line)
+        return True
+
+    async def export(self, since: str | None = None) -> AsyncIterator[bytes]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            # Other workers keep appending: export what was there at the start,
+            # and only whole lines (a line being written is left for next time)
+            left = os.fstat(f.fileno()).st_size
+            partial = b""
+            while left > 0:
+                chunk = await asyncio.to_thread(f.read, min(left, 256 * 1024))
+                if not chunk:
+                    return
+                left -= len(chunk)
+                chunk, partial = partial + chunk, b""
+                if not chunk.endswith(b"\n"):
+                    chunk, newline, partial = chunk.rpartition(b"\n")
+                    chunk += newline
+                lines = chunk.splitlines(keepends=True)
+                if since:
+                    lines = [line for line in lines if (json.loads(line).get("timestamp") or "") >= since]
+                if lines:
+                    yield b"".join(lines)
+
+
+_SINK_TYPES = {sink.name: sink for sink in (AppsScriptSink, SQLiteSink, NDJSONSink)}
+
+_sinks: dict = {}
+_stats: dict = {}
+# Serializes the lazy start in write_lead
+_starting = asyncio.Lock()
+# lead_id -> lead whose sink writes have not all answered yet
+_writing: dict = {}
+
+
+def _parse_timeouts(spec: str) -> dict:
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+_timeouts = _parse_timeouts(LEAD_SINK_TIMEOUTS)
+
+
+def _required(names) -> set:
+    policy = LEAD_SINKS_REQUIRED.strip().lower()
+    if policy == "all":
+        return set(names)
+    if policy == "any":
+        return set()
+    # Only active sinks can be required; none left means "any"
+    return {name.strip() for name in policy.split(",") if name.strip()} & set(names)
+
+
+def configured_sink_names() -> list:
+    return [name.strip() for name in LEAD_SINKS.split(",") if name.strip()]
+
+
+def get_sink(name: str) -> LeadSink | None:
+    return _sinks.get(name)
+
+
+async def start_sinks():
+    """
+    Creates and opens the sinks listed in LEAD_SINKS. Called from the app lifespan.
+    """
+    for name in configured_sink_names():
+        if name not in _SINK_TYPES:
+            raise ValueError(f"Unknown lead sink {name!r} in LEAD_SINKS (known: {', '.join(_SINK_TYPES)})")
+        sink = _SINK_TYPES[name]()
+        await sink.start()
+        _sinks[name] = sink
+        _stats.setdefault(name, {"ok": 0, "failed": 0, "timeout": 0})
+    logger.info(f"Lead sinks: {', '.join(_sinks)} (required: {LEAD_SINKS_REQUIRED})")
+
+
+async def close_sinks():
+    for sink in _sinks.values():
+        await sink.close()
+    _sinks.clear()
+
+
+async def _write_to(sink: LeadSink, lead_data: dict) -> bool:
+    started = time.perf_counter()
+    outcome = "failed"
+    try:
+        timeout = _timeouts.get(sink.name)
+        if timeout is None:
+            ok = await sink.write(lead_data)
+        else:
+            ok = await asyncio.wait_for(sink.write(lead_data), timeout)
+        outcome = "ok" if ok else "failed"
+        return ok
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        logger.error(f"Lead sink {sink.name} timed out.", extra={"fields": {"lead_id": lead_data.get("lead_id")}})
+        return False
+    except Exception as e:
+        logger.error(f"Lead sink {sink.name} failed -> {e}", extra={"fields": {"lead_id": lead_data.get("lead_id")}})
+        return False
+    finally:
+        _stats[sink.name][outcome] += 1
+        observe_sink(sink.name, outcome, time.perf_counter() - started)
+
+
+def unfinished_leads() -> list:
+    """
+    Returns the leads whose sink writes were started but never finished
+    (cut off by shutdown), for src/shutdown.py to spill.
+    """
+    return list(_writing.values())
+
+
+async def write_lead(lead_data: dict) -> tuple:
+    """
+    Writes a lead to all active sinks concurrently.
+
+    Returns:
+        tuple: (acknowledged, stored). ``acknowledged`` follows
+        LEAD_SINKS_REQUIRED; ``stored`` is True if any sink holds the lead.
+    """
+    if not _sinks:
+        # Scripts calling the handler without the app lifespan; concurrent
+        # first calls must not open the sinks twice
+        async with _starting:
+            if not _sinks:
+                await start_sinks()
+    # One id for the lead in every sink (and the outbox)
+    lead_id = lead_data.setdefault("lead_id", uuid.uuid4().hex)
+    sinks = list(_sinks.values())
+    _writing[lead_id] = lead_data
+    results = await asyncio.gather(*(_write_to(sink, lead_data) for sink in sinks))
+    # Not reached when the write is cancelled (shutdown): the lead stays in _writing
+    del _writing[lead_id]
+    succeeded = {sink.name for sink, ok in zip(sinks, results) if ok}
+    required = _required(_sinks)
+    acknowledged = required <= succeeded if required else bool(succeeded)
+    return acknowledged, bool(succeeded)
+
+
+@register_collector
+def _collect_sink_metrics():
+    for name, counts in _stats.items():
+        for outcome, count in counts.items():
+            yield ("lead_sink_writes_total", "counter", "Lead writes per sink and outcome.",
+                   {"sink": name, "outcome": outcome}, count)
@@ -0,0 +1,49 @@
+"""
+Cold-start report: how long the app's imports and each lifespan startup
+step took, logged once the app is ready and exported on /metrics.
+"""
+import sys
+import time
+from contextlib import contextmanager
+
+import src
+from src import logging
+from src.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+_phases: dict = {}
+
+
+def record_imports():
+    """
+    Records the time from the first ``src`` import until now (call it when
+    the lifespan starts, i.e. once the app module is fully imported).
+    """
+    _phases["imports"] = time.perf_counter() - src.IMPORT_STARTED
+
+
+@contextmanager
+def startup_step(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = time.perf_counter() - started
+
+
+def log_startup_report():
+    total = time.perf_counter() - src.IMPORT_STARTED
+    _phases["total"] = total
+    steps = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in _phases.items() if name != "total")
+    logger.info(
+        f"Startup complete in {total * 1000:.0f}ms ({steps}; {len(sys.modules)} modules loaded)",
+        extra={"fields": {f"startup_{name}_ms": round(seconds * 1000, 1) for name, seconds in _phases.items()}},
+    )
+
+
+@register_collector
+def _collect_startup_metrics():
+    for name, seconds in _phases.items():
+        yield ("startup_duration_seconds", "gauge", "Time spent in each startup phase of this process.",
+               {"phase": name}, seconds)
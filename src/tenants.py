@@ -0,0 +1,317 @@
+"""
+Tenants: several Dialogflow CX agents served by one deployment.
+
+A webhook call's tenant is resolved from the agent ID in its session path
+(``projects/<p>/locations/<l>/agents/<agent>/sessions/<s>``). Tenants come
+from TENANTS_FILE, a JSON file such as::
+
+    {
+      "tenants": {
+        "acme": {
+          "agents": ["1c7e...", "9f02..."],
+          "apps_script_url": "https://script.google.com/macros/s/.../exec",
+          "resend_api_key": "${ACME_RESEND_API_KEY}",
+          "email_from": "bot@acme.com",
+          "email_to": "sales@acme.com",
+          "responses": {"en": {"consultation_saved": "Thanks, talk soon!"}},
+          "max_concurrency": 20,
+          "max_connections": 10
+        }
+      }
+    }
+
+``agents`` defaults to the tenant's own key (so the key can simply be the
+agent ID), ``${NAME}`` values are read from the environment so secrets stay
+out of the file, and ``responses`` override the default replies per locale.
+Unset email and limit settings fall back to the process-wide ones; the Apps
+Script URL and recipients never do, so one tenant's leads cannot land in
+another's sheet or inbox. An entry named "default" configures the tenant
+used for unlisted agents (otherwise it is built from the environment).
+
+The file is cached in memory and re-read when its modification time changes
+(TENANTS_RELOAD_INTERVAL, or POST /admin/tenants/reload). A file that fails
+to parse is logged and the previous tenants stay in place.
+"""
+import asyncio
+import json
+import os
+import re
+
+from src import logging
+from src.config import (
+    GOOGLE_SHEETS_WEBAPP_URL,
+    RESEND_API_KEY,
+    EMAIL_FROM,
+    EMAIL_TO,
+    TENANTS_FILE,
+    TENANTS_RELOAD_INTERVAL,
+    TENANT_MAX_CONNECTIONS,
+    TENANT_MAX_CONCURRENCY,
+    HTTP_MAX_CONNECTIONS,
+)
+from src.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT_ID = "default"
+
+_AGENT_IN_SESSION = re.compile(r"/agents/([^/]+)/")
+_ENV_REFERENCE = re.compile(r"^\$\{(\w+)\}$")
+
+
+def agent_id(session: str | None) -> str | None:
+    """
+    Extracts the agent ID from a CX session path (None if there is none).
+    """
+    if not session:
+        return None
+    match = _AGENT_IN_SESSION.search(session)
+    return match.group(1) if match else None
+
+
+class Tenant:
+    """
+    One tenant's settings. Instances are immutable; a reload creates new
+    ones (``generation`` tells caches which config they were built from).
+    """
+
+    __slots__ = ("id", "agents", "apps_script_url", "resend_api_key", "email_from", "email_to",
+                 "responses", "max_concurrency", "max_connections", "generation")
+
+    def __init__(self, tenant_id: str, agents: tuple, apps_script_url: str, resend_api_key: str,
+                 email_from: str, email_to: str, responses: dict, max_concurrency: int,
+                 max_connections: int, generation: int):
+        self.id = tenant_id
+        self.agents = agents
+        self.apps_script_url = apps_script_url
+        self.resend_api_key = resend_api_key
+        self.email_from = email_from
+        self.email_to = email_to
+        self.responses = responses
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.generation = generation
+
+    @property
+    def is_default(self) -> bool:
+        return self.id == DEFAULT_TENANT_ID
+
+    def apps_script_configured(self) -> bool:
+        url = self.apps_script_url
+        return bool(url) and "YOUR_ID" not in url and "YOUR_HOOK" not in url
+
+    def summary(self) -> dict:
+        # No secrets: what the admin endpoint shows
+        return {
+            "agents": list(self.agents),
+            "apps_script_configured": self.apps_script_configured(),
+            "email_configured": bool(self.resend_api_key and self.email_from and self.email_to),
+            "response_locales": sorted(self.responses),
+            "max_concurrency": self.max_concurrency,
+            "max_connections": self.max_connections,
+        }
+
+
+def _resolve_env(value):
+    if isinstance(value, str):
+        match = _ENV_REFERENCE.match(value)
+        if match:
+            return os.getenv(match.group(1), "")
+    return value
+
+
+_STR_SETTINGS = ("apps_script_url", "resend_api_key", "email_from", "email_to")
+_INT_SETTINGS = ("max_concurrency", "max_connections")
+
+
+def _checked(tenant_id: str, entry) -> dict:
+    """
+    Resolves ``${ENV}`` references in a tenant entry and checks the type of
+    each setting, so a bad file is rejected (ValueError) instead of failing
+    later or being misread (a string ``agents`` would be split into letters).
+    """
+    if not isinstance(entry, dict):
+        raise ValueError(f"tenant {tenant_id!r} must be an object")
+    entry = {key: _resolve_env(value) for key, value in entry.items()}
+    for name in _STR_SETTINGS:
+        if not isinstance(entry.get(name, ""), str):
+            raise ValueError(f"tenant {tenant_id!r}: {name} must be a string")
+    for name in _INT_SETTINGS:
+        if name not in entry:
+            continue
+        value = entry[name]
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"tenant {tenant_id!r}: {name} must be an integer")
+        try:
+            entry[name] = int(value)
+        except ValueError:
+            raise ValueError(f"tenant {tenant_id!r}: {name} must be an integer") from None
+    agents = entry.get("agents")
+    if agents is not None and (not isinstance(agents, list) or not all(isinstance(agent, str) for agent in agents)):
+        raise ValueError(f"tenant {tenant_id!r}: agents must be a list of agent IDs")
+    responses = entry.get("responses") or {}
+    if not isinstance(responses, dict) or not all(isinstance(messages, dict) for messages in responses.values()):
+        raise ValueError(f"tenant {tenant_id!r}: responses must map locales to {{key: text}}")
+    return entry
+
+
+def _default_tenant(generation: int, entry: dict | None = None, multi_tenant: bool = False) -> Tenant:
+    entry = _checked(DEFAULT_TENANT_ID, entry or {})
+    return Tenant(
+        DEFAULT_TENANT_ID,
+        (),
+        entry.get("apps_script_url", GOOGLE_SHEETS_WEBAPP_URL),
+        entry.get("resend_api_key", RESEND_API_KEY),
+        entry.get("email_from", EMAIL_FROM),
+        entry.get("email_to", EMAIL_TO),
+        entry.get("responses") or {},
+        # Single-tenant deployments keep relying on the global admission limit
+        int(entry.get("max_concurrency", TENANT_MAX_CONCURRENCY if multi_tenant else 0)),
+        int(entry.get("max_connections", HTTP_MAX_CONNECTIONS)),
+        generation,
+    )
+
+
+def _tenant_from_entry(tenant_id: str, entry: dict, generation: int) -> Tenant:
+    entry = _checked(tenant_id, entry)
+    responses = entry.get("responses") or {}
+    return Tenant(
+        tenant_id,
+        tuple(entry.get("agents") or (tenant_id,)),
+        entry.get("apps_script_url", ""),
+        entry.get("resend_api_key", RESEND_API_KEY),
+        entry.get("email_from", EMAIL_FROM),
+        entry.get("email_to", ""),
+        {locale.lower(): messages for locale, messages in responses.items()},
+        int(entry.get("max_concurrency", TENANT_MAX_CONCURRENCY)),
+        int(entry.get("max_connections", TENANT_MAX_CONNECTIONS)),
+        generation,
+    )
+
+
+class TenantRegistry:
+    """
+    Tenants by ID and by agent ID, loaded from ``path`` and swapped as a
+    whole on reload.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.generation = 0
+        self.default = _default_tenant(0)
+        self._tenants = {DEFAULT_TENANT_ID: self.default}
+        self._by_agent: dict = {}
+        self._mtime: float | None = None
+        self.reloads = {"ok": 0, "failed": 0}
+
+    def _parse(self, raw: dict, generation: int) -> tuple:
+        entries = raw.get("tenants") if isinstance(raw, dict) else None
+        if not isinstance(entries, dict):
+            raise ValueError('expected {"tenants": {...}}')
+        default = _default_tenant(generation, entries.get(DEFAULT_TENANT_ID), multi_tenant=True)
+        tenants = {DEFAULT_TENANT_ID: default}
+        by_agent = {}
+        for tenant_id, entry in entries.items():
+            if tenant_id == DEFAULT_TENANT_ID:
+                continue
+            tenant = _tenant_from_entry(tenant_id, entry, generation)
+            tenants[tenant_id] = tenant
+            for agent in tenant.agents:
+                if agent in by_agent:
+                    raise ValueError(f"agent {agent!r} is listed by both {by_agent[agent].id!r} and {tenant_id!r}")
+                by_agent[agent] = tenant
+        return default, tenants, by_agent
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Re-reads the file if it changed (or ``force``). Blocking file I/O:
+        call it through asyncio.to_thread from the event loop.
+
+        Returns:
+            bool: True if a new configuration was loaded
+        """
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if not force and mtime == self._mtime:
+                return False
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+            default, tenants, by_agent = self._parse(raw, self.generation + 1)
+        except (OSError, ValueError, TypeError) as e:
+            self.reloads["failed"] += 1
+            logger.error(f"Could not load tenants from {self.path}, keeping the previous configuration -> {e}")
+            return False
+        # Swap the whole configuration at once; readers never see a mix
+        self.generation += 1
+        self.default, self._tenants, self._by_agent = default, tenants, by_agent
+        self._mtime = mtime
+        self.reloads["ok"] += 1
+        logger.info(f"Loaded {len(tenants) - 1} tenants from {self.path} (generation {self.generation})")
+        return True
+
+    def for_session(self, session: str | None) -> Tenant:
+        """
+        Returns the tenant of the agent in ``session`` (default if unknown).
+        """
+        return self._by_agent.get(agent_id(session), self.default)
+
+    def get(self, tenant_id: str | None) -> Tenant:
+        """
+        Returns a tenant by ID. Unknown IDs (e.g. a tenant removed while its
+        leads wait in the outbox) fall back to the default tenant.
+        """
+        tenant = self._tenants.get(tenant_id or DEFAULT_TENANT_ID)
+        if tenant is None:
+            logger.warning(f"Unknown tenant {tenant_id!r}, using the default tenant.")
+            return self.default
+        return tenant
+
+    def all(self) -> list:
+        return list(self._tenants.values())
+
+
+# Process-wide registry
+tenants = TenantRegistry(TENANTS_FILE)
+
+_reloader: asyncio.Task | None = None
+
+
+async def _watch_tenants_file():
+    while True:
+        await asyncio.sleep(TENANTS_RELOAD_INTERVAL)
+        try:
+            await asyncio.to_thread(tenants.reload)
+        except Exception as e:
+            # Keep watching: the next change may fix the file
+            logger.error(f"Tenants reload error: {e}")
+
+
+async def start_tenants():
+    """
+    Loads TENANTS_FILE and starts watching it for changes. Called from the
+    app lifespan; without TENANTS_FILE everything is the default tenant.
+    """
+    global _reloader
+    if not TENANTS_FILE:
+        return
+    await asyncio.to_thread(tenants.reload)
+    if _reloader is None or _reloader.done():
+        _reloader = asyncio.create_task(_watch_tenants_file(), name="tenants-reloader")
+
+
+async def stop_tenants():
+    global _reloader
+    if _reloader is not None:
+        _reloader.cancel()
+        await asyncio.gather(_reloader, return_exceptions=True)
+        _reloader = None
+
+
+@register_collector
+def _collect_tenant_metrics():
+    yield ("tenants_configured", "gauge", "Tenants loaded from TENANTS_FILE (besides default).", {}, len(tenants.all()) - 1)
+    yield ("tenants_config_generation", "gauge", "Tenant configuration generation (bumped on each reload).", {}, tenants.generation)
+    for outcome, count in tenants.reloads.items():
+        yield ("tenants_reloads_total", "counter", "Tenant file loads by outcome.", {"outcome": outcome}, count)
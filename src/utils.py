@@ -1,51 +1,371 @@
-import requests
+import asyncio
+import hashlib
+import time
+
+import httpx
 from src.config import (
-    GOOGLE_SHEETS_WEBAPP_URL,
     EMAIL_NOTIFICATIONS_ENABLED,
-    RESEND_API_KEY,
-    EMAIL_FROM,
-    EMAIL_TO
+    RESEND_API_URL,
+    RESEND_BATCH_API_URL,
+    HTTP_TIMEOUT,
+    LEAD_BATCH_ENABLED,
+    LEAD_BATCH_MAX_SIZE,
+    LEAD_BATCH_MAX_WAIT_MS,
 )
+from src.batching import MicroBatcher
+from src.circuit_breaker import CircuitOpenError, get_breaker
+from src.deadline import DeadlineExceeded, LatencyTracker, call_with_deadline, current_deadline
+from src import logging
+from src.http_client import APPS_SCRIPT_REDIRECT_ORIGIN, get_http_client
+from src.metrics import observe_downstream, register_collector
+from src.tenants import tenants
+
+logger = logging.getLogger(__name__)
+
+# Resend answers worth retrying among the 4xx: timeout, conflict, rate limit
+_RETRYABLE_CLIENT_ERRORS = {408, 409, 429}
+
+
+class PermanentSendError(Exception):
+    """
+    An email that no retry can send: Resend is not configured for the
+    tenant, or Resend rejected the request itself (a 4xx).
+    """
+
+
+def _lead_log_fields(lead_data):
+    # Only what is needed to trace a lead; email/name are masked by the formatter
+    return {
+        "lead_id": lead_data.get("lead_id"),
+        "email": lead_data.get("email"),
+        "name": lead_data.get("name"),
+        "language": lead_data.get("language"),
+    }
+
+
+# Observed downstream latencies (drive adaptive timeouts and hedging)
+APPS_SCRIPT_LATENCY = LatencyTracker("apps_script")
+RESEND_LATENCY = LatencyTracker("resend")
+
+
+def apps_script_configured() -> bool:
+    return tenants.default.apps_script_configured()
+
+
+def downstream_urls() -> dict:
+    """
+    URLs of the downstream services the default tenant is configured to
+    call, by dependency name (apps_script, resend).
+    """
+    default = tenants.default
+    urls = {"apps_script": default.apps_script_url} if default.apps_script_configured() else {}
+    if EMAIL_NOTIFICATIONS_ENABLED and default.resend_api_key:
+        urls["resend"] = RESEND_API_URL
+    return urls
+
+
+def prewarm_targets() -> list:
+    """
+    (tenant, url) pairs to connect to before the first lead, besides
+    downstream_urls() (probed on the default pool): every tenant pool's
+    Apps Script and Resend hosts, and the host Apps Script redirects to.
+    """
+    targets = []
+    for tenant in tenants.all():
+        if tenant.apps_script_configured():
+            targets.append((tenant, APPS_SCRIPT_REDIRECT_ORIGIN))
+            if not tenant.is_default:
+                targets.append((tenant, tenant.apps_script_url))
+        if not tenant.is_default and EMAIL_NOTIFICATIONS_ENABLED and tenant.resend_api_key:
+            targets.append((tenant, RESEND_API_URL))
+    return targets
+
 
-def send_consultation_lead_to_webhook(lead_data):
+async def send_consultation_lead_to_webhook(lead_data):
     """
-    Sends consultation lead data to Google Sheets via Zapier webhook.
+    Sends consultation lead data to Google Sheets via the Apps Script web app.
+    
+    Uses the shared pooled async HTTP client, so the event loop keeps serving
+    other webhook calls while Apps Script is processing the row. With
+    LEAD_BATCH_ENABLED, leads arriving close together are coalesced into one
+    bulk call; each caller still gets the result for its own lead.
+    
+    The lead's ``tenant`` decides the Apps Script URL, connection pool,
+    circuit breaker and batch (src/tenants.py).
     
     Args:
         lead_data (dict): Contains name, email, objective, processes_to_automate, 
-                         current_tools, main_challenge, language
+                         current_tools, main_challenge, language, tenant
     
     Returns:
         bool: True if successful, False otherwise
     """
-    print(f"Debug: Sending consultation lead -> {lead_data}")
+    logger.debug("Sending consultation lead", extra={"fields": _lead_log_fields(lead_data)})
+    tenant = tenants.get(lead_data.get("tenant"))
     
+    if not tenant.apps_script_configured():
+        logger.warning(
+            "GOOGLE_SHEETS_WEBHOOK_URL is not configured. Lead not sent.",
+            extra={"fields": {**_lead_log_fields(lead_data), "tenant": tenant.id}},
+        )
+        return True  # Graceful fallback
+    
+    if get_breaker("apps_script", tenant.id).rejecting():
+        # Fail fast; the caller replies with its fallback or the outbox retries later
+        logger.warning("Apps Script circuit is open, lead not sent.", extra={"fields": {"lead_id": lead_data.get("lead_id")}})
+        return False
+    
+    if LEAD_BATCH_ENABLED:
+        deadline = current_deadline()
+        batcher = get_lead_batcher(tenant)
+        submission = asyncio.ensure_future(batcher.submit(lead_data))
+        try:
+            if deadline is None:
+                return await submission
+            return await asyncio.wait_for(asyncio.shield(submission), max(0.0, deadline.remaining()))
+        except asyncio.TimeoutError:
+            if not batcher.withdraw(lead_data):
+                # Already sent in a batch: its result decides whether the
+                # lead is deferred, so the caller must not defer it as well
+                _batched_leads[lead_data.get("lead_id")] = submission
+                submission.add_done_callback(lambda done: _batched_lead_settled(lead_data, done))
+            logger.error("Request deadline reached while waiting for the lead batch.")
+            return False
+        except Exception as e:
+            logger.error(f"Batched lead delivery failed -> {e}")
+            return False
+    
+    return await _send_single_lead(lead_data, tenant)
+
+
+async def _instrumented_post(dependency, url, timeout, tenant=None, **kwargs):
+    """
+    POSTs with the shared client (or ``tenant``'s own pool) and records the
+    attempt's latency in the downstream histogram, labeled ok / timeout /
+    http_error / cancelled / error. Non-2xx answers raise httpx.HTTPStatusError.
+    """
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        if "YOUR_ID" in GOOGLE_SHEETS_WEBAPP_URL or "YOUR_HOOK" in GOOGLE_SHEETS_WEBAPP_URL:
-            print("WARNING: GOOGLE_SHEETS_WEBHOOK_URL is not configured. Logging data locally.")
-            print(f"Lead Data: {lead_data}")
-            return True  # Graceful fallback
-        
-        response = requests.post(GOOGLE_SHEETS_WEBAPP_URL, json=lead_data, timeout=10)
+        response = await get_http_client(tenant).post(url, timeout=timeout, **kwargs)
         response.raise_for_status()
-        print(f"SUCCESS: Consultation lead sent. Response: {response.text}")
+        outcome = "ok"
+        return response
+    except httpx.TimeoutException:
+        outcome = "timeout"
+        raise
+    except httpx.HTTPStatusError:
+        outcome = "http_error"
+        raise
+    except asyncio.CancelledError:
+        # Deadline reached or a hedged attempt won
+        outcome = "cancelled"
+        raise
+    finally:
+        observe_downstream(dependency, outcome, time.perf_counter() - started)
+
+
+async def _post_to_apps_script(payload, timeout, tenant):
+    return await _instrumented_post("apps_script", tenant.apps_script_url, timeout, tenant, json=payload)
+
+
+async def _call_apps_script(payload, tenant):
+    # Timeout from the request's remaining budget and observed latency;
+    # hedged when HEDGE_REQUESTS_ENABLED and the call passes its p95
+    return await get_breaker("apps_script", tenant.id).call(lambda: call_with_deadline(
+        lambda timeout: _post_to_apps_script(payload, timeout, tenant),
+        APPS_SCRIPT_LATENCY,
+        HTTP_TIMEOUT,
+    ))
+
+
+async def _send_single_lead(lead_data, tenant):
+    try:
+        await _call_apps_script(lead_data, tenant)
+        logger.info("Consultation lead sent.", extra={"fields": {"lead_id": lead_data.get("lead_id")}})
         return True
-    except requests.exceptions.Timeout:
-        print("ERROR: Request timeout while sending consultation lead.")
+    except CircuitOpenError:
+        logger.warning("Apps Script circuit is open, lead not sent.", extra={"fields": {"lead_id": lead_data.get("lead_id")}})
         return False
-    except requests.exceptions.RequestException as e:
-        print(f"ERROR: Failed to send consultation lead -> {e}")
+    except (httpx.TimeoutException, DeadlineExceeded):
+        logger.error("Request timeout while sending consultation lead.", extra={"fields": {"lead_id": lead_data.get("lead_id")}})
+        return False
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to send consultation lead -> {e}", extra={"fields": {"lead_id": lead_data.get("lead_id")}})
         return False
     except Exception as e:
-        print(f"ERROR: Unexpected error -> {e}")
+        logger.exception(f"Unexpected error while sending consultation lead -> {e}")
         return False
 
 
-def send_email_notification(lead_data):
+async def _send_lead_batch(leads, tenant):
+    """
+    Sends several leads of one tenant to Apps Script in one call as
+    {"rows": [...]}.
+    
+    If the web app answers with {"results": [...]} (one entry per row), each
+    lead gets its own result; otherwise the HTTP status applies to all rows.
+    """
+    if len(leads) == 1:
+        return [await _send_single_lead(leads[0], tenant)]
+    
+    try:
+        # Same deadline, adaptive timeout and hedging as a single lead (the
+        # budget is the one of the request that started the flush)
+        response = await _call_apps_script({"rows": leads}, tenant)
+    except CircuitOpenError:
+        logger.warning(f"Apps Script circuit is open, batch of {len(leads)} leads not sent.")
+        return [False] * len(leads)
+    except (httpx.TimeoutException, DeadlineExceeded):
+        logger.error(f"Request timeout while sending batch of {len(leads)} leads.")
+        return [False] * len(leads)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to send batch of {len(leads)} leads -> {e}")
+        return [False] * len(leads)
+    
+    logger.info(f"Batch of {len(leads)} consultation leads sent.")
+    try:
+        results = response.json().get("results")
+    except (ValueError, AttributeError):
+        results = None
+    if isinstance(results, list) and len(results) == len(leads):
+        return [
+            bool(result.get("success", True)) if isinstance(result, dict) else bool(result)
+            for result in results
+        ]
+    return [True] * len(leads)
+
+
+# One batcher per tenant: a batch goes to a single Apps Script URL
+_lead_batchers: dict = {}
+# lead_id -> batch submission whose caller stopped waiting after it was sent
+_batched_leads: dict = {}
+
+
+def lead_owned_by_batch(lead_data) -> bool:
+    """
+    True while ``lead_data`` is in a batch its caller stopped waiting for;
+    the batch defers it to the outbox itself if it fails.
+    """
+    return lead_data.get("lead_id") in _batched_leads
+
+
+def _batched_lead_settled(lead_data, submission):
+    _batched_leads.pop(lead_data.get("lead_id"), None)
+    if not submission.cancelled() and submission.exception() is None and submission.result():
+        return
+    # Imported here: the outbox delivers through this module
+    from src.outbox import enqueue_lead
+    logger.info("Batched lead failed after its caller gave up, deferring it to the outbox.",
+                extra={"fields": {"lead_id": lead_data.get("lead_id")}})
+    asyncio.ensure_future(enqueue_lead(lead_data))
+
+
+def get_lead_batcher(tenant) -> MicroBatcher:
+    """
+    Returns ``tenant``'s lead batcher, creating it on first use (and again
+    after a tenant reload, so a changed URL is picked up).
+    """
+    entry = _lead_batchers.get(tenant.id)
+    if entry is not None and entry[0] is tenant:
+        return entry[1]
+    batcher = MicroBatcher(
+        lambda leads: _send_lead_batch(leads, tenant),
+        max_batch_size=LEAD_BATCH_MAX_SIZE,
+        max_wait=LEAD_BATCH_MAX_WAIT_MS / 1000,
+        name=f"apps-script-leads-{tenant.id}",
+    )
+    _lead_batchers[tenant.id] = (tenant, batcher)
+    if entry is not None:
+        # Its pending batch is flushed with the previous settings
+        asyncio.ensure_future(entry[1].close())
+    return batcher
+
+
+async def close_lead_batcher():
+    """
+    Flushes pending leads in the batchers (called on shutdown).
+    """
+    batchers = [batcher for _, batcher in _lead_batchers.values()]
+    _lead_batchers.clear()
+    for batcher in batchers:
+        await batcher.close()
+
+
+def _require_resend(tenant):
+    if not tenant.resend_api_key or not tenant.email_from or not tenant.email_to:
+        raise PermanentSendError(
+            f"Resend configuration incomplete for tenant {tenant.id!r}. "
+            "Required: RESEND_API_KEY, EMAIL_FROM, EMAIL_TO"
+        )
+
+
+def _resend_email(message, tenant):
+    return {
+        "from": tenant.email_from,
+        "to": [email.strip() for email in tenant.email_to.split(",")],  # Support multiple recipients
+        "subject": message["subject"],
+        "html": message["html"],
+        "text": message["text"],
+    }
+
+
+def _resend_idempotency_key(kind, leads):
+    # Resend ignores a repeated key for 24h, so a retried send never mails twice
+    lead_ids = [lead_data.get("lead_id") for lead_data in leads]
+    if not all(lead_ids):
+        return None
+    return f"{kind}-{hashlib.sha256(','.join(lead_ids).encode()).hexdigest()[:32]}"
+
+
+async def _post_to_resend(url, build_payload, idempotency_key, description, log_fields, tenant):
+    """
+    POSTs the payload from ``build_payload()`` to Resend with ``tenant``'s
+    key, pool and circuit breaker, and a timeout adapted to observed Resend
+    latency. Returns True on success; failures (rendering included) are
+    logged. Raises PermanentSendError when Resend rejects the request (4xx).
+    """
+    headers = {
+        "Authorization": f"Bearer {tenant.resend_api_key}",
+        "Content-Type": "application/json"
+    }
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    try:
+        payload = build_payload()
+        await get_breaker("resend", tenant.id).call(lambda: call_with_deadline(
+            lambda timeout: _instrumented_post("resend", url, timeout, tenant, headers=headers, json=payload),
+            RESEND_LATENCY,
+            HTTP_TIMEOUT,
+            hedge=False,  # never risk sending the same email twice
+        ))
+        logger.info(f"{description} sent via Resend.", extra={"fields": {**log_fields, "tenant": tenant.id}})
+        return True
+
+    except CircuitOpenError:
+        logger.warning(f"Resend circuit is open, {description.lower()} not sent.")
+        return False
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code
+        logger.error(f"Resend API error - {status}", extra={"fields": {"response": e.response.text[:500]}})
+        if 400 <= status < 500 and status not in _RETRYABLE_CLIENT_ERRORS:
+            raise PermanentSendError(f"Resend rejected the {description.lower()} ({status})") from e
+        return False
+    except (httpx.TimeoutException, DeadlineExceeded):
+        logger.error("Request timeout while sending email via Resend")
+        return False
+    except Exception as e:
+        logger.exception(f"Failed to send {description.lower()} - {str(e)}")
+        return False
+
+
+async def send_email_notification(lead_data):
     """
     Sends an email notification via Resend API when a new consultation lead is received.
     
     Resend is a modern email API that works perfectly on Railway!
+    Uses the shared pooled async HTTP client; normally called from the
+    notification worker pool (src/notifications.py), not the request path.
     See: https://resend.com
     
     Args:
@@ -53,141 +373,104 @@ def send_email_notification(lead_data):
     
     Returns:
         bool: True if email sent successfully, False otherwise
+
+    Raises:
+        PermanentSendError: if retrying cannot help (see the class)
     """
     if not EMAIL_NOTIFICATIONS_ENABLED:
-        print("ℹ️ Email notifications are disabled (set EMAIL_NOTIFICATIONS_ENABLED=true to enable).")
+        logger.debug("Email notifications are disabled (set EMAIL_NOTIFICATIONS_ENABLED=true to enable).")
         return True
     
-    if not RESEND_API_KEY or not EMAIL_FROM or not EMAIL_TO:
-        print("⚠️ WARNING: Resend configuration incomplete in .env file. Skipping email notification.")
-        print("   Required: RESEND_API_KEY, EMAIL_FROM, EMAIL_TO")
-        return False
+    tenant = tenants.get(lead_data.get("tenant"))
+    _require_resend(tenant)
     
-    try:
-        print(f"📧 Sending email notification via Resend to {EMAIL_TO}...")
-        
-        # Create HTML email body
-        html_body = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: 'Segoe UI', Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 0; }}
-                .container {{ max-width: 650px; margin: 30px auto; background-color: white; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px 20px; text-align: center; }}
-                .header h1 {{ margin: 0; font-size: 28px; font-weight: 600; }}
-                .header p {{ margin: 10px 0 0 0; font-size: 14px; opacity: 0.9; }}
-                .content {{ padding: 30px; background-color: #ffffff; }}
-                .lead-info {{ background-color: #f8f9fa; border-radius: 8px; padding: 20px; margin: 20px 0; }}
-                .field {{ margin: 18px 0; padding: 15px; background-color: white; border-left: 4px solid #667eea; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.05); }}
-                .field-label {{ font-weight: 600; color: #2d3748; font-size: 13px; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 8px; }}
-                .field-value {{ color: #4a5568; font-size: 15px; line-height: 1.6; }}
-                .highlight {{ background-color: #fef3c7; padding: 2px 6px; border-radius: 3px; }}
-                .footer {{ background-color: #f7fafc; padding: 25px; text-align: center; border-top: 1px solid #e2e8f0; }}
-                .footer p {{ margin: 5px 0; color: #718096; font-size: 13px; }}
-                .cta-button {{ display: inline-block; margin: 20px 0; padding: 12px 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-decoration: none; border-radius: 6px; font-weight: 600; }}
-                .stats {{ display: flex; justify-content: space-around; margin: 20px 0; }}
-                .stat-box {{ text-align: center; padding: 15px; background: white; border-radius: 8px; flex: 1; margin: 0 5px; }}
-                .stat-number {{ font-size: 24px; font-weight: bold; color: #667eea; }}
-                .stat-label {{ font-size: 12px; color: #718096; margin-top: 5px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎯 New Consultation Lead!</h1>
-                    <p>The Smart AI Tech - Automation Consultancy</p>
-                </div>
-                
-                <div class="content">
-                    <div class="lead-info">
-                        <h2 style="margin-top: 0; color: #2d3748; font-size: 20px;">Lead Information</h2>
-                        
-                        <div class="field">
-                            <div class="field-label">👤 Contact Name</div>
-                            <div class="field-value"><strong>{lead_data.get('name', 'N/A')}</strong></div>
-                        </div>
-                        
-                        <div class="field">
-                            <div class="field-label">📧 Email Address</div>
-                            <div class="field-value"><a href="mailto:{lead_data.get('email', '')}" style="color: #667eea; text-decoration: none;">{lead_data.get('email', 'N/A')}</a></div>
-                        </div>
-                        
-                        <div class="field">
-                            <div class="field-label">🎯 Business Objective</div>
-                            <div class="field-value"><span class="highlight">{lead_data.get('objective', 'N/A')}</span></div>
-                        </div>
-                        
-                        <div class="field">
-                            <div class="field-label">⚙️ Processes to Automate</div>
-                            <div class="field-value">{lead_data.get('processes_to_automate', 'N/A')}</div>
-                        </div>
-                        
-                        <div class="field">
-                            <div class="field-label">🔧 Current Tools & Systems</div>
-                            <div class="field-value">{lead_data.get('current_tools', 'N/A')}</div>
-                        </div>
-                        
-                        <div class="field">
-                            <div class="field-label">⚡ Main Challenge</div>
-                            <div class="field-value"><strong style="color: #e53e3e;">{lead_data.get('main_challenge', 'N/A')}</strong></div>
-                        </div>
-                        
-                        <div class="stats">
-                            <div class="stat-box">
-                                <div class="stat-number">🌐</div>
-                                <div class="stat-label">Language: {lead_data.get('language', 'en').upper()}</div>
-                            </div>
-                            <div class="stat-box">
-                                <div class="stat-number">🕒</div>
-                                <div class="stat-label">{lead_data.get('timestamp', 'N/A').split('T')[0]}</div>
-                            </div>
-                        </div>
-                    </div>
-                    
-                    <p style="text-align: center; color: #4a5568; margin: 25px 0;">
-                        <strong>Next Step:</strong> Review the lead details and prepare a custom automation proposal.
-                    </p>
-                </div>
-                
-                <div class="footer">
-                    <p style="margin-bottom: 15px;"><strong>✅ Lead automatically saved to Google Sheet</strong></p>
-                    <a href="https://docs.google.com/spreadsheets/d/1gWUilIZBU5IQ4cGtNpfcQx8gaa8uf4fCAP7i5L-uviQ/edit?gid=0#gid=0" class="cta-button" style="color: white;">View All Leads →</a>
-                    <p style="margin-top: 20px;">This is an automated notification from The Smart AI Tech consultation bot.</p>
-                    <p>© 2026 The Smart AI Tech. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Send via Resend API
-        response = requests.post(
-            "https://api.resend.com/emails",
-            headers={
-                "Authorization": f"Bearer {RESEND_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "from": EMAIL_FROM,
-                "to": [email.strip() for email in EMAIL_TO.split(",")],  # Support multiple recipients
-                "subject": f"🔔 New Lead: {lead_data.get('name', 'Unknown')} - The Smart AI Tech",
-                "html": html_body
-            },
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            print(f"✅ Email sent successfully via Resend to {EMAIL_TO}")
-            print(f"   Subject: New Consultation Lead: {lead_data.get('name', 'Unknown')}")
-            return True
-        else:
-            print(f"❌ ERROR: Resend API error - {response.status_code}")
-            print(f"   Response: {response.text}")
-            return False
-            
-    except requests.exceptions.Timeout:
-        print("❌ ERROR: Request timeout while sending email via Resend")
-        return False
-    except Exception as e:
-        print(f"❌ ERROR: Failed to send email notification - {str(e)}")
-        return False
+    # Imported here: the template module is only needed when emails are sent
+    from src.email_templates import render_lead_email
+    
+    # Render subject, HTML and plain-text parts from the precompiled templates
+    return await _post_to_resend(
+        RESEND_API_URL,
+        lambda: _resend_email(render_lead_email(lead_data), tenant),
+        _resend_idempotency_key("lead", [lead_data]),
+        "Email notification",
+        {"lead_id": lead_data.get("lead_id")},
+        tenant,
+    )
+
+
+async def send_email_batch(leads):
+    """
+    Sends one notification email per lead in a single Resend batch call
+    (POST /emails/batch, at most 100 emails).
+    
+    Args:
+        leads (list): Lead dicts, all of the same tenant
+    
+    Returns:
+        bool: True if the batch was accepted, False otherwise
+
+    Raises:
+        PermanentSendError: if retrying cannot help
+    """
+    if not EMAIL_NOTIFICATIONS_ENABLED:
+        return True
+    tenant = tenants.get(leads[0].get("tenant"))
+    _require_resend(tenant)
+    
+    from src.email_templates import render_lead_email
+    
+    return await _post_to_resend(
+        RESEND_BATCH_API_URL,
+        lambda: [_resend_email(render_lead_email(lead_data), tenant) for lead_data in leads],
+        _resend_idempotency_key("batch", leads),
+        "Email notification batch",
+        {"leads": len(leads)},
+        tenant,
+    )
+
+
+async def send_digest_email(leads):
+    """
+    Sends one summary email listing all ``leads`` in a table.
+    
+    Args:
+        leads (list): Lead dicts, all of the same tenant
+    
+    Returns:
+        bool: True if email sent successfully, False otherwise
+
+    Raises:
+        PermanentSendError: if retrying cannot help
+    """
+    if not EMAIL_NOTIFICATIONS_ENABLED:
+        return True
+    tenant = tenants.get(leads[0].get("tenant"))
+    _require_resend(tenant)
+    
+    from src.email_templates import render_digest_email
+    
+    return await _post_to_resend(
+        RESEND_API_URL,
+        lambda: _resend_email(render_digest_email(leads), tenant),
+        _resend_idempotency_key("digest", leads),
+        "Lead digest email",
+        {"leads": len(leads)},
+        tenant,
+    )
+
+
+@register_collector
+def _collect_downstream_metrics():
+    for tracker in (APPS_SCRIPT_LATENCY, RESEND_LATENCY):
+        stats = tracker.stats()
+        for quantile in ("p50", "p95", "p99"):
+            yield ("downstream_latency_window_seconds", "gauge",
+                   "Recent downstream latency percentiles (adaptive timeout / hedging input).",
+                   {"dependency": tracker.name, "quantile": quantile}, stats[quantile])
+    for tenant_id, (_, batcher) in list(_lead_batchers.items()):
+        stats = batcher.stats()
+        labels = {"tenant": tenant_id}
+        yield ("lead_batch_pending", "gauge", "Leads waiting in the current Apps Script batch.", labels, stats["pending"])
+        yield ("lead_batches_sent_total", "counter", "Apps Script batches sent.", labels, stats["batches_sent"])
+        yield ("lead_batch_items_sent_total", "counter", "Leads sent in Apps Script batches.", labels, stats["items_sent"])
+        yield ("lead_batch_flush_latency_max_seconds", "gauge", "Longest batch flush latency.", labels, stats["max_flush_latency_seconds"])
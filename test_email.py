@@ -2,6 +2,7 @@
 Complete test including email notification
 """
 import asyncio
+import json
 from src.actions.save_lead import save_consultation_lead
 from src.schemas import WebhookRequest, FulfillmentInfo, SessionInfo
 
@@ -32,7 +33,8 @@ async def test_with_email():
     response = await save_consultation_lead(webhook_request)
     
     print("\n2. Webhook response:")
-    print(f"   Message: {response.fulfillmentResponse.messages[0].text.text[0]}")
+    body = json.loads(response.body)
+    print(f"   Message: {body['fulfillmentResponse']['messages'][0]['text']['text'][0]}")
     
     print("\n" + "=" * 60)
     print("✅ TEST COMPLETE!")
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+# Settings are read at import time: keep every file the app writes in a
+# scratch directory and use only local sinks (no Apps Script or Resend calls)
+_DATA_DIR = tempfile.mkdtemp(prefix="webhook-tests-")
+for name, value in {
+    "LEAD_SINKS": "ndjson",
+    "LEAD_NDJSON_PATH": os.path.join(_DATA_DIR, "leads.ndjson"),
+    "LEAD_SQLITE_PATH": os.path.join(_DATA_DIR, "leads.db"),
+    "LEAD_OUTBOX_ENABLED": "false",
+    "LEAD_OUTBOX_PATH": os.path.join(_DATA_DIR, "lead_outbox.db"),
+    "SHUTDOWN_SPILL_PATH": os.path.join(_DATA_DIR, "shutdown_spill.ndjson"),
+    "PROFILE_DIR": os.path.join(_DATA_DIR, "profiles"),
+    "EMAIL_NOTIFICATIONS_ENABLED": "false",
+    "HTTP_PREWARM_ENABLED": "false",
+    "LOOP_STALL_DETECTOR_ENABLED": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from src.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def webhook_body(tag: str, session: str = "projects/p/locations/l/agents/a/sessions/s1",
+                 response_id: str | None = None, parameters: dict | None = None) -> dict:
+    body = {
+        "fulfillmentInfo": {"tag": tag},
+        "languageCode": "en",
+        "sessionInfo": {"session": session, "parameters": parameters or {}},
+    }
+    if response_id is not None:
+        body["detectIntentResponseId"] = response_id
+    return body
@@ -0,0 +1,16 @@
+from src import outbox
+from src.config import RESPONSES
+from src.shutdown import begin_drain
+
+from conftest import webhook_body
+
+
+def test_shed_lead_call_keeps_the_lead(client):
+    begin_drain()
+    parameters = {"user_name": "Ines", "user_email": "ines@example.com"}
+    response = client.post("/webhook", json=webhook_body(
+        "save_consultation_lead", session="projects/p/locations/l/agents/a/sessions/shed", parameters=parameters))
+    reply = response.json()["fulfillmentResponse"]["messages"][0]["text"]["text"][0]
+    assert reply == RESPONSES["en"]["consultation_error"]
+    payloads = [payload for (payload,) in outbox._execute("SELECT payload FROM lead_outbox")]
+    assert any("ines@example.com" in payload for payload in payloads)
@@ -0,0 +1,85 @@
+import asyncio
+
+from src import utils
+from src.batching import MicroBatcher
+from src.deadline import start_deadline
+
+
+def test_item_withdrawn_when_caller_gives_up_before_flush():
+    sent = []
+
+    async def send_batch(items):
+        sent.extend(items)
+        return [True] * len(items)
+
+    async def scenario():
+        batcher = MicroBatcher(send_batch, max_batch_size=10, max_wait=0.2)
+        try:
+            await asyncio.wait_for(batcher.submit("late"), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        assert await batcher.submit("on_time") is True
+        await batcher.close()
+
+    asyncio.run(scenario())
+    assert sent == ["on_time"]
+
+
+def test_lead_sent_in_batch_is_not_deferred_twice(monkeypatch):
+    deferred = []
+
+    async def enqueue_lead(lead_data):
+        deferred.append(lead_data["lead_id"])
+
+    monkeypatch.setattr(utils, "LEAD_BATCH_ENABLED", True)
+    # Flush at once, so the deadline passes while the batch is in flight
+    monkeypatch.setattr(utils, "LEAD_BATCH_MAX_WAIT_MS", 0)
+    monkeypatch.setattr("src.outbox.enqueue_lead", enqueue_lead)
+    utils._lead_batchers.clear()
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def failing_batch(leads, tenant):
+            await gate.wait()
+            return [False] * len(leads)
+
+        monkeypatch.setattr(utils, "_send_lead_batch", failing_batch)
+        lead = {"lead_id": "lead-1", "email": "a@example.com"}
+        start_deadline(0.01)
+        assert await utils.send_consultation_lead_to_webhook(lead) is False
+        # The sink must not defer it: the batch still owns the lead
+        assert utils.lead_owned_by_batch(lead)
+
+        gate.set()
+        await utils.close_lead_batcher()
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    # Deferred once, by the batch, after it failed
+    assert deferred == ["lead-1"]
+    assert not utils._batched_leads
+
+
+def test_batch_send_goes_through_the_deadline_wrapper(monkeypatch):
+    timeouts = []
+
+    class Response:
+        def json(self):
+            return {"results": [{"success": True}, {"success": False}]}
+
+    async def post(payload, timeout, tenant):
+        timeouts.append(timeout)
+        return Response()
+
+    monkeypatch.setattr(utils, "_post_to_apps_script", post)
+    samples = len(utils.APPS_SCRIPT_LATENCY._samples)
+
+    async def scenario():
+        start_deadline(budget=1.0)
+        return await utils._send_lead_batch([{"lead_id": "a"}, {"lead_id": "b"}], utils.tenants.default)
+
+    assert asyncio.run(scenario()) == [True, False]
+    # Bounded by the request's budget, not the fixed HTTP_TIMEOUT
+    assert timeouts and timeouts[0] <= 1.0
+    assert len(utils.APPS_SCRIPT_LATENCY._samples) == samples + 1
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from src.circuit_breaker import OPEN, CircuitBreaker
+from src.deadline import DeadlineExceeded, LatencyTracker, call_with_deadline, start_deadline
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker("test", failure_rate_threshold=0.5, window=60, min_calls=2, cooldown=60, enabled=True)
+
+
+def test_calls_without_budget_do_not_open_the_breaker():
+    breaker = _breaker()
+
+    async def scenario():
+        start_deadline(0.0)
+        for _ in range(5):
+            with pytest.raises(DeadlineExceeded):
+                await breaker.call(lambda: call_with_deadline(asyncio.sleep, LatencyTracker("test"), 1.0))
+
+    asyncio.run(scenario())
+    assert breaker.state != OPEN
+
+
+def test_calls_that_time_out_open_the_breaker():
+    breaker = _breaker()
+
+    async def scenario():
+        start_deadline(0.05)
+        for _ in range(2):
+            with pytest.raises(DeadlineExceeded):
+                await breaker.call(lambda: call_with_deadline(asyncio.sleep, LatencyTracker("test"), 10.0))
+            start_deadline(0.05)
+
+    asyncio.run(scenario())
+    assert breaker.state == OPEN
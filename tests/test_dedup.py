@@ -0,0 +1,106 @@
+import asyncio
+
+from src.dedup import DUPLICATE, NEW, UPDATE, LeadDedupIndex
+
+
+def _lead() -> dict:
+    return {"email": "ada@example.com", "name": "Ada", "objective": "Automate invoicing"}
+
+
+def test_concurrent_repeat_waits_for_the_original():
+    async def scenario():
+        index = LeadDedupIndex(max_entries=10, window=60)
+        original, repeat = _lead(), _lead()
+        assert index.check(original) == NEW
+        assert index.check(repeat) == DUPLICATE
+        waiting = asyncio.ensure_future(index.original_saved(repeat))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        index.saved(original)
+        assert await waiting is True
+
+    asyncio.run(scenario())
+
+
+def test_repeat_takes_over_when_the_original_is_not_saved():
+    async def scenario():
+        index = LeadDedupIndex(max_entries=10, window=60)
+        original, repeat = _lead(), _lead()
+        index.check(original)
+        assert index.check(repeat) == DUPLICATE
+        waiting = asyncio.ensure_future(index.original_saved(repeat))
+        await asyncio.sleep(0)
+        index.forget(original)
+        assert await waiting is False
+        assert index.check(repeat) == NEW
+
+    asyncio.run(scenario())
+
+
+
+
+
+def _changed_lead() -> dict:
+    return {**_lead(), "objective": "Automate payroll"}
+
+
+def test_failed_update_is_rolled_back_for_the_retry():
+    async def scenario():
+        index = LeadDedupIndex(max_entries=10, window=60)
+        original = _lead()
+        index.check(original)
+        index.saved(original)
+        update = _changed_lead()
+        assert index.check(update) == UPDATE
+        index.forget(update)
+        assert index.check(_changed_lead()) == UPDATE
+        assert index.check(_lead()) == UPDATE
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_of_an_update_waits_for_the_update():
+    async def scenario():
+        index = LeadDedupIndex(max_entries=10, window=60)
+        original = _lead()
+        index.check(original)
+        index.saved(original)
+        update, repeat = _changed_lead(), _changed_lead()
+        assert index.check(update) == UPDATE
+        assert index.check(repeat) == DUPLICATE
+        waiting = asyncio.ensure_future(index.original_saved(repeat))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        index.forget(update)
+        assert await waiting is False
+        assert index.check(repeat) == UPDATE
+
+    asyncio.run(scenario())
+
+
+def test_repeat_is_not_left_waiting_on_a_cancelled_save(monkeypatch):
+    from src.actions import save_lead
+    from src.dedup import lead_index
+    from src.schemas import WebhookRequest
+    from src.tenants import tenants
+
+    from conftest import webhook_body
+
+    async def hang(lead_data):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(save_lead, "write_lead", hang)
+    body = webhook_body("save_consultation_lead", parameters={"user_name": "Cy", "user_email": "cy@example.com"})
+    request = WebhookRequest(**body)
+    repeat = {"name": "Cy", "email": "cy@example.com", "tenant": tenants.for_session(request.sessionInfo.session).id}
+
+    async def scenario():
+        saving = asyncio.ensure_future(save_lead.save_consultation_lead(request))
+        await asyncio.sleep(0)
+        assert lead_index.check(repeat) == DUPLICATE
+        waiting = asyncio.ensure_future(lead_index.original_saved(repeat))
+        await asyncio.sleep(0)
+        saving.cancel()
+        assert await asyncio.wait_for(waiting, 1) is False
+
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.main import register_webhook_route
+
+from conftest import webhook_body
+
+
+@pytest.fixture
+def fast_client():
+    app = FastAPI()
+    register_webhook_route(app, fast_path=True)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.mark.parametrize("body", [
+    b'{"fulfillmentInfo": {"tag": "save_lead"}, "sessionInfo": "x"}',
+    b'{"fulfillmentInfo": {"tag": "save_lead"}, "sessionInfo": {"session": 5}}',
+    b'[{"fulfillmentInfo": {"tag": "save_lead"}}]',
+    b'"save_lead"',
+    b'{"fulfillmentInfo": "save_lead"}',
+    b'not json',
+])
+def test_malformed_bodies_are_rejected_with_422(fast_client, body):
+    response = fast_client.post("/webhook", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 422
+
+
+def test_valid_call_is_answered(fast_client):
+    response = fast_client.post("/webhook", json=webhook_body("defaultWelcomeIntent"))
+    assert response.status_code == 200
+    assert response.json()["sessionInfo"]["session"] == "projects/p/locations/l/agents/a/sessions/s1"
@@ -0,0 +1,7 @@
+from src import health, notifications, outbox
+
+
+def test_internal_state_is_recorded_at_startup(client):
+    internal = health._internal
+    assert internal["outbox_worker_running"] == outbox.worker_running()
+    assert internal["notification_workers_running"] == notifications.workers_running() > 0
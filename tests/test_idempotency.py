@@ -0,0 +1,34 @@
+from src.config import LEAD_NDJSON_PATH, RESPONSES
+from src.idempotency import idempotency_key
+
+from conftest import webhook_body
+
+
+def _reply(response) -> str:
+    return response.json()["fulfillmentResponse"]["messages"][0]["text"]["text"][0]
+
+
+def test_key_includes_tag_with_response_id():
+    assert idempotency_key("turn-1", "s", "defaultWelcomeIntent") != idempotency_key("turn-1", "s", "save_lead")
+
+
+def test_tags_sharing_a_response_id_get_their_own_reply(client):
+    parameters = {"user_name": "Ada", "user_email": "ada@example.com"}
+    welcome = client.post("/webhook", json=webhook_body("defaultWelcomeIntent", response_id="turn-1"))
+    saved = client.post("/webhook", json=webhook_body("save_consultation_lead", response_id="turn-1",
+                                                      parameters=parameters))
+    assert welcome.status_code == saved.status_code == 200
+    assert _reply(saved) == RESPONSES["en"]["consultation_saved"]
+    assert _reply(welcome) != _reply(saved)
+    with open(LEAD_NDJSON_PATH) as f:
+        assert "ada@example.com" in f.read()
+
+
+def test_retry_of_the_same_call_is_answered_from_the_cache(client):
+    parameters = {"user_name": "Bob", "user_email": "bob@example.com"}
+    body = webhook_body("save_consultation_lead", response_id="turn-2", parameters=parameters)
+    first = client.post("/webhook", json=body)
+    retry = client.post("/webhook", json=body)
+    assert first.json() == retry.json()
+    with open(LEAD_NDJSON_PATH) as f:
+        assert f.read().count("bob@example.com") == 1
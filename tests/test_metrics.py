@@ -0,0 +1,4 @@
+def test_metrics_endpoint_renders_downstream_latency(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "downstream_latency_window_seconds" in response.text
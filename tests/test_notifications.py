@@ -0,0 +1,16 @@
+import asyncio
+
+from src import notifications
+from src.utils import PermanentSendError
+
+
+def test_permanent_failure_is_not_retried(monkeypatch):
+    calls = []
+
+    async def send(leads):
+        calls.append(leads)
+        raise PermanentSendError("Resend configuration incomplete")
+
+    monkeypatch.setattr(notifications, "NOTIFICATION_MAX_RETRIES", 3)
+    assert asyncio.run(notifications._send_with_retries(send, [{"lead_id": "a"}])) is False
+    assert len(calls) == 1
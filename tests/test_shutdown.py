@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+
+import httpx
+from uvicorn import Config
+
+from src import health, shutdown
+from src.admission import admission
+from src.config import LEAD_NDJSON_PATH, RESPONSES, SHUTDOWN_SPILL_PATH
+from src.main import app
+from src.server import DrainingServer
+from src.sinks import NDJSONSink
+
+from conftest import webhook_body
+
+
+def _reply(response) -> str:
+    return response.json()["fulfillmentResponse"]["messages"][0]["text"]["text"][0]
+
+
+def test_exit_signal_starts_the_drain_at_once():
+    server = DrainingServer(Config(app))
+    server.handle_exit(signal.SIGTERM, None)
+    try:
+        assert server.should_exit
+        assert admission.draining
+        assert health.readiness()[0] is False
+    finally:
+        shutdown.end_drain()
+
+
+def test_calls_are_shed_while_draining(client):
+    shutdown.begin_drain()
+    response = client.post("/webhook", json=webhook_body(
+        "defaultWelcomeIntent", session="projects/p/locations/l/agents/a/sessions/draining"))
+    assert response.status_code == 200
+    assert _reply(response) == RESPONSES["en"]["consultation_error"]
+    assert client.get("/readyz").status_code == 503
+
+
+def test_hung_call_is_cut_off_and_its_lead_spilled_then_replayed(monkeypatch):
+    async def hang(self, lead_data):
+        await asyncio.Event().wait()
+
+    async def scenario():
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        server = DrainingServer(Config(app, timeout_graceful_shutdown=0.5, log_config=None, lifespan="on"))
+        serving = asyncio.ensure_future(server.serve(sockets=[sock]))
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        monkeypatch.setattr(NDJSONSink, "write", hang)
+        parameters = {"user_name": "Hana", "user_email": "hana@example.com"}
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+            call = asyncio.ensure_future(http.post("/webhook", json=webhook_body(
+                "save_consultation_lead", session="projects/p/locations/l/agents/a/sessions/hung",
+                parameters=parameters)))
+            await asyncio.sleep(0.2)
+            server.handle_exit(signal.SIGTERM, None)
+            # Called directly, not by a signal: nothing to re-raise after serve()
+            server._captured_signals.clear()
+            await asyncio.wait_for(serving, 5)
+            call.cancel()
+        monkeypatch.undo()
+
+        with open(SHUTDOWN_SPILL_PATH) as f:
+            spilled = [json.loads(line) for line in f]
+        assert [entry["item"]["email"] for entry in spilled if entry["kind"] == "lead"] == ["hana@example.com"]
+
+        shutdown.end_drain()
+        await shutdown.replay_spill()
+        with open(LEAD_NDJSON_PATH) as f:
+            assert "hana@example.com" in f.read()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_replays_hand_each_item_over_once(monkeypatch):
+    replayed = []
+
+    async def record(kind, item):
+        await asyncio.sleep(0.05)
+        replayed.append(item["lead_id"])
+        return True
+
+    monkeypatch.setattr(shutdown, "_replay", record)
+    shutdown._append(SHUTDOWN_SPILL_PATH, [json.dumps({"kind": "lead", "item": {"lead_id": str(i)}}) + "\n"
+                                           for i in range(3)])
+
+    async def scenario():
+        await asyncio.gather(shutdown.replay_spill(), shutdown.replay_spill())
+
+    asyncio.run(scenario())
+    assert sorted(replayed) == ["0", "1", "2"]
+    assert not os.path.exists(SHUTDOWN_SPILL_PATH + ".replaying")
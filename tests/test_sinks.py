@@ -0,0 +1,19 @@
+import asyncio
+import json
+
+from src.sinks import NDJSONSink
+
+
+async def _export(sink: NDJSONSink, since=None) -> bytes:
+    return b"".join([chunk async for chunk in sink.export(since)])
+
+
+def test_export_leaves_out_a_line_still_being_written(tmp_path):
+    path = tmp_path / "leads.ndjson"
+    leads = [{"lead_id": str(i), "timestamp": f"2024-01-0{i}"} for i in range(1, 4)]
+    complete = "".join(json.dumps(lead) + "\n" for lead in leads).encode()
+    path.write_bytes(complete + b'{"lead_id": "4", "timest')
+    sink = NDJSONSink(str(path))
+
+    assert asyncio.run(_export(sink)) == complete
+    assert asyncio.run(_export(sink, since="2024-01-02")).count(b"\n") == 2
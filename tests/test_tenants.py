@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from src.tenants import TenantRegistry
+
+
+def _registry(tmp_path, tenants: dict) -> TenantRegistry:
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps({"tenants": tenants}))
+    return TenantRegistry(str(path))
+
+
+def test_valid_file_is_loaded(tmp_path):
+    registry = _registry(tmp_path, {"acme": {"agents": ["agent-1"], "max_concurrency": "5"}})
+    assert registry.reload(force=True)
+    assert registry.get("acme").agents == ("agent-1",)
+    assert registry.get("acme").max_concurrency == 5
+
+
+@pytest.mark.parametrize("entry", [
+    {"max_concurrency": []},
+    {"max_connections": {}},
+    {"max_concurrency": "many"},
+    {"agents": "abc"},
+    {"agents": [1]},
+    {"email_to": ["sales@example.com"]},
+    "acme",
+])
+def test_bad_entry_keeps_the_previous_configuration(tmp_path, entry):
+    registry = _registry(tmp_path, {"acme": {"agents": ["agent-1"]}})
+    assert registry.reload(force=True)
+    (tmp_path / "tenants.json").write_text(json.dumps({"tenants": {"acme": entry}}))
+    assert not registry.reload(force=True)
+    assert registry.get("acme").agents == ("agent-1",)
+    assert registry.reloads["failed"] == 1
+
+
+def test_prewarm_covers_tenant_pools_and_the_redirect_host(tmp_path, monkeypatch):
+    from src import utils
+    from src.http_client import APPS_SCRIPT_REDIRECT_ORIGIN
+
+    registry = _registry(tmp_path, {"acme": {"agents": ["agent-1"], "apps_script_url": "https://script.google.com/acme"}})
+    assert registry.reload(force=True)
+    monkeypatch.setattr(utils, "tenants", registry)
+    targets = {(tenant.id, url) for tenant, url in utils.prewarm_targets()}
+    assert ("acme", "https://script.google.com/acme") in targets
+    assert ("acme", APPS_SCRIPT_REDIRECT_ORIGIN) in targets